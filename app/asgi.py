@@ -1,3 +1,7 @@
 import src.pipeline.predict_pipeline as myapp
 
+# Load the models at import time so that, with gunicorn --preload, they are loaded once in the
+# master and shared copy-on-write by the workers
+myapp.model_registry.load_all()
+
 app = myapp.app
\ No newline at end of file
@@ -0,0 +1,149 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+
+
+# Runs in a fresh interpreter: time the import of the serving app and the model load it does at
+# start-up (unpickling the models imports sklearn and with it scipy.stats), report the peak RSS
+STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+import_time = time.perf_counter() - start
+from src.model_registry import model_registry
+model_registry.registry_config.model_dir = {model_dir!r}
+start = time.perf_counter()
+model_registry.load_all()
+load_time = time.perf_counter() - start
+heavy = [name for name in ("pandas", "scipy.stats", "scipy.signal", "matplotlib", "sklearn", "pymongo") if name in sys.modules]
+print(json.dumps({{"import_s": import_time, "load_s": load_time, "n_models": len(model_registry), "maxrss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "loaded": heavy}}))
+"""
+
+
+def measure_startup(module, model_dir, repeats=5):
+    """Measure the cold import and model load time and the peak RSS of a worker in fresh interpreters
+
+    Args:
+        module (str): module to import, e.g. src.pipeline.predict_pipeline
+        model_dir (str): directory of the model_b<N>.pkl artifacts
+        repeats (int, optional): number of fresh interpreters. Defaults to 5.
+
+    Returns:
+        dict: import, model load and start-up time statistics, peak RSS and the heavy modules that were loaded
+    """
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", STARTUP_PROBE.format(module=module, model_dir=model_dir)], capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    import_times = np.array([run["import_s"] for run in runs])
+    load_times = np.array([run["load_s"] for run in runs])
+    startup_times = import_times + load_times
+
+    if not runs[-1]["n_models"]:
+        print(f"No model artifacts in {model_dir!r}, the start-up time does not include a model load", file=sys.stderr)
+
+    return {
+        "module": module,
+        "n_models": runs[-1]["n_models"],
+        "import_s_median": float(np.median(import_times)),
+        "load_s_median": float(np.median(load_times)),
+        "startup_s_median": float(np.median(startup_times)),
+        "startup_s_min": float(startup_times.min()),
+        "maxrss_mb": max(run["maxrss_kb"] for run in runs) / 1024,
+        "heavy_modules_loaded": runs[-1]["loaded"],
+    }
+
+
+def slowest_imports(module, top=15):
+    """List the slowest imports of a module with python -X importtime
+
+    Args:
+        module (str): module to import
+        top (int, optional): number of entries. Defaults to 15.
+
+    Returns:
+        list: (cumulative microseconds, module name) of the slowest imports
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True)
+
+    entries = []
+    for line in output.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative), name.strip()))
+
+    return sorted(entries, reverse=True)[:top]
+
+
+def read_status(pid):
+    """Read the resident and proportional set size of a process from /proc
+
+    The proportional set size splits the pages shared copy-on-write with the gunicorn master
+    between the processes sharing them.
+
+    Args:
+        pid (int): process id
+
+    Returns:
+        dict: pid, rss_mb and pss_mb
+    """
+    memory = {"pid": pid}
+
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, value = line.split(":", 1)
+            if key in ("Rss", "Pss"):
+                memory[f"{key.lower()}_mb"] = int(value.split()[0]) / 1024
+
+    return memory
+
+
+def worker_memory(master_pid):
+    """Memory of the gunicorn master and each of its workers
+
+    Args:
+        master_pid (int): pid of the gunicorn master
+
+    Returns:
+        list: memory of the master followed by its workers
+    """
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+        worker_pids = [int(pid) for pid in f.read().split()]
+
+    return [read_status(pid) for pid in [master_pid] + worker_pids]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the start-up time and memory of the prediction service.")
+    parser.add_argument("--module", default="src.pipeline.predict_pipeline", help="module imported by the serving workers")
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR") or os.path.join("artifacts", "models"), help="directory of the model_b<N>.pkl artifacts loaded at start-up")
+    parser.add_argument("--repeats", type=int, default=5, help="number of fresh interpreters")
+    parser.add_argument("--gunicorn-pid", type=int, default=None, help="pid of a running gunicorn master to report per-worker memory")
+    parser.add_argument("--output", default=None, help="save the results as json")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+
+    results = measure_startup(args.module, args.model_dir, repeats=args.repeats)
+    results["slowest_imports_us"] = slowest_imports(args.module)
+
+    if args.gunicorn_pid is not None:
+        results["processes"] = worker_memory(args.gunicorn_pid)
+
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+
+import numpy as np
+
+from benchmarks.synthetic import write_ims_run
+
+
+SAMPLING_RATE = 20480
+
+# Parameters of the model trained by src/pipeline/train_pipeline.py
+MODEL_PARAMS = {
+    "n_estimators": 100,
+    "max_samples": 'auto',
+    "contamination": float(0.03),
+    "max_features": 1.0,
+    "bootstrap": True,
+    "random_state": 42
+}
+
+
+def measure(fn, repeats=5, warmup=1, items=1):
+    """Time a function
+
+    Args:
+        fn (callable): function without arguments
+        repeats (int, optional): timed calls. Defaults to 5.
+        warmup (int, optional): untimed calls first. Defaults to 1.
+        items (int, optional): items handled per call, for the throughput. Defaults to 1.
+
+    Returns:
+        dict: timing statistics in seconds and the throughput
+    """
+    for _ in range(warmup):
+        fn()
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    times = np.array(times)
+
+    return {
+        "median_s": float(np.median(times)),
+        "min_s": float(times.min()),
+        "mean_s": float(times.mean()),
+        "p95_s": float(np.percentile(times, 95)),
+        "repeats": repeats,
+        "items": items,
+        "items_per_s": float(items / np.median(times)) if np.median(times) else 0.0,
+    }
+
+
+def bench_parsing(file_paths, repeats):
+    """np.loadtxt of a whole file and DataTransformation.extract_data_file of one channel"""
+    from src.components.data_transformation import DataTransformation
+
+    data_transformation = DataTransformation(bearing_num=1)
+
+    return {
+        "parse_loadtxt": measure(lambda: np.loadtxt(file_paths[0], delimiter='\t', dtype=float), repeats=repeats),
+        "parse_extract_data_file": measure(lambda: data_transformation.extract_data_file(file_paths[0]), repeats=repeats),
+    }
+
+
+def bench_featurization(frames, repeats):
+    """calc_fft, featurize of one frame and featurize_batch of all the frames"""
+    from src.components.features import calc_fft
+    from src.components.data_transformation import DataTransformation
+
+    data_transformation = DataTransformation(bearing_num=None)
+
+    return {
+        "calc_fft_single": measure(lambda: calc_fft(frames[0], SAMPLING_RATE), repeats=repeats),
+        "featurize_single": measure(lambda: data_transformation.featurize(frames[0], SAMPLING_RATE), repeats=repeats),
+        "featurize_batch": measure(lambda: data_transformation.featurize_batch(frames, SAMPLING_RATE), repeats=repeats, items=len(frames)),
+    }
+
+
+def bench_model(features, repeats):
+    """IsolationForest training, single-row and batch prediction
+
+    Returns:
+        tuple: results, trained model
+    """
+    from sklearn.ensemble import IsolationForest
+
+    model = IsolationForest(**MODEL_PARAMS).fit(features)
+
+    results = {
+        "train": measure(lambda: IsolationForest(**MODEL_PARAMS).fit(features), repeats=max(1, repeats // 2), warmup=0, items=len(features)),
+        "predict_single": measure(lambda: model.predict(features[:1]), repeats=repeats),
+        "predict_batch": measure(lambda: model.predict(features), repeats=repeats, items=len(features)),
+    }
+
+    return results, model
+
+
+async def bench_http(file_paths, n_requests):
+    """Serve the app in process with its start-up hooks against local stand-ins (embedded SQLite
+    storage, models in a temporary directory) and post json and binary frames to /invocations"""
+    import httpx
+    from invoke import txt_to_json, txt_to_binary, encode_body
+    from loadtest import summarize
+    from src.pipeline import predict_pipeline
+
+    results = dict()
+    await predict_pipeline.startup()
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=predict_pipeline.app), base_url="http://benchmark") as client:
+            for name, to_body in (("json", txt_to_json), ("binary", txt_to_binary)):
+                bodies = [to_body(data_filepath=file_path, bearing_num=1) for file_path in file_paths]
+
+                # Encode up front, with a new timestamp per request so none is a response cache hit
+                payloads = []
+                for index in range(n_requests):
+                    body = dict(bodies[index % len(bodies)])
+                    if name == "binary":
+                        body['headers'] = dict(body['headers'], **{'X-Timestamp': str(int(body['headers']['X-Timestamp']) + index)})
+                    else:
+                        body['timeStamp'] += index
+                    payloads.append(encode_body(body, binary=name == "binary"))
+
+                latencies = []
+                start = time.perf_counter()
+                for headers, data in payloads:
+                    request_start = time.perf_counter()
+                    response = await client.post("/invocations", headers=headers, content=data)
+                    latencies.append((time.perf_counter() - request_start, response.status_code))
+
+                summary = summarize(latencies, time.perf_counter() - start)
+
+                # Same key as the other benchmarks for the baseline comparison
+                summary["median_s"] = summary["latency_ms"]["p50"] / 1000
+                results[f"http_invocations_{name}"] = summary
+    finally:
+        await predict_pipeline.shutdown()
+
+    return results
+
+
+def setup_stand_ins(work_dir, model):
+    """Point the service at a temporary model directory and an embedded SQLite storage
+
+    Must run before src.pipeline.predict_pipeline is imported, its configuration is read at import.
+    """
+    from src.utils import save_object
+
+    model_dir = os.path.join(work_dir, "models")
+    os.makedirs(model_dir, exist_ok=True)
+    save_object(model, os.path.join(model_dir, "model_b1.pkl"))
+
+    os.environ.update({
+        "MODEL_DIR": model_dir,
+        "MODEL_RELOAD_INTERVAL": "0",
+        "DATABASE_BACKEND": "sqlite",
+        "SQLITE_DIR": os.path.join(work_dir, "db"),
+    })
+
+    return None
+
+
+def compare(results, baseline, tolerance=0.1):
+    """Compare the median times with a baseline
+
+    Args:
+        results (dict): benchmark results
+        baseline (dict): baseline results
+        tolerance (float, optional): allowed slowdown. Defaults to 0.1.
+
+    Returns:
+        list: (name, baseline median, median, ratio, regressed) rows
+    """
+    rows = []
+
+    for name, result in results["benchmarks"].items():
+        reference = baseline.get("benchmarks", {}).get(name)
+        if reference is None or "median_s" not in result or "median_s" not in reference:
+            continue
+
+        ratio = result["median_s"] / reference["median_s"] if reference["median_s"] else float("inf")
+        rows.append((name, reference["median_s"], result["median_s"], ratio, ratio > 1 + tolerance))
+
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, featurization, training, prediction and /invocations on synthetic IMS data.")
+    parser.add_argument("--files", type=int, default=64, help="synthetic files to generate")
+    parser.add_argument("--repeats", type=int, default=5, help="timed calls per benchmark")
+    parser.add_argument("--http-requests", type=int, default=50, help="requests per payload type, 0 to skip the HTTP benchmarks")
+    parser.add_argument("--data-dir", default=None, help="reuse this directory of IMS files instead of generating them")
+    parser.add_argument("--output", default=os.path.join("artifacts", "benchmarks", "suite.json"), help="save the results as json")
+    parser.add_argument("--baseline", default=None, help="compare with these saved results")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown against the baseline")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_dir = args.data_dir or os.path.join(work_dir, "raw")
+        if args.data_dir is None:
+            write_ims_run(data_dir, args.files, fault_channels=(0,))
+
+        file_paths = [os.path.join(data_dir, file_name) for file_name in sorted(os.listdir(data_dir))][:args.files]
+        frames = np.stack([np.loadtxt(file_path, delimiter='\t', dtype=float)[:, 0] for file_path in file_paths])
+
+        benchmarks = dict()
+        benchmarks.update(bench_parsing(file_paths, args.repeats))
+        benchmarks.update(bench_featurization(frames, args.repeats))
+
+        from src.components.data_transformation import DataTransformation
+        features_dict = DataTransformation(bearing_num=None).featurize_batch(frames, SAMPLING_RATE)
+        model_results, model = bench_model(np.column_stack(list(features_dict.values())), args.repeats)
+        benchmarks.update(model_results)
+
+        if args.http_requests:
+            setup_stand_ins(work_dir, model)
+            benchmarks.update(asyncio.run(bench_http(file_paths[:8], args.http_requests)))
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "files": len(file_paths),
+            "repeats": args.repeats,
+        },
+        "benchmarks": benchmarks,
+    }
+
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), tolerance=args.tolerance)
+
+        regressed = False
+        for name, reference, median, ratio, is_regression in rows:
+            regressed |= is_regression
+            print(f"{name:32s} {reference * 1000:10.3f} ms -> {median * 1000:10.3f} ms  x{ratio:.2f}{'  REGRESSION' if is_regression else ''}")
+
+        sys.exit(1 if regressed else 0)
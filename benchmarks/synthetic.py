@@ -0,0 +1,105 @@
+import os
+import argparse
+
+import numpy as np
+
+from datetime import datetime, timedelta
+
+
+# Shaft speed of the IMS rig (2000 RPM) and the outer race defect frequency of its bearings
+SHAFT_FREQ = 2000 / 60
+BPFO = 236.4
+
+
+def synthetic_frame(rng, n_samples=20480, n_channels=4, sampling_rate=20480, fault_channels=(), fault_amplitude=0.0, fault_freq=BPFO):
+    """Build one IMS-shaped frame: shaft tone and white noise on every channel, plus an optional fault tone.
+
+    Args:
+        rng (np.random.Generator): random generator.
+        n_samples (int, optional): Defaults to 20480.
+        n_channels (int, optional): Defaults to 4.
+        sampling_rate (int, optional): Defaults to 20480.
+        fault_channels (tuple, optional): channels carrying the fault tone. Defaults to ().
+        fault_amplitude (float, optional): amplitude of the fault tone and its harmonics. Defaults to 0.0.
+        fault_freq (float, optional): frequency of the fault tone. Defaults to BPFO.
+
+    Returns:
+        np array: (n_samples, n_channels) accelerations in g
+    """
+    t = np.arange(n_samples) / sampling_rate
+    phases = rng.uniform(0, 2 * np.pi, n_channels)
+
+    frame = 0.05 * np.sin(2 * np.pi * SHAFT_FREQ * t[:, None] + phases) + rng.normal(0, 0.07, (n_samples, n_channels))
+
+    if fault_amplitude and len(fault_channels):
+        tone = sum(fault_amplitude / harmonic * np.sin(2 * np.pi * harmonic * fault_freq * t) for harmonic in (1, 2, 3))
+        frame[:, list(fault_channels)] += tone[:, None]
+
+    return frame
+
+
+def write_ims_run(output_dir, n_files, start="2004.02.12.10.32.39", interval_minutes=10, n_samples=20480, n_channels=4,
+                  fault_channels=(), fault_start=0.7, fault_amplitude=0.3, seed=42):
+    """Write a deterministic synthetic test run in the IMS format.
+
+    Files are tab separated (n_samples x n_channels, 3 decimals, like the IMS data) and named by
+    their time as YYYY.MM.DD.HH.MM.SS. The fault tone of fault_channels grows linearly from
+    fault_start (fraction of the run) to fault_amplitude at the end of the run.
+
+    Args:
+        output_dir (str): directory of the run.
+        n_files (int): number of files.
+        start (str, optional): time of the first file. Defaults to "2004.02.12.10.32.39".
+        interval_minutes (int, optional): minutes between files. Defaults to 10.
+        n_samples (int, optional): Defaults to 20480.
+        n_channels (int, optional): Defaults to 4.
+        fault_channels (tuple, optional): channels with an injected fault. Defaults to ().
+        fault_start (float, optional): fraction of the run where the fault appears. Defaults to 0.7.
+        fault_amplitude (float, optional): fault tone amplitude at the end of the run. Defaults to 0.3.
+        seed (int, optional): Defaults to 42.
+
+    Returns:
+        list: paths of the written files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    start_time = datetime.strptime(start, "%Y.%m.%d.%H.%M.%S")
+    file_paths = []
+
+    for index in range(n_files):
+        # One generator per file, so a file does not depend on how many were written before it
+        rng = np.random.default_rng([seed, index])
+
+        progress = index / max(n_files - 1, 1)
+        amplitude = fault_amplitude * max(0.0, (progress - fault_start) / (1 - fault_start)) if fault_start < 1 else 0.0
+
+        frame = synthetic_frame(rng, n_samples=n_samples, n_channels=n_channels, fault_channels=fault_channels, fault_amplitude=amplitude)
+
+        file_path = os.path.join(output_dir, (start_time + timedelta(minutes=interval_minutes * index)).strftime("%Y.%m.%d.%H.%M.%S"))
+        np.savetxt(file_path, frame, delimiter='\t', fmt='%.3f')
+        file_paths.append(file_path)
+
+    return file_paths
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write a synthetic test run in the IMS format.")
+    parser.add_argument("output_dir", help="directory of the run")
+    parser.add_argument("--files", type=int, default=100, help="number of files")
+    parser.add_argument("--channels", type=int, default=4, help="channels per file")
+    parser.add_argument("--samples", type=int, default=20480, help="samples per channel")
+    parser.add_argument("--fault-channels", default="", help="comma separated channels with an injected fault, e.g. 0")
+    parser.add_argument("--fault-start", type=float, default=0.7, help="fraction of the run where the fault appears")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+
+    fault_channels = tuple(int(value) for value in args.fault_channels.split(',') if value.strip())
+    file_paths = write_ims_run(args.output_dir, args.files, n_samples=args.samples, n_channels=args.channels, fault_channels=fault_channels, fault_start=args.fault_start, seed=args.seed)
+
+    print(f"Wrote {len(file_paths)} files to {args.output_dir}")
@@ -6,6 +6,8 @@ import numpy as np
 
 from src.utils import convert_to_timestamp
 
+SERVER_URL = "http://localhost:8080"
+
 def txt_to_json(data_filepath, bearing_num=1):
     """Converts the txt file to json format.
 
@@ -25,31 +27,116 @@ def txt_to_json(data_filepath, bearing_num=1):
     return data_dict
 
 
-def send_requests(request_type='get', body=None):
+def txt_to_binary(data_filepath, bearing_num=1, dtype='float32'):
+    """Converts the txt file to a binary payload with the metadata in headers.
+
+    Args:
+        data_filepath (str): filepath to the data.
+        bearing_num (int, optional): Defaults to 1.
+        dtype (str, optional): float32 or float64. Defaults to 'float32'.
+    """
+    data = np.loadtxt(data_filepath, delimiter='\t', dtype=float)[:,bearing_num-1]
+    epoch = convert_to_timestamp(date_string=data_filepath.split('/')[-1])
+
+    # Raw little-endian samples
+    payload = np.ascontiguousarray(data, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+
+    data_dict = {
+            'headers': {
+                'Content-Type': 'application/octet-stream',
+                'X-Timestamp': str(int(epoch)),
+                'X-Bearing-Num': str(bearing_num),
+                'X-Dtype': dtype
+            },
+            'data': payload
+        }
+
+    return data_dict
+
+
+def txt_to_machine(data_filepath, channel_map=None, binary=False, dtype='float32'):
+    """Converts the txt file with all the channels to a single multi-channel request.
+
+    Args:
+        data_filepath (str): filepath to the data.
+        channel_map (list, optional): bearing number of every channel (None skips a channel).
+            Defaults to one channel per bearing.
+        binary (bool, optional): build a binary payload instead of json. Defaults to False.
+        dtype (str, optional): float32 or float64 for the binary payload. Defaults to 'float32'.
+    """
+    # (n_channels, n_samples) frame
+    data = np.loadtxt(data_filepath, delimiter='\t', dtype=float).T
+    epoch = convert_to_timestamp(date_string=data_filepath.split('/')[-1])
+
+    if channel_map is None:
+        channel_map = list(range(1, data.shape[0] + 1))
+
+    if binary:
+        data_dict = {
+                'headers': {
+                    'Content-Type': 'application/octet-stream',
+                    'X-Timestamp': str(int(epoch)),
+                    'X-Channel-Map': ','.join('' if bearing_num is None else str(bearing_num) for bearing_num in channel_map),
+                    'X-Num-Channels': str(data.shape[0]),
+                    'X-Dtype': dtype
+                },
+                'data': np.ascontiguousarray(data, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+            }
+
+    else:
+        data_dict = {
+                'timeStamp': int(epoch),
+                'channelMap': channel_map,
+                'accelData': data.tolist()
+            }
+
+    return data_dict
+
+
+def encode_body(body, binary=False):
+    """Encode a request body into the headers and the data to post.
+
+    Args:
+        body (dict): body from txt_to_json, txt_to_binary or txt_to_machine.
+        binary (bool, optional): body is a binary payload. Defaults to False.
+
+    Returns:
+        tuple: headers, data
+    """
+    if binary:
+        return body['headers'], body['data']
+
+    # Define the headers
+    headers = {
+        "Content-Type": "application/json"
+    }
+
+    return headers, json.dumps(body)
+
+
+def send_requests(request_type='get', body=None, binary=False, endpoint='invocations'):
     """Send requests to the API.
 
     Args:
         request_type (str, optional): type of request. Defaults to 'get'.
         body (dict_, optional): dict. Defaults to None.
+        binary (bool, optional): body is a binary payload from txt_to_binary. Defaults to False.
+        endpoint (str, optional): invocations, invocations/batch or invocations/machine. Defaults to 'invocations'.
 
     Returns:
         _type_: _description_
     """
     if request_type == 'get':
-        url = "http://localhost:8080/ping"
+        url = f"{SERVER_URL}/ping"
 
         response = requests.get(url)
         print(response.json())
 
     elif request_type == 'post':
-        url = "http://localhost:8080/invocations"
-
-        # Define the headers
-        headers = {
-            "Content-Type": "application/json"
-        }
+        url = f"{SERVER_URL}/{endpoint}"
 
-        response = requests.post(url, headers=headers, data=json.dumps(body))
+        headers, data = encode_body(body, binary=binary)
+        response = requests.post(url, headers=headers, data=data)
         # print(response.json())
 
     return response
@@ -59,11 +146,15 @@ if __name__ == "__main__":
 
     data_dir = 'artifacts/data/raw/2nd_test'
     bearing_num = 3
+    binary = False
 
     for filename in sorted(os.listdir(data_dir))[400:401]:
         print(filename)
-        body = txt_to_json(data_filepath=os.path.join(data_dir, filename), bearing_num=bearing_num)
-        response = send_requests(request_type='post', body=body)
+        if binary:
+            body = txt_to_binary(data_filepath=os.path.join(data_dir, filename), bearing_num=bearing_num)
+        else:
+            body = txt_to_json(data_filepath=os.path.join(data_dir, filename), bearing_num=bearing_num)
+        response = send_requests(request_type='post', body=body, binary=binary)
 
         # Check the response status code
         if response.status_code == 200:
@@ -0,0 +1,278 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+import numpy as np
+
+from invoke import SERVER_URL, txt_to_json, txt_to_binary, encode_body
+
+
+def synthetic_body(rng, timestamp, bearing_num=1, binary=False, n_samples=20480, sampling_rate=20480):
+    """Build a request body for a synthetic vibration frame.
+
+    Args:
+        rng (np.random.Generator): random generator.
+        timestamp (int): epoch time of the frame.
+        bearing_num (int, optional): Defaults to 1.
+        binary (bool, optional): build a binary payload instead of json. Defaults to False.
+        n_samples (int, optional): Defaults to 20480.
+        sampling_rate (int, optional): Defaults to 20480.
+
+    Returns:
+        dict: body in the txt_to_json / txt_to_binary format
+    """
+    # Shaft rotation (2000 RPM) and a bearing tone on top of white noise
+    t = np.arange(n_samples) / sampling_rate
+    data = 0.05 * np.sin(2 * np.pi * 33.3 * t) + 0.02 * np.sin(2 * np.pi * 236.4 * t) + rng.normal(0, 0.07, n_samples)
+
+    if binary:
+        return {
+            'headers': {
+                'Content-Type': 'application/octet-stream',
+                'X-Timestamp': str(int(timestamp)),
+                'X-Bearing-Num': str(bearing_num),
+                'X-Dtype': 'float32'
+            },
+            'data': data.astype('<f4').tobytes()
+        }
+
+    return {'timeStamp': int(timestamp), 'bearingNum': bearing_num, 'accelData': data.tolist()}
+
+
+def prepare_payloads(args):
+    """Encode the request payloads up front so the client does not measure its own encoding.
+
+    Args:
+        args (argparse.Namespace): command line arguments
+
+    Returns:
+        list: (headers, data) tuples
+    """
+    bearing_nums = [int(value) for value in args.bearings.split(',')]
+    payloads = []
+
+    if args.data_dir:
+        filenames = sorted(os.listdir(args.data_dir))[:args.max_files]
+        for filename in filenames:
+            for bearing_num in bearing_nums:
+                data_filepath = os.path.join(args.data_dir, filename)
+                if args.binary:
+                    body = txt_to_binary(data_filepath=data_filepath, bearing_num=bearing_num)
+                else:
+                    body = txt_to_json(data_filepath=data_filepath, bearing_num=bearing_num)
+                payloads.append(encode_body(body, binary=args.binary))
+
+    else:
+        rng = np.random.default_rng(args.seed)
+        for index in range(args.synthetic):
+            body = synthetic_body(rng, timestamp=1_076_500_000 + 600 * index, bearing_num=bearing_nums[index % len(bearing_nums)], binary=args.binary)
+            payloads.append(encode_body(body, binary=args.binary))
+
+    return payloads
+
+
+# The timestamps of an encoded json body, rewritten in place instead of re-encoding the frame
+TIMESTAMP_FIELD = re.compile(r'"timeStamp":\s*(-?\d+)')
+
+
+def unique_payload(headers, data, index):
+    """Give every replayed request its own timestamp so it is not a response cache hit.
+
+    Binary requests carry the timestamp in the X-Timestamp header, json requests in the timeStamp
+    fields of the body.
+
+    Args:
+        headers (dict): request headers
+        data (str or bytes): request body
+        index (int): replay pass, 0 keeps the original timestamp
+
+    Returns:
+        tuple: request headers, request body
+    """
+    if not index:
+        return headers, data
+
+    if 'X-Timestamp' in headers:
+        headers = dict(headers)
+        headers['X-Timestamp'] = str(int(headers['X-Timestamp']) + index)
+
+    elif isinstance(data, str):
+        data = TIMESTAMP_FIELD.sub(lambda match: f'"timeStamp": {int(match.group(1)) + index}', data)
+
+    return headers, data
+
+
+async def run_load(payloads, url, n_requests, concurrency, rate=None, timeout=30.0):
+    """Send the requests over a pooled async HTTP client.
+
+    Without a rate, concurrency workers send requests back to back (closed loop). With a rate,
+    requests are started on a fixed schedule (open loop) with at most concurrency in flight.
+
+    Args:
+        payloads (list): (headers, data) tuples, replayed in a cycle
+        url (str): endpoint URL
+        n_requests (int): number of requests
+        concurrency (int): maximum requests in flight
+        rate (float, optional): target requests per second. Defaults to None.
+        timeout (float, optional): request timeout in seconds. Defaults to 30.0.
+
+    Returns:
+        tuple: list of (latency, status) and the wall time in seconds
+    """
+    results = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+
+        async def send(index):
+            headers, data = unique_payload(*payloads[index % len(payloads)], index // len(payloads))
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, headers=headers, content=data)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            results.append((time.perf_counter() - start, status))
+
+        start = time.perf_counter()
+
+        if rate:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def scheduled(index):
+                # Wait for the slot of this request, then for room in the pool
+                await asyncio.sleep(max(0.0, start + index / rate - time.perf_counter()))
+                async with semaphore:
+                    await send(index)
+
+            await asyncio.gather(*(scheduled(index) for index in range(n_requests)))
+
+        else:
+            counter = iter(range(n_requests))
+
+            async def worker():
+                for index in counter:
+                    await send(index)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        wall_time = time.perf_counter() - start
+
+    return results, wall_time
+
+
+def summarize(results, wall_time):
+    """Summarize the throughput, latency percentiles and error rate.
+
+    Args:
+        results (list): (latency, status) tuples
+        wall_time (float): wall time of the run in seconds
+
+    Returns:
+        dict: summary
+    """
+    latencies = np.array([latency for latency, _ in results]) * 1000
+    statuses = [str(status) for _, status in results]
+    errors = sum(status != '200' for status in statuses)
+
+    return {
+        'requests': len(results),
+        'wall_time_s': wall_time,
+        'throughput_rps': len(results) / wall_time if wall_time else 0.0,
+        'latency_ms': {
+            'mean': float(latencies.mean()),
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'p99': float(np.percentile(latencies, 99)),
+            'max': float(latencies.max()),
+        },
+        'error_rate': errors / len(results),
+        'status_counts': {status: statuses.count(status) for status in sorted(set(statuses))},
+    }
+
+
+def start_local_server(port, workers):
+    """Start the prediction service locally with uvicorn and wait until it answers /ping.
+
+    The database settings come from the environment, e.g. DATABASE_LOCAL=1 with a local
+    MongoDB stand-in (`docker run -p 27017:27017 mongo`).
+
+    Args:
+        port (int): port to listen on
+        workers (int): number of uvicorn workers
+
+    Returns:
+        subprocess.Popen: the server process
+    """
+    env = dict(os.environ)
+    env.setdefault('DATABASE_LOCAL', '1')
+    env.setdefault('MODEL_DIR', os.path.join('artifacts', 'models'))
+
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'src.pipeline.predict_pipeline:app', '--port', str(port), '--workers', str(workers), '--log-level', 'warning'], env=env)
+
+    for _ in range(120):
+        try:
+            if httpx.get(f"http://localhost:{port}/ping").status_code == 200:
+                return server
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+
+    server.terminate()
+    raise RuntimeError('The local server did not start')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Load test the /invocations endpoint of the prediction service.')
+    parser.add_argument('--url', default=SERVER_URL, help='server URL')
+    parser.add_argument('--endpoint', default='invocations', help='endpoint to load')
+    parser.add_argument('--data-dir', default=None, help='directory of IMS files to replay')
+    parser.add_argument('--max-files', type=int, default=100, help='maximum number of IMS files to replay')
+    parser.add_argument('--synthetic', type=int, default=100, help='number of synthetic frames when no data dir is given')
+    parser.add_argument('--bearings', default='1,2,3,4', help='comma separated bearing numbers')
+    parser.add_argument('--binary', action='store_true', help='send binary float32 payloads instead of json')
+    parser.add_argument('--requests', type=int, default=1000, help='number of requests')
+    parser.add_argument('--concurrency', type=int, default=8, help='maximum requests in flight')
+    parser.add_argument('--rate', type=float, default=None, help='target requests per second (open loop)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the synthetic frames')
+    parser.add_argument('--output', default=None, help='save the summary as json')
+    parser.add_argument('--start-server', action='store_true', help='start a local server for the run')
+    parser.add_argument('--workers', type=int, default=1, help='workers of the local server')
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+
+    payloads = prepare_payloads(args)
+    print(f"Prepared {len(payloads)} payloads")
+
+    server = None
+    if args.start_server:
+        port = httpx.URL(args.url).port or 8080
+        server = start_local_server(port, args.workers)
+
+    try:
+        results, wall_time = asyncio.run(run_load(payloads, f"{args.url}/{args.endpoint}", args.requests, args.concurrency, rate=args.rate, timeout=args.timeout))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = summarize(results, wall_time)
+    summary['config'] = {key: value for key, value in vars(args).items() if key != 'output'}
+
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
@@ -1,9 +1,41 @@
-import matplotlib.pyplot as plt  
+import os
+import sys
+import time
+import functools
+import argparse
 import numpy as np
-import pandas as pd
 
-from src.components.features import calc_fft
-from src.components.data_transformation  import DataTransformation
+# Render without a display, also in the worker processes
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from src.components.features import calc_fft, calc_rms
+from src.components.downsampling import downsample
+from src.logger import get_logger
+from src.utils import convert_to_timestamp, parse_channel_map
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ReportConfig:
+    """Report configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    raw_data_dir: str = os.path.join('artifacts', 'data', 'raw')
+    spectra_dir: str = os.path.join('artifacts', 'data', 'spectra')
+    plots_dir: str = os.path.join('artifacts', 'plots')
+    file_delimiter: str = '\t'
+    sampling_rate: int = 20480
+    freq_cutoff: int = 2000
+    files_per_task: int = 32
+    n_workers: int = int(os.getenv("REPORT_N_WORKERS", os.cpu_count() or 1))
 
 
 def plot_fft(ax, fft, freq_cutoff=2000, n_xticks=20, **kwargs):
@@ -92,9 +124,14 @@ def plot_timeseries(ax, data, cols, **kwargs):
     plot_xlabel = kwargs.get('plot_xlabel', None)
     plot_ylabel = kwargs.get('plot_ylabel', None)
     n_xticks = kwargs.get('n_xticks', 50)
+    max_points = kwargs.get('max_points', 2000)
     save = kwargs.get('save', False)
+    save_path = kwargs.get('save_path', 'artifacts/plots/timeseries.png')
+
+    # Reduce the series to max_points, keeping its peaks
+    rows = downsample(np.arange(len(data)), data[cols].to_numpy(), n_out=max_points) if max_points else np.arange(len(data))
 
-    ax.plot(data["timestamp"], data[cols], linewidth=0.5, linestyle='-', alpha=0.8, color='black')
+    ax.plot(data["timestamp"].to_numpy()[rows], data[cols].to_numpy()[rows], linewidth=0.5, linestyle='-', alpha=0.8, color='black')
     # change the fontsize
     ax.set_xticks(np.arange(0, len(data), n_xticks), data['timestamp'][::n_xticks], size=10, rotation=20)
     ax.set_title(plot_title, fontsize=12)
@@ -102,49 +139,293 @@ def plot_timeseries(ax, data, cols, **kwargs):
     ax.set_ylabel(plot_ylabel, fontsize=10)
 
     if save:
-        plt.savefig('artifacts/plots/timeseries.png', dpi=300)
+        plt.savefig(save_path, dpi=300)
+
+    return None
+
+
+def plot_waterfall(ax, spectra, frequency, timestamps, freq_cutoff=2000, **kwargs):
+    """Plots the spectra of a test run as a spectrogram (time on the y axis, dB colour scale).
+
+    Args:
+        ax (matplotlib axes): axes to draw on.
+        spectra (np array): (n_files, n_bins) FFT amplitudes.
+        frequency (np array): frequency of every bin.
+        timestamps (np array): epoch time of every file.
+        freq_cutoff (int, optional): highest frequency shown. Defaults to 2000.
+    """
+    plot_title = kwargs.get('plot_title', 'Spectrogram')
+    cmap = kwargs.get('cmap', 'viridis')
+
+    bins = frequency <= freq_cutoff
+    hours = (timestamps - timestamps[0]) / 3600
+
+    amplitude_db = 20 * np.log10(np.maximum(spectra[:, bins], 1e-6))
+
+    # The DC bin is ~0 after removing the mean, keep it from stretching the colour scale
+    image = ax.imshow(
+        amplitude_db,
+        aspect='auto', origin='lower', cmap=cmap, interpolation='nearest', vmin=np.percentile(amplitude_db, 1),
+        extent=[frequency[bins][0], frequency[bins][-1], hours[0], hours[-1] if len(hours) > 1 else 1],
+    )
+
+    ax.grid(False)
+    ax.set_title(plot_title, fontsize=12)
+    ax.set_xlabel("frequency(Hz)", fontsize=10)
+    ax.set_ylabel("time since start(h)", fontsize=10)
+    ax.figure.colorbar(image, ax=ax, label="amplitude(dB)")
 
     return None
 
 
-sampling_rate = 20480
-freq_cutoff = 2000
-n_xticks = 100
+def spectra_of_files(file_paths, sampling_rate, freq_cutoff, file_delimiter='\t'):
+    """Spectra and RMS of every channel of the raw files, runs in a worker process
+
+    Args:
+        file_paths (list): raw IMS files
+        sampling_rate (int): Sampling rate of the data
+        freq_cutoff (int): highest frequency kept
+        file_delimiter (str, optional): Defaults to '\\t'.
+
+    Returns:
+        tuple: (n_files, n_channels, n_bins) float32 amplitudes, (n_files, n_channels) RMS, frequencies
+    """
+    # (n_files, n_channels, n_samples), one FFT call for all the channels of all the files
+    data = np.stack([np.loadtxt(file_path, delimiter=file_delimiter, dtype=float).T for file_path in file_paths])
+
+    centered_data, amplitudes, frequencies = calc_fft(data, sampling_rate, fMax=freq_cutoff)
+
+    return amplitudes.astype(np.float32), calc_rms(centered_data), frequencies
+
+
+class SpectraCache:
+    """Spectra of the files of a test run, computed once and kept as .npy files.
+
+    A refresh only computes the files that were added to the run since the last build. The
+    renderers open the arrays memory-mapped, so the workers share them without pickling. Every
+    array is written to a temporary file and renamed, so a reader never opens a partial file.
+    """
+
+    def __init__(self, run_dir, report_config):
+        self.report_config = report_config
+        self.run_dir = run_dir
+        self.cache_dir = os.path.join(report_config.spectra_dir, f"{os.path.basename(os.path.normpath(run_dir))}_f{report_config.freq_cutoff}")
+
+    def path(self, name):
+        return os.path.join(self.cache_dir, f"{name}.npy")
+
+    def load(self, mmap_mode='r'):
+        """Load the cached arrays
+
+        Returns:
+            dict: timestamps, frequencies, amplitudes and rms, None when there is no cache
+        """
+        if not os.path.exists(self.path('timestamps')):
+            return None
+
+        arrays = {name: np.load(self.path(name), mmap_mode=mmap_mode) for name in ('timestamps', 'frequencies', 'amplitudes', 'rms')}
+
+        # An interrupted save leaves arrays of different builds, rebuild the cache then
+        if not len(arrays['timestamps']) == len(arrays['amplitudes']) == len(arrays['rms']):
+            logger.warning(f"Inconsistent spectra cache in {self.cache_dir}, rebuilding it")
+            return None
+
+        return arrays
+
+    def save(self, arrays):
+        """Save the arrays, the timestamps last as they mark the cache as present
+
+        Args:
+            arrays (dict): name -> np array
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        for name in sorted(arrays, key=lambda name: name == 'timestamps'):
+            # Write to a temporary file and rename it so readers never see a partial file
+            tmp_path = f"{self.path(name)}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, arrays[name])
+            os.replace(tmp_path, self.path(name))
+
+        return None
+
+    def build(self, pool):
+        """Compute the spectra of the files missing from the cache on the pool and save the cache
+
+        Args:
+            pool (ProcessPoolExecutor): worker processes
+
+        Returns:
+            int: number of files computed
+        """
+        file_names = sorted(os.listdir(self.run_dir))
+        timestamps = np.array([convert_to_timestamp(date_string=file_name) for file_name in file_names], dtype=np.int64)
+
+        cached = self.load(mmap_mode=None)
+        if cached is not None and np.isin(cached['timestamps'], timestamps).all():
+            missing = ~np.isin(timestamps, cached['timestamps'])
+        else:
+            cached, missing = None, np.ones(len(file_names), dtype=bool)
+
+        new_files = [os.path.join(self.run_dir, file_name) for file_name, is_missing in zip(file_names, missing) if is_missing]
+        if not new_files:
+            return 0
+
+        chunk_size = self.report_config.files_per_task
+        chunks = [new_files[start:start + chunk_size] for start in range(0, len(new_files), chunk_size)]
+        compute = functools.partial(spectra_of_files, sampling_rate=self.report_config.sampling_rate, freq_cutoff=self.report_config.freq_cutoff, file_delimiter=self.report_config.file_delimiter)
+        results = list(pool.map(compute, chunks))
+
+        arrays = {
+            'timestamps': timestamps[missing],
+            'amplitudes': np.concatenate([amplitudes for amplitudes, _, _ in results]),
+            'rms': np.concatenate([rms for _, rms, _ in results]),
+        }
+
+        if cached is not None:
+            arrays = {name: np.concatenate([cached[name], values]) for name, values in arrays.items()}
+
+        # Keep the files in time order
+        order = np.argsort(arrays['timestamps'], kind='stable')
+        arrays = {name: values[order] for name, values in arrays.items()}
+        arrays['frequencies'] = results[0][2]
+
+        self.save(arrays)
+
+        return len(new_files)
+
+
+def render_figure(kind, cache_dir, bearing_num, channel, output_path, freq_cutoff, max_points=2000):
+    """Render one figure of a bearing from the cached spectra, runs in a worker process
+
+    Args:
+        kind (str): "trend", "fft" or "waterfall"
+        cache_dir (str): directory of the cached spectra
+        bearing_num (int): bearing number
+        channel (int): channel of the bearing in the raw files
+        output_path (str): path of the png
+        freq_cutoff (int): highest frequency shown
+        max_points (int, optional): points of the trend plot. Defaults to 2000.
+
+    Returns:
+        str: output_path
+    """
+    arrays = {name: np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode='r') for name in ('timestamps', 'frequencies', 'amplitudes', 'rms')}
+
+    plt.style.use('ggplot')
+    fig, ax = plt.subplots(figsize=(10, 6))
+
+    if kind == "trend":
+        hours = (arrays['timestamps'] - arrays['timestamps'][0]) / 3600
+        rms = np.asarray(arrays['rms'][:, channel])
+        rows = downsample(hours, rms, n_out=max_points)
+
+        ax.plot(hours[rows], rms[rows], linewidth=0.7, color='black')
+        ax.set_title(f"Bearing {bearing_num} RMS Trend", fontsize=12)
+        ax.set_xlabel("time since start(h)", fontsize=10)
+        ax.set_ylabel(f"RMS($mm/s^2$)", fontsize=10)
+
+    elif kind == "fft":
+        # The start of the run is the healthy reference for the end of the run
+        for row, color, label in ((0, 'black', 'Start of run'), (-1, 'r', 'End of run')):
+            fft = {"fftFrequency": np.asarray(arrays['frequencies']), "fftAmplitude": np.asarray(arrays['amplitudes'][row, channel])}
+            plot_fft(ax, fft, freq_cutoff=freq_cutoff, n_xticks=100, color=color, alpha=0.6, label=label)
+
+        ax.set_title(f"Bearing {bearing_num} FFT Spectrum", fontsize=14)
+        ax.legend(loc='upper right', fontsize=8)
+
+    elif kind == "waterfall":
+        plot_waterfall(ax, np.asarray(arrays['amplitudes'][:, channel]), np.asarray(arrays['frequencies']), np.asarray(arrays['timestamps']), freq_cutoff=freq_cutoff, plot_title=f"Bearing {bearing_num} Spectrogram")
+
+    else:
+        raise ValueError(f"Unknown figure: {kind}")
+
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=150)
+    plt.close(fig)
+
+    return output_path
+
+
+def generate_report(run_dirs, bearing_nums=None, kinds=("trend", "fft", "waterfall"), report_config=None, channel_map=None):
+    """Build the cached spectra of the test runs and render the figures of every bearing in parallel
+
+    Args:
+        run_dirs (list): directories of raw IMS files
+        bearing_nums (list, optional): bearing numbers. Defaults to every bearing of the channel map.
+        kinds (tuple, optional): figures per bearing. Defaults to ("trend", "fft", "waterfall").
+        report_config (ReportConfig, optional): Defaults to ReportConfig().
+        channel_map (list, optional): bearing number of every channel (None skips a channel), as in
+            the backfill. Defaults to bearing N on channel N - 1.
+
+    Returns:
+        list: paths of the rendered figures
+    """
+    report_config = report_config or ReportConfig()
+    start_time = time.perf_counter()
+
+    if channel_map is None:
+        channel_map = list(range(1, max(bearing_nums) + 1)) if bearing_nums else [1, 2, 3, 4]
+
+    # Each bearing on one channel at most, as in the backfill
+    channel_of = {bearing_num: channel for channel, bearing_num in zip(*parse_channel_map(channel_map, len(channel_map)))}
+
+    if bearing_nums is None:
+        bearing_nums = sorted(channel_of)
+    unmapped = [bearing_num for bearing_num in bearing_nums if bearing_num not in channel_of]
+    if unmapped:
+        raise ValueError(f"Bearings {unmapped} are not in the channel map {channel_map}")
+
+    with ProcessPoolExecutor(max_workers=report_config.n_workers) as pool:
+        tasks = []
 
-# dt = DataTransformation()
+        for run_dir in run_dirs:
+            cache = SpectraCache(run_dir, report_config)
+            n_computed = cache.build(pool)
+            logger.info(f"Spectra of {run_dir}: {n_computed} files computed, the others reused from {cache.cache_dir}")
 
-# healthy_data = dt.extract_data_file(data_filepath='artifacts/data/raw/2nd_test/2004.02.12.11.02.39')[:,0]
-# unhealthy_data = dt.extract_data_file(data_filepath='artifacts/data/raw/2nd_test/2004.02.19.00.22.39')[:,0]
+            n_channels = cache.load()['rms'].shape[1]
+            if len(channel_map) > n_channels:
+                raise ValueError(f"Channel map {channel_map} does not fit the {n_channels} channels of {run_dir}")
 
-# _, healthy_amps, healthy_freqs = calc_fft(healthy_data, sampling_rate=20480)
-# _, unhealthy_amps, unhealthy_freqs = calc_fft(unhealthy_data, sampling_rate=20480)
+            output_dir = os.path.join(report_config.plots_dir, os.path.basename(os.path.normpath(run_dir)))
+            os.makedirs(output_dir, exist_ok=True)
 
+            for bearing_num in bearing_nums:
+                for kind in kinds:
+                    output_path = os.path.join(output_dir, f"b{bearing_num}_{kind}.png")
+                    tasks.append(pool.submit(render_figure, kind, cache.cache_dir, bearing_num, channel_of[bearing_num], output_path, report_config.freq_cutoff))
 
-# fft_healthy = {
-#     "fftAmplitude": healthy_amps,
-#     "fftFrequency": healthy_freqs
-# }
+        figures = [task.result() for task in tasks]
 
-# fft_unhealthy = {
-#     "fftAmplitude": unhealthy_amps,
-#     "fftFrequency": unhealthy_freqs
-# }
+    logger.info(f"Rendered {len(figures)} figures in {time.perf_counter() - start_time:.1f}s")
 
-df = pd.read_csv('artifacts/data/transformed/processed_data.csv')
+    return figures
 
-plt.style.use('ggplot')
-fig, ax = plt.subplots(figsize=(10, 8))
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate the trend, FFT and spectrogram figures of test runs.")
+    parser.add_argument("run_dirs", nargs="*", default=[os.path.join('artifacts', 'data', 'raw', '2nd_test')], help="directories of raw IMS files")
+    parser.add_argument("--channel-map", default="1,2,3,4", help="comma separated bearing number of every channel, empty to skip a channel, each bearing on one channel at most (e.g. 1,,2,,3,,4, for the x axis channels of the 1st test)")
+    parser.add_argument("--bearings", default=None, help="comma separated bearing numbers. Defaults to every bearing of the channel map")
+    parser.add_argument("--figures", default="trend,fft,waterfall", help="comma separated figures per bearing")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
 
-# plot_fft(ax, fft_healthy, freq_cutoff=freq_cutoff, n_xticks=n_xticks, alpha=0.6, label='Asset Healthy')
-# plot_fft(ax, fft_unhealthy, freq_cutoff=freq_cutoff, n_xticks=n_xticks, color='r', alpha=0.5, label='Asset Unhealthy')
-plot_timeseries(ax, data=df, cols='trms', plot_title='Time Series Plot', plot_xlabel='Time', plot_ylabel='RMS', n_xticks=100, save=True)
-ax.legend(loc='upper right', fontsize=8)
+    return parser.parse_args()
 
-plt.tight_layout()
 
-plt.show()
+if __name__ == "__main__":
 
+    args = parse_args()
 
+    report_config = ReportConfig()
+    if args.workers is not None:
+        report_config.n_workers = args.workers
 
+    try:
+        channel_map = [int(value) if value.strip() else None for value in args.channel_map.split(",")]
+        bearing_nums = [int(value) for value in args.bearings.split(',')] if args.bearings else None
+    except ValueError as e:
+        sys.exit(f"Invalid --channel-map or --bearings: {e}")
 
+    generate_report(args.run_dirs, bearing_nums, kinds=tuple(args.figures.split(',')), report_config=report_config, channel_map=channel_map)
@@ -0,0 +1,238 @@
+import os
+import sys
+import asyncio
+import numpy as np
+
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class MicroBatcherConfig:
+    """Micro-batcher configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    enabled: bool = os.getenv("MICRO_BATCHING", "0") == "1"
+    max_batch_size: int = int(os.getenv("MICRO_BATCH_MAX_SIZE", 32))
+    max_latency_ms: float = float(os.getenv("MICRO_BATCH_MAX_LATENCY_MS", 5))
+    max_queue_size: int = int(os.getenv("MICRO_BATCH_MAX_QUEUE", 1024))
+    max_in_flight: int = int(os.getenv("MICRO_BATCH_MAX_IN_FLIGHT", 4))
+
+
+class QueueFullError(RuntimeError):
+    """The micro-batch queue is full, the request is answered with 503 Service Unavailable"""
+
+
+class MicroBatcher:
+    """Collect concurrent single-frame predictions into batches.
+
+    A request that arrives while the service is idle is dispatched at once, so latency at low load
+    does not change. While batches are in flight, requests are collected for up to max_latency_ms
+    or max_batch_size frames and featurized as one stacked matrix with one predict per bearing model.
+    At most max_in_flight batches run at once, the queue holds at most max_queue_size frames
+    behind them and further frames are rejected with QueueFullError.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=None, max_latency_ms=None, max_queue_size=None, max_in_flight=None):
+        """Micro-batcher
+
+        Args:
+            predict_fn (coroutine function): (frames, bearing_nums) -> (predictions, features dict, errors)
+            max_batch_size (int, optional): maximum frames per batch. Defaults to the config value.
+            max_latency_ms (float, optional): maximum wait for more frames. Defaults to the config value.
+            max_queue_size (int, optional): maximum frames waiting for a batch. Defaults to the config value.
+            max_in_flight (int, optional): maximum batches predicted at once. Defaults to the config value.
+        """
+        self.batcher_config = MicroBatcherConfig()
+        self.predict_fn = predict_fn
+
+        if max_batch_size is not None:
+            self.batcher_config.max_batch_size = max_batch_size
+        if max_latency_ms is not None:
+            self.batcher_config.max_latency_ms = max_latency_ms
+        if max_queue_size is not None:
+            self.batcher_config.max_queue_size = max_queue_size
+        if max_in_flight is not None:
+            self.batcher_config.max_in_flight = max_in_flight
+
+        self.queue = None
+        self._task = None
+        self._batches = set()
+
+        # Items taken off the queue for the batch being collected
+        self._collecting = []
+
+        self.stats_counters = {"batches": 0, "frames": 0}
+
+    @property
+    def enabled(self):
+        return self.batcher_config.enabled
+
+    def qsize(self):
+        """Number of frames waiting for a batch"""
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def stats(self):
+        """Batching metrics
+
+        Returns:
+            dict: queued frames, batches in flight, batch count and mean batch size
+        """
+        batches = self.stats_counters["batches"]
+
+        return {
+            "queued": self.qsize(),
+            "in_flight": len(self._batches),
+            "batches": batches,
+            "mean_batch_size": self.stats_counters["frames"] / batches if batches else 0.0,
+        }
+
+    async def start(self):
+        """Start collecting batches on the running event loop"""
+        self.queue = asyncio.Queue(maxsize=self.batcher_config.max_queue_size)
+        self._collecting = []
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Started the micro-batcher (max batch size {self.batcher_config.max_batch_size}, max latency {self.batcher_config.max_latency_ms} ms)")
+
+    async def stop(self):
+        """Stop collecting, predict the frames already submitted and wait for the batches in flight"""
+        if self._task is None:
+            return None
+
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+        # Flush the batch the collector was building and the frames still queued, so no caller hangs
+        pending, self._collecting = self._collecting, []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+
+        for start in range(0, len(pending), self.batcher_config.max_batch_size):
+            await self._process(pending[start:start + self.batcher_config.max_batch_size])
+
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+        self.queue = None
+
+        return None
+
+    async def submit(self, frame, bearing_num):
+        """Predict one frame as part of a batch
+
+        Args:
+            frame (np array): 1-D frame
+            bearing_num (int): bearing number
+
+        Returns:
+            tuple: prediction, features dict of the frame
+        """
+        if self._task is None:
+            raise RuntimeError("The micro-batcher is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((frame, int(bearing_num), future))
+        except asyncio.QueueFull as e:
+            raise QueueFullError(f"{self.batcher_config.max_queue_size} frames are waiting for a micro-batch") from e
+
+        return await future
+
+    async def _next_batch(self):
+        """Wait for a frame and collect a batch
+
+        Returns:
+            list: (frame, bearing_num, future) items
+        """
+        loop = asyncio.get_running_loop()
+
+        # Collected in place, so stop can flush the items of a cancelled collection
+        batch = self._collecting = [await self.queue.get()]
+
+        # Nothing else to batch with, dispatch at once
+        if not self._batches and self.queue.empty():
+            return batch
+
+        deadline = loop.time() + self.batcher_config.max_latency_ms / 1000
+
+        while len(batch) < self.batcher_config.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        """Dispatch batches until cancelled"""
+        while True:
+            batch = await self._next_batch()
+            self._collecting = []
+
+            task = asyncio.create_task(self._process(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+            # Take no more frames while max_in_flight batches run, the bounded queue absorbs the burst
+            while len(self._batches) >= self.batcher_config.max_in_flight:
+                await asyncio.wait(set(self._batches), return_when=asyncio.FIRST_COMPLETED)
+
+    async def _process(self, batch):
+        """Predict a batch and resolve the futures of its callers
+
+        Args:
+            batch (list): (frame, bearing_num, future) items
+        """
+        self.stats_counters["batches"] += 1
+        self.stats_counters["frames"] += len(batch)
+
+        # Frames of the same length are stacked into one matrix
+        groups = dict()
+        for item in batch:
+            groups.setdefault(item[0].shape[-1], []).append(item)
+
+        for items in groups.values():
+            try:
+                frames = np.stack([frame for frame, _, _ in items])
+                bearing_nums = np.array([bearing_num for _, bearing_num, _ in items])
+
+                y_pred, features_dict, errors = await self.predict_fn(frames, bearing_nums)
+
+                for row, (_, _, future) in enumerate(items):
+                    if future.done():
+                        continue
+
+                    if row in errors:
+                        future.set_exception(ValueError(errors[row]))
+                    else:
+                        future.set_result((y_pred[row], {name: values[row] for name, values in features_dict.items()}))
+
+            except Exception as e:
+                error_message = CustomException(e, sys)
+                logger.error(f"Micro-batch prediction failed: {error_message}")
+
+                for _, _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+        return None
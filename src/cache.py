@@ -0,0 +1,152 @@
+import os
+import time
+import asyncio
+import hashlib
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass
+class ResponseCacheConfig:
+    """Response cache configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    max_size: int = int(os.getenv("RESPONSE_CACHE_SIZE", 10000))
+    ttl: float = float(os.getenv("RESPONSE_CACHE_TTL", 600))
+
+
+def payload_digest(body):
+    """Digest of a request payload
+
+    Args:
+        body (bytes): request body
+
+    Returns:
+        str: hex digest
+    """
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Bounded LRU cache of responses with a time to live.
+
+    Concurrent requests for a key that is still being computed wait for that computation instead
+    of starting their own. Meant to be used from the event loop only, so it needs no locking.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.cache_config = ResponseCacheConfig()
+
+        if max_size is not None:
+            self.cache_config.max_size = max_size
+        if ttl is not None:
+            self.cache_config.ttl = ttl
+
+        # key -> (expiry time, response) in least recently used order
+        self._entries = OrderedDict()
+        self._pending = dict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Get a cached response
+
+        Args:
+            key (str): cache key
+
+        Returns:
+            the response, None if it is not cached or expired
+        """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        expires_at, response = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+
+        return response
+
+    def put(self, key, response):
+        """Cache a response, evicting the least recently used ones beyond max_size
+
+        Args:
+            key (str): cache key
+            response: the response
+        """
+        self._entries[key] = (time.monotonic() + self.cache_config.ttl, response)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.cache_config.max_size:
+            self._entries.popitem(last=False)
+
+        return None
+
+    async def get_or_create(self, key, factory):
+        """Get a cached response or create it with factory
+
+        Args:
+            key (str): cache key
+            factory (callable): coroutine function creating the response
+
+        Returns:
+            tuple: the response and whether it came from the cache
+        """
+        response = self.get(key)
+        if response is not None:
+            self.hits += 1
+            return response, True
+
+        # The same request is already being computed (e.g. a retry after a timeout)
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending), True
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+
+        try:
+            response = await factory()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Nobody else may be waiting, mark the exception as retrieved
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        else:
+            self.put(key, response)
+            future.set_result(response)
+        finally:
+            self._pending.pop(key, None)
+
+        return response, False
+
+    def stats(self):
+        """Cache size and hit rate
+
+        Returns:
+            dict: size, hits, misses and hit rate
+        """
+        lookups = self.hits + self.misses
+
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
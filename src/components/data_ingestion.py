@@ -7,7 +7,9 @@ from rarfile import RarFile
 from dataclasses import dataclass
 
 from src.exception import CustomException
-from src.logger import logger
+from src.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 @dataclass
@@ -1,14 +1,17 @@
 import os 
 import sys
 import numpy as np
-import pandas as pd
 
 from dataclasses import dataclass
 
 from src.utils import convert_to_timestamp
 from src.components.features import calc_fft, calc_spectrum_features, calc_time_features
 from src.exception import CustomException
-from src.logger import logger
+from src.logger import get_logger
+from src.metrics import stage_timer
+from src.profiling import profile_stage
+
+logger = get_logger(__name__)
 
 
 @dataclass
@@ -40,7 +43,7 @@ class DataTransformation:
         try:
             # Extract the data from the individual files
             data = np.loadtxt(data_filepath, delimiter=self.ingestion_config.file_delimiter, dtype=float)[:,self.bearing_num-1]
-            logger.info(f'Data extraction from file {data_filepath} completed successfully. Data Shape: {data.shape}')
+            logger.debug('Data extraction from file %s completed successfully. Data Shape: %s', data_filepath, data.shape)
             
         except Exception as e:
             error_message = CustomException(e, sys)
@@ -61,19 +64,21 @@ class DataTransformation:
             features = dict()
 
             # Calculate the features from the data
-            centered_data, fft_amplitudes, _ = calc_fft(data, sampling_rate)
+            with profile_stage("fft"):
+                centered_data, fft_amplitudes, _ = calc_fft(data, sampling_rate)
 
-            # Calculate the spectrum features
-            spectrum_features = calc_spectrum_features(fft_amplitudes)
-            features.update(spectrum_features)
-            logger.info(f'Spectrum features calculated successfully.')
+            with profile_stage("statistics"):
+                # Calculate the spectrum features
+                spectrum_features = calc_spectrum_features(fft_amplitudes)
+                features.update(spectrum_features)
+                logger.debug('Spectrum features calculated successfully.')
 
-            # Calculate the time domain features
-            time_features = calc_time_features(centered_data)
-            features.update(time_features)
-            logger.info(f'Time domain features calculated successfully.')
+                # Calculate the time domain features
+                time_features = calc_time_features(centered_data)
+                features.update(time_features)
+                logger.debug('Time domain features calculated successfully.')
 
-            logger.info(f'Feature calculated successfully. Num features: {len(features)}')
+            logger.debug('Feature calculated successfully. Num features: %d', len(features))
 
         except Exception as e:
             error_message = CustomException(e, sys)
@@ -81,6 +86,36 @@ class DataTransformation:
 
         return features
 
+    def featurize_batch(self, frames, sampling_rate):
+        """Calculate the features of many frames at once
+
+        Args:
+            frames (np array): (n_frames, n_samples) data
+            sampling_rate (int): Sampling rate of the data
+
+        Returns:
+            dict: feature name -> np array with one value per frame
+        """
+        try:
+            features = dict()
+
+            # One FFT over all the frames
+            with stage_timer("fft"):
+                centered_data, fft_amplitudes, _ = calc_fft(frames, sampling_rate)
+
+            # Calculate the spectrum and the time domain features of every frame
+            with stage_timer("statistics"):
+                features.update(calc_spectrum_features(fft_amplitudes))
+                features.update(calc_time_features(centered_data))
+
+            logger.debug('Feature calculated successfully for %d frames. Num features: %d', len(frames), len(features))
+
+        except Exception as e:
+            # The callers report the failed frames, a partial features dict would fail them later
+            raise CustomException(e, sys)
+
+        return features
+
     def featurize_all(self, data_dir, sampling_rate):
         """Calculate the features from the data
 
@@ -95,34 +130,39 @@ class DataTransformation:
         try:    
             features_list = []
 
+            with profile_stage("list_files"):
+                file_names = sorted(os.listdir(data_dir))
+
             # Loop over all the data files and obtain the features for each
-            for file_name in sorted(os.listdir(data_dir)):
+            for file_name in file_names:
 
                 # Initialize the features dictionary
                 features = dict()
 
                 # Obtain the path to the data file
                 file_path = os.path.join(data_dir, file_name)
-                logger.info(f'Processing file: {file_path}')
+                logger.debug('Processing file: %s', file_path)
 
                 # Obtain the timestamp of the data file
                 timestamp = convert_to_timestamp(date_string=file_path.split('/')[-1])
                 features.update({'timestamp':timestamp})
 
                 # Extract the data from the individual files
-                data = self.extract_data_file(file_path)
+                with profile_stage("loadtxt"):
+                    data = self.extract_data_file(file_path)
 
                 # Calculate the features from the data
-                calc_features = self.featurize(data, sampling_rate)
+                with profile_stage("featurize"):
+                    calc_features = self.featurize(data, sampling_rate)
                 features.update(calc_features)
 
-                logger.info(f'Feature calculation completed successfully. Num features: {features}')
+                logger.debug('Features of %s: %s', file_path, features)
 
                 # Append the calculate features to a list
                 features_list.append(features)
 
-                # Append the timestamp to the features
-                logger.info('Feature calculation completed successfully.')
+
+            logger.info(f'Feature calculation completed successfully for {len(features_list)} files.')
 
         except Exception as e:
             error_message = CustomException(e, sys)
@@ -140,13 +180,18 @@ class DataTransformation:
             pandas dataframe
         """
         try:
+            # pandas is only needed offline, keep it off the serving import path
+            import pandas as pd
+
             # Transform the data to a pandas dataframe
-            df = pd.DataFrame(features_list)
+            with profile_stage("dataframe"):
+                df = pd.DataFrame(features_list)
             logger.info(f'Dataframe transformation completed successfully. Dataframe Shape: {df.shape}')
 
             if save:
                 # Save the dataframe to a csv file
-                df.to_csv(os.path.join(self.ingestion_config.transformed_data_dir, f'processed_data_b{self.bearing_num}.csv'), index=False)
+                with profile_stage("csv_write"):
+                    df.to_csv(os.path.join(self.ingestion_config.transformed_data_dir, f'processed_data_b{self.bearing_num}.csv'), index=False)
                 logger.info(f'Dataframe saved successfully at {self.ingestion_config.transformed_data_dir}')
 
         except Exception as e:
@@ -175,9 +220,10 @@ class DataTransformation:
 
             if save:
                 # Save the train, validation and test sets to csv files
-                train_df.to_csv(os.path.join(self.ingestion_config.transformed_data_dir, f'train_data_b{self.bearing_num}.csv'), index=False)
-                val_df.to_csv(os.path.join(self.ingestion_config.transformed_data_dir, f'val_data_b{self.bearing_num}.csv'), index=False)
-                test_df.to_csv(os.path.join(self.ingestion_config.transformed_data_dir, f'test_data_b{self.bearing_num}.csv'), index=False)
+                with profile_stage("csv_write"):
+                    train_df.to_csv(os.path.join(self.ingestion_config.transformed_data_dir, f'train_data_b{self.bearing_num}.csv'), index=False)
+                    val_df.to_csv(os.path.join(self.ingestion_config.transformed_data_dir, f'val_data_b{self.bearing_num}.csv'), index=False)
+                    test_df.to_csv(os.path.join(self.ingestion_config.transformed_data_dir, f'test_data_b{self.bearing_num}.csv'), index=False)
                 logger.info(f'Train, validation and test sets saved successfully at {self.ingestion_config.transformed_data_dir}')
 
         except Exception as e:
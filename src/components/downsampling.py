@@ -0,0 +1,131 @@
+import numpy as np
+
+
+def minmax_indices(y, n_buckets):
+    """Indices of the minimum and the maximum of y in each of n_buckets equal buckets
+
+    Args:
+        y (np array): values
+        n_buckets (int): number of buckets
+
+    Returns:
+        np array: sorted indices, at most 2 * n_buckets
+    """
+    y = np.asarray(y)
+    n_buckets = max(1, min(int(n_buckets), len(y)))
+
+    if len(y) == 0:
+        return np.array([], dtype=int)
+
+    # Equal buckets as the rows of a matrix, the shorter last bucket on its own
+    bucket_size = -(-len(y) // n_buckets)
+    n_full = len(y) // bucket_size
+    buckets = y[:n_full * bucket_size].reshape(n_full, bucket_size)
+
+    offsets = np.arange(n_full) * bucket_size
+    indices = [offsets + buckets.argmin(axis=1), offsets + buckets.argmax(axis=1)]
+
+    rest = y[n_full * bucket_size:]
+    if len(rest):
+        indices.append(n_full * bucket_size + np.array([rest.argmin(), rest.argmax()]))
+
+    return np.unique(np.concatenate(indices))
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets
+
+    The first and the last point are kept. The points in between are split into n_out - 2 buckets
+    and each bucket keeps the point forming the largest triangle with the point kept in the previous
+    bucket and the mean of the next bucket, which preserves peaks and the overall shape.
+
+    Args:
+        x (np array): increasing x values
+        y (np array): y values
+        n_out (int): number of points to keep
+
+    Returns:
+        np array: sorted indices
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:max(n_out, 0)], dtype=int)
+
+    # Bucket edges of the points between the first and the last
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+
+    # Mean point of every bucket, the last point stands in for the bucket after the last one
+    counts = np.diff(edges)
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts, x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts, y[-1])
+
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_x, next_y = mean_x[bucket + 1], mean_y[bucket + 1]
+
+        # Twice the triangle areas of the candidates of this bucket
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) - (x[previous] - x[start:end]) * (next_y - y[previous]))
+
+        previous = start + int(areas.argmax())
+        indices[bucket + 1] = previous
+
+    return indices
+
+
+def transition_indices(labels, n_buckets):
+    """Indices of the points around the label changes, e.g. the healthy/faulty transitions
+
+    When there are more changes than buckets, each bucket keeps its lowest and highest label instead.
+
+    Args:
+        labels (np array): labels
+        n_buckets (int): number of buckets
+
+    Returns:
+        np array: sorted indices
+    """
+    labels = np.asarray(labels)
+    changes = np.flatnonzero(labels[1:] != labels[:-1])
+
+    if len(changes) > n_buckets:
+        return minmax_indices(labels, n_buckets)
+
+    return np.unique(np.concatenate([changes, changes + 1]))
+
+
+def downsample(x, y, n_out, method="lttb", labels=None):
+    """Indices of the points to plot a series with about n_out points
+
+    Args:
+        x (np array): increasing x values
+        y (np array): y values
+        n_out (int): target number of points, e.g. the plot width in pixels
+        method (str, optional): "lttb" or "minmax". Defaults to "lttb".
+        labels (np array, optional): labels whose changes are kept, e.g. the health status. Defaults to None.
+
+    Returns:
+        np array: sorted indices of the points to keep
+    """
+    if len(y) <= n_out:
+        return np.arange(len(y))
+
+    if method == "lttb":
+        indices = lttb_indices(x, y, n_out)
+    elif method == "minmax":
+        indices = minmax_indices(y, n_out // 2)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+
+    if labels is not None:
+        indices = np.union1d(indices, transition_indices(labels, n_out // 2))
+
+    return indices
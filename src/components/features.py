@@ -2,16 +2,20 @@ import numpy as np
 import sys
 
 from scipy.fft import fft, fftfreq
-from scipy.signal.windows import hann, hamming
 from scipy.stats import kurtosis, skew
 
 from src.exception import CustomException
-from src.logger import logger
+from src.logger import get_logger
+
+logger = get_logger(__name__)
 
 
 def calc_fft(arr, sampling_rate, resolution=None, window=None, x_unit=None, y_unit=None, fMax=None):
     """Calculate the FFT from the data
 
+    The FFT is taken along the last axis, so a (n_frames, n_samples) array gives the spectra of
+    all the frames in one call.
+
     args:
         arr (np array): data
         sampling_rate (int): sampling rate
@@ -25,10 +29,11 @@ def calc_fft(arr, sampling_rate, resolution=None, window=None, x_unit=None, y_un
     """
     try:
         # Remove trailing zeros from the data
-        duration = len(arr) // sampling_rate
+        duration = arr.shape[-1] // sampling_rate
 
-        arr = arr[0 : int(duration * sampling_rate)]
-        arr = 9.8 * arr
+        # Scale in float64 so float32 (e.g. binary) input gives the same features as float64 input
+        arr = arr[..., 0 : int(duration * sampling_rate)]
+        arr = np.multiply(arr, 9.8, dtype=np.float64)
 
         # Check if fMax is greater than sampling rate/2 if yes then limit it to sampling rate/2
         if fMax == None:
@@ -43,19 +48,21 @@ def calc_fft(arr, sampling_rate, resolution=None, window=None, x_unit=None, y_un
             numBins = int((duration * sampling_rate) / resolution)
 
         # Calculate the mean value from the data
-        mean_value = np.mean(arr)
+        mean_value = np.mean(arr, axis=-1, keepdims=True)
 
         # Subtract the mean value from the data (Removing the baseline)
         arr = arr - mean_value
 
-        # Applying the window functions
+        # Applying the window functions (scipy.signal is slow to import, only load it when needed)
         if window == "hanning":
-            arr *= hann(len(arr), False)
+            from scipy.signal.windows import hann
+            arr *= hann(arr.shape[-1], False)
         elif window == "hamming":
-            arr *= hamming(len(arr), False)
+            from scipy.signal.windows import hamming
+            arr *= hamming(arr.shape[-1], False)
         
         # FFT
-        raw_fft_amplitudes = (2 / numBins * np.abs(fft(arr, n=numBins))[:numBins // 2])
+        raw_fft_amplitudes = (2 / numBins * np.abs(fft(arr, n=numBins, axis=-1))[..., :numBins // 2])
 
         # If log scale is selected then calculate the log output
         if y_unit == "log":
@@ -68,7 +75,7 @@ def calc_fft(arr, sampling_rate, resolution=None, window=None, x_unit=None, y_un
             raw_fft_frequencies = fftfreq(numBins, 1.0 / sampling_rate)[: numBins // 2]
                     
         # Limit the FFT output to fMax
-        fft_amplitudes  = raw_fft_amplitudes[: int(fMax / (sampling_rate / numBins))]
+        fft_amplitudes  = raw_fft_amplitudes[..., : int(fMax / (sampling_rate / numBins))]
         fft_frequencies = raw_fft_frequencies[: int(fMax / (sampling_rate / numBins))]
 
     except Exception as e:
@@ -101,7 +108,7 @@ def zero_crossings(data, threshold=0.015):
     """Calculates the no. of zero crossings in given data.
 
     INPUT:
-        data: a 1-D numpy array
+        data: a numpy array, the crossings are counted along the last axis
         threshold: Required minimum difference between consecutive entries in the data (useful in case of noisy data),default value is 0.015
     RETURNS:
         the no. of zero crossings
@@ -112,22 +119,23 @@ def zero_crossings(data, threshold=0.015):
         Out: 2.0
 
     """
-    a, b = data[:-1], data[1:]
+    a, b = data[..., :-1], data[..., 1:]
 
     a1, b1 = sign(a), sign(b)
 
     diff = abs(a - b)  # Taking difference between consecutive values
 
-    a1, b1 = a1[diff >= threshold], b1[diff >= threshold]
+    # Only count the pairs whose difference reaches the threshold
+    valid = diff >= threshold
 
     zc = np.floor(
-        np.sum(abs(a1 - b1)) / 2
+        np.sum(abs(a1 - b1) * valid, axis=-1) / 2
     )  # Opposite signs get added up to 2 and finally we divide by 2 to get our ans
     return zc
 
 
 def calc_rms(arr):
-    """Calculate the RMS from the data
+    """Calculate the RMS from the data along the last axis
 
     Args:
         arr (np array): data
@@ -135,11 +143,11 @@ def calc_rms(arr):
     Returns:
         float: RMS value
     """
-    return np.sqrt(np.mean(np.square(arr)))
+    return np.sqrt(np.mean(np.square(arr), axis=-1))
 
 
 def calc_spectrum_features(fft_amplitudes):
-    """Calculate the spectrum features from the data
+    """Calculate the spectrum features from the data along the last axis
     
     Args:
         fft_data (np array): data
@@ -148,12 +156,12 @@ def calc_spectrum_features(fft_amplitudes):
         dict: spectrum features
     """
     rms          = calc_rms(fft_amplitudes)
-    max_amp      = np.amax(fft_amplitudes)
+    max_amp      = np.amax(fft_amplitudes, axis=-1)
     crest_Factor = max_amp / rms
-    energy      = np.sum(np.square(fft_amplitudes))
-    form_factor_absmean = float(rms / (abs(fft_amplitudes).mean()))
-    skewness_val = skew(fft_amplitudes)
-    kurtosis_val = kurtosis(fft_amplitudes)
+    energy      = np.sum(np.square(fft_amplitudes), axis=-1)
+    form_factor_absmean = rms / abs(fft_amplitudes).mean(axis=-1)
+    skewness_val = skew(fft_amplitudes, axis=-1)
+    kurtosis_val = kurtosis(fft_amplitudes, axis=-1)
 
     spectrum_features = {
         "frms": rms,
@@ -169,7 +177,7 @@ def calc_spectrum_features(fft_amplitudes):
 
 
 def calc_time_features(time_data):
-    """Calculate the time features from the data
+    """Calculate the time features from the data along the last axis
 
     Args:
         data (np array): data
@@ -178,12 +186,12 @@ def calc_time_features(time_data):
         dict: time domain features
     """
     rms     = calc_rms(time_data)
-    max_amp = np.amax(time_data)
+    max_amp = np.amax(time_data, axis=-1)
     crest_Factor  = max_amp / rms
-    zero_crossing = int(zero_crossings(time_data))
-    form_factor_absmean = float(rms / (abs(time_data).mean()))
-    data_kurt = kurtosis(time_data)
-    data_skew = skew(time_data)
+    zero_crossing = zero_crossings(time_data).astype(int)
+    form_factor_absmean = rms / abs(time_data).mean(axis=-1)
+    data_kurt = kurtosis(time_data, axis=-1)
+    data_skew = skew(time_data, axis=-1)
 
     time_features = {
         "trms": rms,
@@ -1,21 +1,97 @@
 import os
 import sys
+import time
 import pandas as pd
 import numpy as np
 from dataclasses import dataclass
 
+from joblib import Parallel, delayed
 from sklearn.ensemble import IsolationForest
 
 from src.exception import CustomException
-from src.logger import logger
+from src.logger import get_logger
 
+from src.profiling import profile_stage
 from src.utils import save_object, convert_prediction_to_label
 
+logger = get_logger(__name__)
+
+
 @dataclass
 class ModelTrainerConfig:
     trained_model_dir = os.path.join("artifacts", "models")
     processed_data_dir = os.path.join("artifacts", "data", "transformed")
     accepted_model_accuracy = 0.80
+    cv_train_size = 400
+    cv_n_splits = 5
+    cv_n_jobs = -1
+    sample_size = 100_000
+    chunk_size = 10_000
+
+
+def time_series_folds(n_samples, n_splits=5, val_size=None, max_train_size=None):
+    """Generate rolling-origin folds over time ordered rows
+
+    The training window always ends where the validation window starts. It grows with
+    every fold (expanding window) unless max_train_size is set (sliding window).
+
+    Args:
+        n_samples (int): Number of time ordered rows
+        n_splits (int, optional): Number of folds. Defaults to 5.
+        val_size (int, optional): Rows in each validation window. Defaults to n_samples // (n_splits + 1).
+        max_train_size (int, optional): Maximum rows in the training window. Defaults to None.
+
+    Returns:
+        list: (train slice, validation slice) tuple for each fold
+    """
+    if val_size is None:
+        val_size = n_samples // (n_splits + 1)
+
+    # The first fold needs at least one training row before its validation window
+    first_val_start = n_samples - n_splits * val_size
+    if val_size < 1 or first_val_start < 1:
+        raise ValueError(f"Cannot make {n_splits} folds of size {val_size} from {n_samples} rows")
+
+    folds = []
+    for fold in range(n_splits):
+        val_start = first_val_start + fold * val_size
+        train_start = 0 if max_train_size is None else max(0, val_start - max_train_size)
+
+        # Slices keep the fold data as views of the cached feature array
+        folds.append((slice(train_start, val_start), slice(val_start, val_start + val_size)))
+
+    return folds
+
+
+def fit_and_score_fold(X, train_slice, val_slice, params):
+    """Fit the model on one fold and score it on the validation window
+
+    Args:
+        X (np array): Time ordered feature array
+        train_slice (slice): Rows of the training window
+        val_slice (slice): Rows of the validation window
+        params (dict): Hyperparameters for the model
+
+    Returns:
+        dict: fold sizes, accuracy and fit/score timings
+    """
+    X_train, X_val = X[train_slice], X[val_slice]
+
+    start = time.perf_counter()
+    model = IsolationForest(**params).fit(X_train)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred_val = convert_prediction_to_label(model.predict(X_val))
+    score_time = time.perf_counter() - start
+
+    return {
+        "train_size": len(X_train),
+        "val_size": len(X_val),
+        "accuracy": float(np.mean(y_pred_val == 0)),
+        "fit_time": fit_time,
+        "score_time": score_time,
+    }
 
 
 class ModelTrainer:
@@ -23,19 +99,152 @@ class ModelTrainer:
         self.model_trainer_config = ModelTrainerConfig()
         self.bearing_num = bearing_num
 
-    def prepare_training_data(self):
-        """Prepare the training data for training the ML model"""
+    def prepare_training_data(self, out_of_core=False):
+        """Prepare the training data for training the ML model
+
+        Args:
+            out_of_core (bool, optional): Stream the train split into a bounded reservoir sample
+                instead of loading it whole. Defaults to False.
+        """
         try:
-            train_df = pd.read_csv(os.path.join(self.model_trainer_config.processed_data_dir, f"train_data_b{self.bearing_num}.csv"))
-            val_df   = pd.read_csv(os.path.join(self.model_trainer_config.processed_data_dir, f"val_data_b{self.bearing_num}.csv"))
+            if out_of_core:
+                X_train = self.prepare_training_sample()
+            else:
+                with profile_stage("read_csv"):
+                    train_df = pd.read_csv(os.path.join(self.model_trainer_config.processed_data_dir, f"train_data_b{self.bearing_num}.csv"))
+                X_train = train_df.drop(columns=["timestamp"])
 
-            X_train = train_df.drop(columns=["timestamp"])
-            X_val   = val_df.drop(columns=["timestamp"])
+            with profile_stage("read_csv"):
+                val_df = pd.read_csv(os.path.join(self.model_trainer_config.processed_data_dir, f"val_data_b{self.bearing_num}.csv"))
+            X_val  = val_df.drop(columns=["timestamp"])
         
         except Exception as e:
             raise CustomException(e, sys)
         
         return X_train, X_val
+
+    def prepare_training_sample(self, data_filepath=None, sample_size=None, chunk_size=None, random_state=None):
+        """Stream the training data in chunks and keep a bounded reservoir sample of it
+
+        Memory stays fixed at sample_size rows of float32 features however long the
+        training history is, and every row has the same probability of being kept.
+
+        Args:
+            data_filepath (str, optional): CSV with the processed features. Defaults to the train split.
+            sample_size (int, optional): Maximum rows in the sample. Defaults to the config value.
+            chunk_size (int, optional): Rows read per chunk. Defaults to the config value.
+            random_state (int, optional): Seed for the sampler. Defaults to None.
+
+        Returns:
+            pandas dataframe: sampled training data
+        """
+        try:
+            if data_filepath is None:
+                data_filepath = os.path.join(self.model_trainer_config.processed_data_dir, f"train_data_b{self.bearing_num}.csv")
+            if sample_size is None:
+                sample_size = self.model_trainer_config.sample_size
+            if chunk_size is None:
+                chunk_size = self.model_trainer_config.chunk_size
+
+            # Read only the feature columns, directly as float32
+            columns = [col for col in pd.read_csv(data_filepath, nrows=0).columns if col != "timestamp"]
+            chunks = pd.read_csv(data_filepath, usecols=columns, dtype=np.float32, chunksize=chunk_size)
+
+            rng = np.random.default_rng(random_state)
+            reservoir = np.empty((sample_size, len(columns)), dtype=np.float32)
+            n_seen = 0
+
+            for chunk in chunks:
+                values = chunk[columns].to_numpy(dtype=np.float32)
+
+                # Fill the reservoir until it holds sample_size rows
+                n_fill = min(max(sample_size - n_seen, 0), len(values))
+                reservoir[n_seen:n_seen + n_fill] = values[:n_fill]
+
+                # Algorithm R: the row with global index i replaces a random slot with probability sample_size / (i + 1)
+                rest = values[n_fill:]
+                if len(rest):
+                    row_index = np.arange(n_seen + n_fill, n_seen + len(values))
+                    slots = rng.integers(0, row_index + 1)
+                    keep = slots < sample_size
+                    reservoir[slots[keep]] = rest[keep]
+
+                n_seen += len(values)
+
+            X_train = pd.DataFrame(reservoir[:min(n_seen, sample_size)], columns=columns)
+            logger.info(f"Sampled {len(X_train)} of {n_seen} training rows from {data_filepath}")
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+        return X_train
+
+    def prepare_cv_data(self, train_size=None):
+        """Prepare the time ordered feature table for cross validation
+
+        Args:
+            train_size (int, optional): Number of leading (healthy) rows to use. Defaults to the config value.
+
+        Returns:
+            np array: feature array
+        """
+        try:
+            if train_size is None:
+                train_size = self.model_trainer_config.cv_train_size
+
+            with profile_stage("read_csv"):
+                df = pd.read_csv(os.path.join(self.model_trainer_config.processed_data_dir, f"processed_data_b{self.bearing_num}.csv"), nrows=train_size)
+            df = df.sort_values("timestamp").drop(columns=["timestamp"])
+
+            # Convert once so that every fold is a view of the same contiguous array
+            X = np.ascontiguousarray(df.to_numpy(dtype=np.float64))
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+        return X
+
+    def cross_validate(self, X, params:dict, n_splits=None, val_size=None, max_train_size=None, n_jobs=None):
+        """Evaluate the ML model with rolling-origin cross validation
+
+        Args:
+            X (np array): Time ordered feature array
+            params (dict): Hyperparameters for the model
+            n_splits (int, optional): Number of folds. Defaults to the config value.
+            val_size (int, optional): Rows in each validation window. Defaults to None.
+            max_train_size (int, optional): Maximum rows in the training window. Defaults to None (expanding window).
+            n_jobs (int, optional): Number of folds evaluated in parallel. Defaults to the config value.
+
+        Returns:
+            list: per fold results (sizes, accuracy, fit_time, score_time)
+        """
+        try:
+            if n_splits is None:
+                n_splits = self.model_trainer_config.cv_n_splits
+            if n_jobs is None:
+                n_jobs = self.model_trainer_config.cv_n_jobs
+
+            if isinstance(X, pd.DataFrame):
+                X = X.drop(columns=["timestamp"], errors="ignore").to_numpy(dtype=np.float64)
+            X = np.ascontiguousarray(X)
+
+            folds = time_series_folds(len(X), n_splits=n_splits, val_size=val_size, max_train_size=max_train_size)
+
+            with profile_stage("cross_validate", n_folds=len(folds)):
+                cv_results = Parallel(n_jobs=n_jobs)(
+                    delayed(fit_and_score_fold)(X, train_slice, val_slice, params) for train_slice, val_slice in folds
+                )
+
+            for fold, result in enumerate(cv_results):
+                result["fold"] = fold
+
+            accuracies = [result["accuracy"] for result in cv_results]
+            logger.info(f"Cross validation accuracy: {np.mean(accuracies):.3f} +/- {np.std(accuracies):.3f} over {len(folds)} folds")
+
+        except Exception as e:
+            raise CustomException(e, sys)
+
+        return cv_results
         
     def evaluate_models(self, X_val, model):
         """Evaluate the ML model on the validation data
@@ -49,7 +258,8 @@ class ModelTrainer:
         """
         try:
             # Get the scores on the validation data
-            y_pred_val = model.predict(X_val)  
+            with profile_stage("predict"):
+                y_pred_val = model.predict(X_val)  
             y_pred_val = convert_prediction_to_label(y_pred_val)
 
             # Count the number of anomalies in the validation data
@@ -78,10 +288,12 @@ class ModelTrainer:
             model = IsolationForest(**params)
             
             # Train the model
-            model.fit(X_train)
+            with profile_stage("fit", n_rows=len(X_train)):
+                model.fit(X_train)
 
             # Get the scores on the training data
-            y_pred_train = model.predict(X_train)
+            with profile_stage("predict"):
+                y_pred_train = model.predict(X_train)
             y_pred_train = convert_prediction_to_label(y_pred_train)
 
             # Evaluate the model on the validation data
@@ -91,10 +303,11 @@ class ModelTrainer:
             if model_accuracy < self.model_trainer_config.accepted_model_accuracy:
                 raise Exception(f"Model accuracy is less than {self.model_trainer_config.accepted_model_accuracy}")
             else:
-                save_object(
-                    obj=model,
-                    filepath=os.path.join(self.model_trainer_config.trained_model_dir, f"model_b{self.bearing_num}.pkl")
-                )
+                with profile_stage("save_model"):
+                    save_object(
+                        obj=model,
+                        filepath=os.path.join(self.model_trainer_config.trained_model_dir, f"model_b{self.bearing_num}.pkl")
+                    )
                 logger.info(f"Model saved at {os.path.join(self.model_trainer_config.trained_model_dir, f'model_b{self.bearing_num}.pkl')}")
                 
         except Exception as e:
@@ -112,10 +325,12 @@ class ModelTrainer:
             np array: predictions on the test data
         """
         try:
-            df_test = pd.read_csv(os.path.join(self.model_trainer_config.processed_data_dir, f"test_data_b{self.bearing_num}.csv"))
+            with profile_stage("read_csv"):
+                df_test = pd.read_csv(os.path.join(self.model_trainer_config.processed_data_dir, f"test_data_b{self.bearing_num}.csv"))
             X_test = df_test.drop(columns=["timestamp"])
 
-            y_pred_test = model.predict(X_test)
+            with profile_stage("predict"):
+                y_pred_test = model.predict(X_test)
             y_pred_test = convert_prediction_to_label(y_pred_test)
 
             logger.info(f"Successfully predicted on the test data.")
@@ -134,9 +349,11 @@ class ModelTrainer:
             save_dir (str, optional): Directory to save the predictions. Defaults to 'artifacts/data/predictions'.
         """
         try:
-            df = pd.read_csv(data_filepath)
+            with profile_stage("read_csv"):
+                df = pd.read_csv(data_filepath)
             df["scores"] = y_preds
-            df.to_csv(os.path.join(save_dir, f'predictions_b{self.bearing_num}.csv'), index=False)
+            with profile_stage("csv_write"):
+                df.to_csv(os.path.join(save_dir, f'predictions_b{self.bearing_num}.csv'), index=False)
 
             logger.info(f"Successfully saved the predictions on the test data.")
 
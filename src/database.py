@@ -1,28 +1,88 @@
 import os
 import sys
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pymongo.mongo_client import MongoClient
 from dotenv import load_dotenv
 
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 
-from src.logger import logger
+from src.logger import get_logger
 from src.exception import CustomException
+from src.metrics import stage_timer
+from src.storage import MongoStorage, SQLiteStorage, StorageConfig, HEALTH_FIELDS, range_query
+
+logger = get_logger(__name__)
 
 load_dotenv()
 
+
+@dataclass
+class DatabaseConfig:
+    """Database connection configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    max_pool_size: int = int(os.getenv("MONGO_MAX_POOL_SIZE", 10))
+    min_pool_size: int = int(os.getenv("MONGO_MIN_POOL_SIZE", 0))
+    server_selection_timeout_ms: int = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    connect_timeout_ms: int = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+    socket_timeout_ms: int = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 10000))
+
+
+@dataclass
+class WriteBehindConfig:
+    """Write-behind queue configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    batch_size: int = int(os.getenv("WRITE_BATCH_SIZE", 500))
+    flush_interval: float = float(os.getenv("WRITE_FLUSH_INTERVAL", 1.0))
+    max_queue_size: int = int(os.getenv("WRITE_MAX_QUEUE_SIZE", 10000))
+    max_retries: int = int(os.getenv("WRITE_MAX_RETRIES", 3))
+    retry_backoff: float = float(os.getenv("WRITE_RETRY_BACKOFF", 0.5))
+
+
+# Queued by WriteBehindQueue.stop to flush the partial batch without waiting for the flush interval
+_FLUSH = object()
+
+# Long-lived clients and storages of this process, keyed by the local flag and by
+# (backend, db_name, collection_name, local)
+_clients = dict()
+_storages = dict()
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
 def database_connection(local=True):
     """Connect to the MongoDB database
     
     local (bool): whether to connect to the local database or the cloud database
     """
+    database_config = DatabaseConfig()
+
+    # Connection pool and timeout options
+    client_options = {
+        "maxPoolSize": database_config.max_pool_size,
+        "minPoolSize": database_config.min_pool_size,
+        "serverSelectionTimeoutMS": database_config.server_selection_timeout_ms,
+        "connectTimeoutMS": database_config.connect_timeout_ms,
+        "socketTimeoutMS": database_config.socket_timeout_ms,
+    }
+
     if local:
-        client = MongoClient("localhost", 27017)
+        client = MongoClient("localhost", 27017, **client_options)
     else:
         # Get the database URI from the environment variables
         database_uri = os.getenv("DATABASE_URL")
 
         # Create a new client and connect to the server
-        client = MongoClient(database_uri)
+        client = MongoClient(database_uri, **client_options)
 
     # Send a ping to confirm a successful connection
     try:
@@ -35,8 +95,79 @@ def database_connection(local=True):
     return client
 
 
+def get_client(local=True):
+    """Get the long-lived client of this process, connecting on first use
+
+    MongoClient is not fork safe, so clients inherited from a parent process are discarded.
+
+    local (bool): whether to connect to the local database or the cloud database
+    """
+    global _clients_pid
+
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            _clients.clear()
+            _clients_pid = os.getpid()
+
+        client = _clients.get(local)
+        if client is None:
+            client = database_connection(local=local)
+            _clients[local] = client
+
+    return client
+
+
+def close_clients():
+    """Close the long-lived clients and storages of this process"""
+    with _clients_lock:
+        for storage in _storages.values():
+            storage.close()
+        _storages.clear()
+
+        if _clients_pid == os.getpid():
+            for client in _clients.values():
+                client.close()
+        _clients.clear()
+
+    logger.info("Closed the database clients.")
+
+    return None
+
+
+def get_storage(db_name, collection_name, local=True):
+    """Get the long-lived storage of a collection for the configured backend
+
+    DATABASE_BACKEND selects MongoDB ("mongo", the default) or the embedded SQLite files
+    ("sqlite"), which need no database server.
+
+    Args:
+        db_name (str): the name of the database
+        collection_name (str): the name of the collection
+        local (bool): whether to connect to the local database or the cloud database (MongoDB only)
+
+    Returns:
+        Storage: the storage
+    """
+    backend = StorageConfig().backend.lower()
+    key = (backend, db_name, collection_name, local)
+
+    with _clients_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            if backend == "sqlite":
+                storage = SQLiteStorage(db_name, collection_name)
+            elif backend == "mongo":
+                storage = MongoStorage(db_name, collection_name, local=local, client_factory=get_client)
+            else:
+                raise ValueError(f"Unknown database backend: {backend}")
+
+            _storages[key] = storage
+
+    return storage
+
+
 def insert_data(db_name, collection_name, data, local=True):
-    """Insert data into the MongoDB database
+    """Insert data into the database
     
     Args:
         db (MongoClient): the database connection
@@ -44,70 +175,320 @@ def insert_data(db_name, collection_name, data, local=True):
         data (dict): the data to insert
     """
     try:
-        client = database_connection(local)
+        # Insert the data into the collection
+        get_storage(db_name, collection_name, local).insert_one(data)
+        logger.debug("Successfully inserted data into the %s collection", collection_name)
+
+    except Exception as e:
+        error_message = CustomException(e, sys)
+        logger.error(f"Could not insert data into the {collection_name} collection: {error_message}")
 
-        # Access a specific database
-        db = client[db_name]
+    return None
 
-        # Access a specific collection (i.e Table)
-        collection = db[collection_name]
 
-        # Insert the data into the collection
-        collection.insert_one(data)
-        logger.info(f"Successfully inserted data into the {collection_name} collection")
+def ensure_indexes(db_name, collection_name, local=True):
+    """Create the (bN, tS) index used by the time range queries, a no-op if it exists
+
+    Args:
+        db_name (str): the name of the database
+        collection_name (str): the name of the collection
+    """
+    try:
+        get_storage(db_name, collection_name, local).ensure_indexes()
 
     except Exception as e:
         error_message = CustomException(e, sys)
-        logger.error(f"Could not insert data into the {collection_name} collection: {error_message}")
+        logger.error(f"Could not create the index on the {collection_name} collection: {error_message}")
 
     return None
 
 
-def fetch_data_db(db_name, collection_name, date_string, bearing_num, local=True): 
-    """Fetch data from the MongoDB database
+def time_range(date_string):
+    """Time range of a day (or all days)
+
+    Args:
+        date_string (str): day as e.g. 17-Feb-2004, or 'All'
+
+    Returns:
+        tuple: first epoch time and the epoch time after the range, None when unbounded
+    """
+    if date_string.lower() == 'all':
+        return None, None
+
+    # Convert input date string to timestamp
+    input_date = datetime.strptime(date_string, '%d-%b-%Y')
+    timestamp = int(input_date.timestamp())
+
+    return timestamp, timestamp + 86400
+
+
+def build_query(date_string, bearing_num):
+    """Build the MongoDB query for the readings of a bearing on a day (or all days)
+
+    Args:
+        date_string (str): day as e.g. 17-Feb-2004, or 'All'
+        bearing_num (int): bearing number
+
+    Returns:
+        dict: query
+    """
+    return range_query(bearing_num, *time_range(date_string))
+
+
+def fetch_data_db(db_name, collection_name, date_string, bearing_num, local=True, fields=None): 
+    """Fetch data from the database
     
     Args:
         db (MongoClient): the database connection
         collection_name (str): the name of the collection
+        fields (tuple, optional): only return these fields. Defaults to None (whole documents).
 
     Returns:
         item_details (dict): the data from the collection
     """
-    data_list = []
+    storage = get_storage(db_name, collection_name, local)
 
-    client = database_connection(local=local)
+    return list(storage.find(bearing_num, *time_range(date_string), fields=fields))
 
-    # Access a specific database
-    db = client[db_name]
 
-    # Access a specific collection (i.e Table)
-    collection = db[collection_name]
+def fetch_data_columns(db_name, collection_name, date_string, bearing_num, fields=HEALTH_FIELDS, batch_size=5000, local=True):
+    """Fetch the readings of a bearing as columns, in time order
 
-    if date_string.lower() == 'all':
-        # Query with conditions
-        query = {
-            'bN': int(bearing_num)
-        }
+    Only the requested fields are sent by the server, the cursor is read in batches and the values
+    go straight into typed arrays, so no per-document dicts are kept around.
 
-    else:
-        # Convert input date string to timestamp
-        input_date = datetime.strptime(date_string, '%d-%b-%Y')
-        timestamp = int(input_date.timestamp())
+    Args:
+        db_name (str): the name of the database
+        collection_name (str): the name of the collection
+        date_string (str): day as e.g. 17-Feb-2004, or 'All'
+        bearing_num (int): bearing number
+        fields (tuple, optional): fields to fetch. Defaults to HEALTH_FIELDS.
+        batch_size (int, optional): documents per cursor batch. Defaults to 5000.
 
-        # Query with conditions
-        query = {
-            'tS': {'$gte': timestamp, '$lt': timestamp + 86400},
-            'bN': int(bearing_num)
-        }
+    Returns:
+        dict: field -> np array
+    """
+    storage = get_storage(db_name, collection_name, local)
 
-    item_details = collection.find(query)
+    return storage.fetch_columns(bearing_num, *time_range(date_string), fields=fields, batch_size=batch_size)
 
-    for item in item_details:
-        # This does not give a very readable output
-        data_list.append(item)
 
-    return data_list
+def fetch_data_frame(db_name, collection_name, date_string, bearing_num, fields=HEALTH_FIELDS, batch_size=5000, local=True):
+    """Fetch the readings of a bearing as a pandas dataframe, in time order
 
+    Args:
+        db_name (str): the name of the database
+        collection_name (str): the name of the collection
+        date_string (str): day as e.g. 17-Feb-2004, or 'All'
+        bearing_num (int): bearing number
+        fields (tuple, optional): fields to fetch. Defaults to HEALTH_FIELDS.
+        batch_size (int, optional): documents per cursor batch. Defaults to 5000.
+
+    Returns:
+        pandas dataframe
+    """
+    import pandas as pd
+
+    return pd.DataFrame(fetch_data_columns(db_name, collection_name, date_string, bearing_num, fields=fields, batch_size=batch_size, local=local))
+
+
+def fetch_health_summary(db_name, collection_name, date_string, bearing_num, n_points=500, local=True):
+    """Fetch the readings of a bearing summarised into equal time buckets, computed by the database
+
+    The selected time range is split into at most n_points buckets. For each non-empty bucket the
+    server returns the first timestamp, the min/mean/max RMS, the number of faulty readings and the
+    number of readings, so the transfer does not grow with the length of the history.
+
+    Args:
+        db_name (str): the name of the database
+        collection_name (str): the name of the collection
+        date_string (str): day as e.g. 17-Feb-2004, or 'All'
+        bearing_num (int): bearing number
+        n_points (int, optional): maximum number of buckets. Defaults to 500.
+
+    Returns:
+        dict: field -> np array, fields as in SUMMARY_FIELDS, in time order
+    """
+    storage = get_storage(db_name, collection_name, local)
+
+    return storage.fetch_summary(bearing_num, *time_range(date_string), n_points=n_points)
+
+
+class WriteBehindQueue:
+    """Buffer documents in memory and write them to a collection in batches.
+
+    Documents are flushed with an unordered insert_many once batch_size documents are queued or
+    flush_interval seconds after the first one arrived, on a dedicated writer thread so the event
+    loop never waits for the database. The queue is bounded: put waits while it is full. Failed
+    writes are retried as upserts on _id, which makes a retry of a partially applied batch
+    idempotent.
+    """
+
+    def __init__(self, db_name, collection_name, local=True):
+        self.write_config = WriteBehindConfig()
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self.local = local
+
+        self.queue = None
+        self._task = None
+        self._executor = None
+        self.stats = {"written": 0, "batches": 0, "retries": 0, "dropped": 0}
+
+    def qsize(self):
+        """Number of documents waiting to be written"""
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def start(self):
+        """Start the background flush task on the running event loop"""
+        self.queue = asyncio.Queue(maxsize=self.write_config.max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="write-behind")
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Started the write-behind queue for the {self.collection_name} collection")
+
+    async def put(self, document):
+        """Queue a document, waiting while the queue is full
+
+        Args:
+            document (dict): the document to insert
+        """
+        if self.queue is None:
+            raise RuntimeError("The write-behind queue has not been started")
+
+        await self.queue.put(document)
+
+    async def put_many(self, documents):
+        """Queue several documents, waiting while the queue is full
+
+        Args:
+            documents (list): the documents to insert
+        """
+        for document in documents:
+            await self.put(document)
+
+    async def stop(self, timeout=30):
+        """Drain the queued documents and stop the flush task
+
+        Args:
+            timeout (float, optional): seconds to wait for the drain. Defaults to 30.
+        """
+        if self.queue is None:
+            return None
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Write-behind drain timed out, {self.qsize()} documents were not written")
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+        self._executor.shutdown(wait=True)
+        self.queue, self._task, self._executor = None, None, None
+        logger.info(f"Stopped the write-behind queue for the {self.collection_name} collection. Stats: {self.stats}")
+
+        return None
+
+    async def _drain(self):
+        """Flush the partial batch at once and wait until every queued document is handled"""
+        await self.queue.put(_FLUSH)
+        await self.queue.join()
+
+    async def _next_batch(self):
+        """Wait for a document and collect a batch by size or by time, or until stop flushes it
+
+        Returns:
+            list: the documents to write
+        """
+        loop = asyncio.get_running_loop()
+
+        batch, deadline = [], None
+
+        while len(batch) < self.write_config.batch_size:
+            if batch:
+                try:
+                    document = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+
+                    try:
+                        document = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+            else:
+                document = await self.queue.get()
+
+            if document is _FLUSH:
+                self.queue.task_done()
+                break
+
+            # The flush interval starts with the first document of the batch
+            if deadline is None:
+                deadline = loop.time() + self.write_config.flush_interval
+            batch.append(document)
+
+        return batch
+
+    async def _run(self):
+        """Flush batches until cancelled"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._next_batch()
+            if not batch:
+                continue
+
+            try:
+                await loop.run_in_executor(self._executor, self._write_batch, batch)
+            except Exception as e:
+                error_message = CustomException(e, sys)
+                logger.error(f"Write-behind flush failed: {error_message}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _write_batch(self, batch):
+        """Write a batch with retries, runs on the writer thread
+
+        Args:
+            batch (list): the documents to write
+        """
+        pending, upsert = batch, False
+
+        for attempt in range(self.write_config.max_retries + 1):
+            try:
+                # Inside the retries, connecting can fail as well (e.g. an unreachable database URL)
+                storage = get_storage(self.db_name, self.collection_name, self.local)
+
+                with stage_timer("db_insert"):
+                    failed = storage.insert_many(pending, upsert=upsert)
+
+                self.stats["written"] += len(pending) - len(failed)
+                pending = failed
+
+                if not pending:
+                    break
+
+            except Exception as e:
+                logger.error(f"Could not write {len(pending)} documents into the {self.collection_name} collection: {e}")
+
+            if attempt < self.write_config.max_retries:
+                self.stats["retries"] += 1
+                upsert = True
+                time.sleep(self.write_config.retry_backoff * 2 ** attempt)
+
+        self.stats["batches"] += 1
+
+        if pending:
+            self.stats["dropped"] += len(pending)
+            logger.error(f"Dropped {len(pending)} documents after {self.write_config.max_retries} retries")
+
+        return None
 
 
 if __name__ == "__main__":
@@ -119,8 +500,10 @@ if __name__ == "__main__":
     bearing_num = 1
     local = False
 
-    data_list = fetch_data_db(db_name, collection_name, date_string, bearing_num, local=local)
+    df = fetch_data_frame(db_name, collection_name, date_string, bearing_num, local=local)
+
+    print(df)
 
-    df = pd.DataFrame(data_list)
+    summary = pd.DataFrame(fetch_health_summary(db_name, collection_name, 'All', bearing_num, n_points=200, local=local))
 
-    print(df)
\ No newline at end of file
+    print(summary)
\ No newline at end of file
@@ -1,5 +1,7 @@
 import sys
-from src.logger import logger
+from src.logger import get_logger
+
+logger = get_logger(__name__)
 
 def error_message_details(error, error_detail:sys):
     """Error message details
@@ -30,10 +32,27 @@ class CustomException(Exception):
         super().__init__(error)
         self.error_message = error_message_details(error, error_detail)
 
+    def __reduce__(self):
+        """Pickle the exception with its message, e.g. to raise it in the parent of a worker process
+
+        Returns:
+            tuple: callable and arguments rebuilding the exception
+        """
+        return (_rebuild_custom_exception, (self.error_message,))
+
     def __str__(self):
         """String representation of the exception
 
         Returns:
             str: error message
         """
-        return self.error_message
\ No newline at end of file
+        return self.error_message
+
+
+def _rebuild_custom_exception(error_message):
+    """Rebuild an unpickled CustomException from its message"""
+    exception = CustomException.__new__(CustomException)
+    Exception.__init__(exception, error_message)
+    exception.error_message = error_message
+
+    return exception
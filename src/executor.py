@@ -0,0 +1,172 @@
+import os
+import asyncio
+import functools
+import multiprocessing
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+
+from src.components.data_transformation import DataTransformation
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ComputeExecutorConfig:
+    """Compute executor configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    kind: str = os.getenv("COMPUTE_EXECUTOR", "thread")
+    max_workers: int = int(os.getenv("COMPUTE_MAX_WORKERS", os.cpu_count() or 1))
+    max_queue: int = int(os.getenv("COMPUTE_MAX_QUEUE", 64))
+
+
+def featurize_shared(shm_name, shape, dtype, sampling_rate):
+    """Featurize frames handed over in shared memory, runs in a worker process
+
+    Args:
+        shm_name (str): name of the shared memory block
+        shape (tuple): shape of the frames
+        dtype (str): dtype of the frames
+        sampling_rate (int): Sampling rate of the data
+
+    Returns:
+        dict: feature name -> np array with one value per frame
+    """
+    # The spawned worker shares the resource tracker of the parent, which registered the block and
+    # unlinks it, so the attach must not unregister it
+    shm = shared_memory.SharedMemory(name=shm_name)
+
+    try:
+        frames = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        features = DataTransformation(bearing_num=None).featurize_batch(frames, sampling_rate)
+        del frames
+    finally:
+        shm.close()
+
+    return features
+
+
+class ComputeExecutor:
+    """Run the CPU-bound featurization and inference off the event loop.
+
+    Work runs on a thread pool (NumPy, SciPy and sklearn release the GIL for the heavy parts);
+    featurization can optionally run on a process pool that receives the frames in shared memory.
+    At most max_workers + max_queue jobs are handed to the pools, further callers wait on the
+    event loop without holding a worker.
+    """
+
+    def __init__(self, kind=None, max_workers=None, max_queue=None):
+        self.executor_config = ComputeExecutorConfig()
+
+        if kind is not None:
+            self.executor_config.kind = kind
+        if max_workers is not None:
+            self.executor_config.max_workers = max_workers
+        if max_queue is not None:
+            self.executor_config.max_queue = max_queue
+
+        self._threads = None
+        self._processes = None
+        self._semaphore = None
+
+        # Queue-depth metrics
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+
+    def start(self):
+        """Create the pools, called once per worker process"""
+        self._threads = ThreadPoolExecutor(max_workers=self.executor_config.max_workers, thread_name_prefix="compute")
+
+        if self.executor_config.kind == "process":
+            # Spawn so the pool does not inherit the threads of the serving process
+            self._processes = ProcessPoolExecutor(max_workers=self.executor_config.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        self._semaphore = asyncio.Semaphore(self.executor_config.max_workers + self.executor_config.max_queue)
+        logger.info(f"Started the {self.executor_config.kind} compute executor with {self.executor_config.max_workers} workers")
+
+        return None
+
+    def shutdown(self):
+        """Wait for the running jobs and release the pools"""
+        for pool in (self._threads, self._processes):
+            if pool is not None:
+                pool.shutdown(wait=True)
+
+        self._threads, self._processes = None, None
+
+        return None
+
+    async def stop(self):
+        """Wait for the running jobs and release the pools without blocking the event loop"""
+        await asyncio.to_thread(self.shutdown)
+
+        return None
+
+    def stats(self):
+        """Queue-depth metrics of the executor
+
+        Returns:
+            dict: number of waiting, queued, running and completed jobs
+        """
+        running = min(self.in_flight, self.executor_config.max_workers)
+
+        return {
+            "waiting": self.waiting,
+            "queued": self.in_flight - running,
+            "running": running,
+            "completed": self.completed,
+        }
+
+    async def _submit(self, pool, fn, *args):
+        """Run fn on the pool once there is room in the queue"""
+        loop = asyncio.get_running_loop()
+
+        self.waiting += 1
+        async with self._semaphore:
+            self.waiting -= 1
+            self.in_flight += 1
+
+            try:
+                return await loop.run_in_executor(pool, functools.partial(fn, *args))
+            finally:
+                self.in_flight -= 1
+                self.completed += 1
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the thread pool
+
+        Returns:
+            the result of fn
+        """
+        return await self._submit(self._threads, fn, *args)
+
+    async def featurize(self, frames, sampling_rate):
+        """Featurize (n_frames, n_samples) frames off the event loop
+
+        Args:
+            frames (np array): (n_frames, n_samples) data
+            sampling_rate (int): Sampling rate of the data
+
+        Returns:
+            dict: feature name -> np array with one value per frame
+        """
+        if self._processes is None:
+            return await self.run(DataTransformation(bearing_num=None).featurize_batch, frames, sampling_rate)
+
+        # Hand the frames to the worker process through shared memory instead of pickling them
+        frames = np.asarray(frames)
+        shm = shared_memory.SharedMemory(create=True, size=max(frames.nbytes, 1))
+
+        try:
+            np.ndarray(frames.shape, dtype=frames.dtype, buffer=shm.buf)[...] = frames
+            return await self._submit(self._processes, featurize_shared, shm.name, frames.shape, frames.dtype.str, sampling_rate)
+        finally:
+            shm.close()
+            shm.unlink()
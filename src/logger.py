@@ -1,12 +1,69 @@
 import logging 
 import logging.config
+import logging.handlers
+import atexit
+import queue
 import yaml
 import os
 
-# Load the logging configuration
-with open(os.path.join(os.getcwd(), 'src', 'configs', 'logging.yaml'), 'r') as f:
+# Load the logging configuration (relative to this file, not the working directory)
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'configs', 'logging.yaml'), 'r') as f:
     config = yaml.safe_load(f.read())
-    logging.config.dictConfig(config)
+
+# The queue settings are not part of the dictConfig schema
+queue_config = config.pop('queue', None) or {}
+logging.config.dictConfig(config)
 
 # Create the logger
-logger = logging.getLogger(__name__)
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+# Handlers that do the actual I/O, moved behind the queue when it is enabled
+_root_logger = logging.getLogger()
+_queue_handler = None
+_queue_listener = None
+
+
+def _start_queue_listener():
+    """Move the root handlers behind a QueueHandler and emit the records on a listener thread"""
+    global _queue_handler, _queue_listener
+
+    if _queue_handler is None:
+        handlers = list(_root_logger.handlers)
+        for handler in handlers:
+            _root_logger.removeHandler(handler)
+
+        _queue_handler = logging.handlers.QueueHandler(queue.Queue(queue_config.get('maxsize', 0)))
+        _root_logger.addHandler(_queue_handler)
+    else:
+        # After a fork the listener thread is gone, start a new one on a fresh queue
+        handlers = list(_queue_listener.handlers)
+        _queue_handler.queue = queue.Queue(queue_config.get('maxsize', 0))
+
+    _queue_listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+
+
+def _stop_queue_listener():
+    """Flush the queued records"""
+    if _queue_listener is not None and _queue_listener._thread is not None:
+        _queue_listener.stop()
+
+
+if queue_config.get('enabled', False):
+    _start_queue_listener()
+    atexit.register(_stop_queue_listener)
+
+    # gunicorn --preload forks the workers after this module was imported
+    os.register_at_fork(after_in_child=_start_queue_listener)
+
+
+def get_logger(name):
+    """Get the logger of a module, its level can be set in src/configs/logging.yaml
+
+    Args:
+        name (str): module name, i.e. __name__
+
+    Returns:
+        logging.Logger: the logger
+    """
+    return logging.getLogger(name)
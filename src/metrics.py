@@ -0,0 +1,260 @@
+import time
+import bisect
+import threading
+
+from contextlib import contextmanager
+
+from src.profiling import profiler
+
+
+# Latency buckets in seconds, from sub-millisecond stages up to slow requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(label_names, label_values, extra=()):
+    """Format the labels of a sample in the Prometheus text format
+
+    Args:
+        label_names (tuple): label names
+        label_values (tuple): label values
+        extra (tuple, optional): additional (name, value) pairs. Defaults to ().
+
+    Returns:
+        str: e.g. {stage="fft",le="0.001"}
+    """
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """Increase the counter
+
+        Args:
+            amount (float, optional): Defaults to 1.
+        """
+        key = tuple(str(labels[name]) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        """Render the counter in the Prometheus text format
+
+        Returns:
+            list: lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{format_labels(self.label_names, key)} {value}")
+
+        return lines
+
+
+class Histogram:
+    """Histogram with labels and fixed buckets"""
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+
+        # label values -> [bucket counts, sum, count]
+        self._values = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """Record an observation
+
+        Args:
+            value (float): observed value
+        """
+        key = tuple(str(labels[name]) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        """Render the histogram in the Prometheus text format
+
+        Returns:
+            list: lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+
+        with self._lock:
+            for key, (bucket_counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, [('le', bound)])} {cumulative}")
+
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {count}")
+
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback when the metrics are rendered"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, label_names, callback):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.callback = callback
+
+    def render(self):
+        """Render the gauge in the Prometheus text format
+
+        The callback returns a number, or a dict of label values (tuple) -> number.
+
+        Returns:
+            list: lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+
+        for key, value in values.items():
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{format_labels(self.label_names, key)} {float(value)}")
+
+        return lines
+
+
+class CallbackCounter(Gauge):
+    """Counter read from a callback when the metrics are rendered, for totals kept elsewhere
+
+    The callback must only ever return increasing values, e.g. the stats counters of a queue.
+    """
+
+    metric_type = "counter"
+
+
+class MetricsRegistry:
+    """Collection of the metrics of this process"""
+
+    def __init__(self):
+        self._metrics = dict()
+
+    def counter(self, name, documentation, label_names=()):
+        return self._metrics.setdefault(name, Counter(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._metrics.setdefault(name, Histogram(name, documentation, label_names, buckets))
+
+    def gauge(self, name, documentation, callback, label_names=()):
+        self._metrics[name] = Gauge(name, documentation, label_names, callback)
+        return self._metrics[name]
+
+    def callback_counter(self, name, documentation, callback, label_names=()):
+        self._metrics[name] = CallbackCounter(name, documentation, label_names, callback)
+        return self._metrics[name]
+
+    def render(self):
+        """Render all the metrics in the Prometheus text format
+
+        Returns:
+            str: exposition text
+        """
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting the HTTP requests, errors and latency per endpoint"""
+
+    def __init__(self, app, paths=()):
+        self.app = app
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # Keep the label cardinality bounded
+        path = scope["path"] if scope["path"] in self.paths else "other"
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_LATENCY.observe(time.perf_counter() - start, path=path)
+            REQUESTS.inc(path=path, status=status)
+            if status >= 500:
+                ERRORS.inc(path=path)
+
+
+# The metrics of this process (every gunicorn worker exposes its own)
+metrics = MetricsRegistry()
+
+STAGE_LATENCY   = metrics.histogram("prediction_stage_latency_seconds", "Latency of the prediction stages", ["stage"])
+REQUEST_LATENCY = metrics.histogram("http_request_latency_seconds", "Latency of the HTTP requests", ["path"])
+REQUESTS        = metrics.counter("http_requests_total", "HTTP requests", ["path", "status"])
+ERRORS          = metrics.counter("http_request_errors_total", "HTTP requests that failed with a server error", ["path"])
+
+
+@contextmanager
+def _profiled_stage_timer(stage):
+    with profiler.stage(stage), STAGE_LATENCY.time(stage=stage):
+        yield
+
+
+def stage_timer(stage):
+    """Time a prediction stage, e.g. with stage_timer("fft"): ...
+
+    The stage is also recorded by the profiler when profiling is enabled.
+
+    Args:
+        stage (str): stage name
+    """
+    if profiler.enabled:
+        return _profiled_stage_timer(stage)
+
+    return STAGE_LATENCY.time(stage=stage)
@@ -0,0 +1,182 @@
+import os
+import re
+import sys
+import threading
+
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.logger import get_logger
+from src.utils import load_object
+
+logger = get_logger(__name__)
+
+
+# Model artifacts are saved by the trainer as model_b{bearing_num}.pkl
+MODEL_FILENAME_PATTERN = re.compile(r"^model_b(\d+)\.pkl$")
+
+
+@dataclass
+class ModelRegistryConfig:
+    """Model registry configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    model_dir: str = os.getenv("MODEL_DIR", "")
+    reload_interval: float = float(os.getenv("MODEL_RELOAD_INTERVAL", 30))
+
+
+class ModelRegistry:
+    """Process-wide store of the per-bearing models.
+
+    The models are loaded once (in the gunicorn master when the app is preloaded, so that the
+    workers share them copy-on-write) and looked up from a dict on every request. A reload builds
+    a new dict and swaps it in with a single assignment, so in-flight requests keep the model
+    they already hold and never see a half loaded registry.
+    """
+
+    def __init__(self, model_dir=None, reload_interval=None):
+        self.registry_config = ModelRegistryConfig()
+
+        if model_dir is not None:
+            self.registry_config.model_dir = model_dir
+        if reload_interval is not None:
+            self.registry_config.reload_interval = reload_interval
+
+        # bearing_num -> model and bearing_num -> artifact version (mtime, size)
+        self._models = {}
+        self._versions = {}
+
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        self._stop_event = threading.Event()
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, bearing_num):
+        return int(bearing_num) in self._models
+
+    def _scan_artifacts(self):
+        """Find the model artifacts in the model directory
+
+        Returns:
+            dict: bearing number -> (artifact path, artifact version)
+        """
+        artifacts = dict()
+
+        with os.scandir(self.registry_config.model_dir or os.curdir) as entries:
+            for entry in entries:
+                match = MODEL_FILENAME_PATTERN.match(entry.name)
+                if match and entry.is_file():
+                    stat = entry.stat()
+                    artifacts[int(match.group(1))] = (entry.path, (stat.st_mtime_ns, stat.st_size))
+
+        return artifacts
+
+    def load_all(self):
+        """Load new or changed model artifacts and swap them in atomically
+
+        Unchanged models are reused. If an artifact cannot be loaded the previous model for that
+        bearing is kept and the load is retried on the next reload.
+
+        Returns:
+            list: bearing numbers whose model was (re)loaded
+        """
+        with self._lock:
+            models, versions = dict(self._models), dict(self._versions)
+            reloaded = []
+
+            try:
+                artifacts = self._scan_artifacts()
+            except Exception as e:
+                error_message = CustomException(e, sys)
+                logger.error(f"Could not scan the model directory: {error_message}")
+                return reloaded
+
+            for bearing_num, (model_path, version) in artifacts.items():
+                if versions.get(bearing_num) == version:
+                    continue
+
+                try:
+                    models[bearing_num] = load_object(model_path)
+                    versions[bearing_num] = version
+                    reloaded.append(bearing_num)
+                    logger.info(f"Model loaded successfully from {model_path}.")
+
+                except Exception as e:
+                    logger.error(f"Could not load the model from {model_path}: {e}")
+
+            # Drop the models whose artifact was removed
+            for bearing_num in set(models) - set(artifacts):
+                models.pop(bearing_num)
+                versions.pop(bearing_num, None)
+
+            # Readers only ever see the old or the new dict
+            self._models, self._versions = models, versions
+
+        return reloaded
+
+    def get(self, bearing_num):
+        """Get the model for a bearing
+
+        Args:
+            bearing_num (int): bearing number
+
+        Returns:
+            the model
+        """
+        model = self._models.get(int(bearing_num))
+
+        if model is None:
+            # Registry was not preloaded in this process
+            if not self._models:
+                self.load_all()
+                model = self._models.get(int(bearing_num))
+
+            if model is None:
+                raise KeyError(f"No model available for bearing {bearing_num}")
+
+        return model
+
+    def _watch(self):
+        """Reload the models periodically until the watcher is stopped"""
+        while not self._stop_event.wait(self.registry_config.reload_interval):
+            reloaded = self.load_all()
+            if reloaded:
+                logger.info(f"Hot reloaded the models for bearings {reloaded}")
+
+    def start_watcher(self):
+        """Start a background thread that picks up new model artifacts
+
+        Threads do not survive a fork, so this is called in every worker after start up.
+        """
+        if self.registry_config.reload_interval <= 0:
+            return None
+
+        if self._watcher is not None and self._watcher_pid == os.getpid() and self._watcher.is_alive():
+            return None
+
+        self._stop_event = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, name="model-registry-watcher", daemon=True)
+        self._watcher_pid = os.getpid()
+        self._watcher.start()
+
+        return None
+
+    def stop_watcher(self):
+        """Stop the background reload thread"""
+        self._stop_event.set()
+
+        if self._watcher is not None and self._watcher_pid == os.getpid():
+            self._watcher.join(timeout=5)
+
+        self._watcher = None
+
+        return None
+
+
+# The registry shared by everything in this process
+model_registry = ModelRegistry()
@@ -0,0 +1,316 @@
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from src.exception import CustomException
+from src.logger import get_logger
+from src.database import get_storage, ensure_indexes, close_clients
+from src.storage import make_health_record
+from src.model_registry import model_registry
+from src.utils import convert_to_timestamp, convert_prediction_to_label, parse_channel_map
+from src.components.data_transformation import DataTransformation
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class BackfillConfig:
+    """Backfill configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    sampling_rate: int = 20480
+    db_name: str = "machinehealth"
+    collection_name: str = "test"
+    db_local: bool = os.getenv("DATABASE_LOCAL", "0") == "1"
+    file_delimiter: str = '\t'
+    files_per_task: int = int(os.getenv("BACKFILL_FILES_PER_TASK", 32))
+    batch_size: int = int(os.getenv("BACKFILL_BATCH_SIZE", 1000))
+    n_workers: int = int(os.getenv("BACKFILL_N_WORKERS", os.cpu_count() or 1))
+
+
+def list_run_files(data_dirs, since=None):
+    """List the raw files of one or more test runs in time order
+
+    Entries whose name is not a timestamp, e.g. a README or .DS_Store, are ignored.
+
+    Args:
+        data_dirs (list): directories of raw IMS files named YYYY.MM.DD.HH.MM.SS
+        since (int, optional): skip the files before this epoch time. Defaults to None.
+
+    Returns:
+        list: (timestamp, file path) tuples
+    """
+    run_files = []
+
+    for data_dir in data_dirs:
+        for file_name in os.listdir(data_dir):
+            try:
+                timestamp = convert_to_timestamp(date_string=file_name)
+            except ValueError:
+                logger.warning(f"Ignoring {os.path.join(data_dir, file_name)}, its name is not a timestamp")
+                continue
+
+            if since is None or timestamp >= since:
+                run_files.append((timestamp, os.path.join(data_dir, file_name)))
+
+    return sorted(run_files)
+
+
+def featurize_files(run_files, channel_map, sampling_rate, file_delimiter='\t'):
+    """Read raw files and featurize the channels of all of them as one matrix, runs in a worker process
+
+    A file is skipped when it cannot be read or does not hold one second of samples of every
+    channel in the channel map, so one bad file does not fail its chunk.
+
+    Args:
+        run_files (list): (timestamp, file path) tuples
+        channel_map (list): bearing number of every channel (None skips a channel)
+        sampling_rate (int): Sampling rate of the data
+        file_delimiter (str, optional): Defaults to '\\t'.
+
+    Returns:
+        tuple: timestamps, bearing numbers and features dict with one value per frame, number of skipped files
+    """
+    channels = [channel for channel, bearing_num in enumerate(channel_map) if bearing_num is not None]
+
+    frames, timestamps, bearing_nums = [], [], []
+    n_bad_files = 0
+
+    for timestamp, file_path in run_files:
+        try:
+            data = np.loadtxt(file_path, delimiter=file_delimiter, dtype=float, ndmin=2)
+        except Exception as e:
+            logger.error(f"Could not read {file_path}: {e}")
+            n_bad_files += 1
+            continue
+
+        if data.shape[0] != sampling_rate or data.shape[1] < len(channel_map):
+            logger.error(f"Skipping {file_path}: expected {sampling_rate} rows of at least {len(channel_map)} channels, got shape {data.shape}")
+            n_bad_files += 1
+            continue
+
+        for channel in channels:
+            frames.append(data[:, channel])
+            timestamps.append(timestamp)
+            bearing_nums.append(channel_map[channel])
+
+    if not frames:
+        return np.array([], dtype=int), np.array([], dtype=int), dict(), n_bad_files
+
+    try:
+        features = DataTransformation(bearing_num=None).featurize_batch(np.stack(frames), sampling_rate)
+    except Exception as e:
+        logger.error(f"Could not featurize {len(run_files) - n_bad_files} files from {run_files[0][1]}: {e}")
+        return np.array([], dtype=int), np.array([], dtype=int), dict(), len(run_files)
+
+    return np.array(timestamps), np.array(bearing_nums), features, n_bad_files
+
+
+def score_bearings(timestamps, bearing_nums, features):
+    """Predict the health status of the frames with one call per bearing model
+
+    Args:
+        timestamps (np array): epoch time of every frame
+        bearing_nums (np array): bearing number of every frame
+        features (dict): feature name -> np array with one value per frame
+
+    Returns:
+        list: health records of the frames whose bearing has a model
+    """
+    if not features:
+        return []
+
+    feature_matrix = np.column_stack(list(features.values()))
+    records = []
+
+    for bearing_num in np.unique(bearing_nums):
+        rows = np.flatnonzero(bearing_nums == bearing_num)
+
+        try:
+            y_pred = convert_prediction_to_label(model_registry.get(bearing_num).predict(feature_matrix[rows]))
+        except KeyError as e:
+            logger.error(e)
+            continue
+
+        records.extend(make_health_record(timestamps[row], bearing_num, features['trms'][row], y_pred[index]) for index, row in enumerate(rows))
+
+    return records
+
+
+class Backfill:
+    """Score the raw files of past test runs and bulk write the health records.
+
+    Files are featurized in chunks on a process pool while the parent scores the finished chunks
+    with the per-bearing models and writes them in batches with an unordered insert_many. Records
+    are keyed by timestamp and bearing, so a run can be resumed from the last written timestamp
+    and re-written records are skipped as duplicates. The channels of bearings without a model
+    are not featurized, their frames are counted as skipped.
+    """
+
+    def __init__(self, channel_map, db_name=None, collection_name=None, n_workers=None):
+        self.backfill_config = BackfillConfig()
+
+        # Each bearing on one channel at most, otherwise their records would share the same _id
+        parse_channel_map(channel_map, len(channel_map))
+        self.channel_map = list(channel_map)
+
+        if db_name is not None:
+            self.backfill_config.db_name = db_name
+        if collection_name is not None:
+            self.backfill_config.collection_name = collection_name
+        if n_workers is not None:
+            self.backfill_config.n_workers = n_workers
+
+        self.storage = get_storage(self.backfill_config.db_name, self.backfill_config.collection_name, local=self.backfill_config.db_local)
+        self.stats = {"files": 0, "bad_files": 0, "written": 0, "skipped": 0, "dropped": 0}
+
+    def scored_channel_map(self):
+        """Channel map of the bearings that have a model, the channels of the others are skipped
+
+        Returns:
+            list: bearing number of every channel, None for the skipped channels
+        """
+        missing = sorted({bearing_num for bearing_num in self.channel_map if bearing_num is not None and bearing_num not in model_registry})
+        if missing:
+            logger.warning(f"No model for bearings {missing}, their channels are skipped")
+
+        return [None if bearing_num in missing else bearing_num for bearing_num in self.channel_map]
+
+    def resume_point(self):
+        """Epoch time to resume from: the earliest of the last written timestamps of the scored bearings
+
+        Bearings without a model never get records, so they do not hold the resume point back.
+
+        Returns:
+            int: epoch time, None when a scored bearing has no records yet
+        """
+        bearing_nums = {bearing_num for bearing_num in self.scored_channel_map() if bearing_num is not None}
+        last_timestamps = [self.storage.last_timestamp(bearing_num) for bearing_num in bearing_nums]
+
+        if not last_timestamps or None in last_timestamps:
+            return None
+
+        return min(last_timestamps)
+
+    def write(self, records):
+        """Write health records in batches, retrying the failed ones once as upserts
+
+        Args:
+            records (list): health records
+        """
+        batch_size = self.backfill_config.batch_size
+
+        for start in range(0, len(records), batch_size):
+            batch = records[start:start + batch_size]
+
+            try:
+                failed = self.storage.insert_many(batch)
+                if failed:
+                    failed = self.storage.insert_many(failed, upsert=True)
+            except Exception as e:
+                error_message = CustomException(e, sys)
+                logger.error(f"Could not write {len(batch)} records: {error_message}")
+                failed = batch
+
+            self.stats["written"] += len(batch) - len(failed)
+            self.stats["dropped"] += len(failed)
+
+        return None
+
+    def run(self, data_dirs, resume=True, since=None):
+        """Backfill the raw files of the test runs
+
+        Args:
+            data_dirs (list): directories of raw IMS files
+            resume (bool, optional): skip the files before the last written timestamp. Defaults to True.
+            since (int, optional): skip the files before this epoch time, overrides resume. Defaults to None.
+
+        Returns:
+            dict: number of files and bad files, written, skipped and dropped records
+        """
+        # Featurize only the channels of the bearings with a model
+        channel_map = self.scored_channel_map()
+        n_scored = len(channel_map) - channel_map.count(None)
+        n_unscored = len(self.channel_map) - self.channel_map.count(None) - n_scored
+
+        if not n_scored:
+            logger.error(f"No model for any of the bearings in the channel map {self.channel_map}, nothing to backfill")
+            return self.stats
+
+        ensure_indexes(self.backfill_config.db_name, self.backfill_config.collection_name, local=self.backfill_config.db_local)
+
+        if since is None and resume:
+            since = self.resume_point()
+            if since is not None:
+                logger.info(f"Resuming the backfill from {since}")
+
+        run_files = list_run_files(data_dirs, since=since)
+        chunk_size = self.backfill_config.files_per_task
+        chunks = [run_files[start:start + chunk_size] for start in range(0, len(run_files), chunk_size)]
+
+        logger.info(f"Backfilling {len(run_files)} files in {len(chunks)} chunks with {self.backfill_config.n_workers} workers")
+        start_time = time.perf_counter()
+
+        # Spawn so the workers do not inherit the database client and the log listener thread
+        with ProcessPoolExecutor(max_workers=self.backfill_config.n_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = pool.map(featurize_files, chunks, [channel_map] * len(chunks), [self.backfill_config.sampling_rate] * len(chunks), [self.backfill_config.file_delimiter] * len(chunks))
+
+            # Chunks come back in time order, so an interrupted run resumes without gaps
+            for chunk, (timestamps, bearing_nums, features, n_bad_files) in zip(chunks, results):
+                if len(timestamps) and features:
+                    records = score_bearings(timestamps, bearing_nums, features)
+                    self.write(records)
+
+                    # Frames of the unscored channels, and of a model unloaded during the run
+                    self.stats["skipped"] += len(timestamps) // n_scored * n_unscored + len(timestamps) - len(records)
+
+                self.stats["files"] += len(chunk)
+                self.stats["bad_files"] += n_bad_files
+                logger.info(f"Backfilled {self.stats['files']}/{len(run_files)} files, {self.stats['written']} records written, {self.stats['skipped']} skipped")
+
+        logger.info(f"Backfill completed in {time.perf_counter() - start_time:.1f}s. Stats: {self.stats}")
+
+        return self.stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill the health predictions of raw test-run directories.")
+    parser.add_argument("data_dirs", nargs="+", help="directories of raw IMS files")
+    parser.add_argument("--channel-map", default="1,2,3,4", help="comma separated bearing number of every channel, empty to skip a channel, each bearing on one channel at most (e.g. 1,,2,,3,,4, for the x axis channels of the 1st test)")
+    parser.add_argument("--db-name", default=None, help="database name")
+    parser.add_argument("--collection-name", default=None, help="collection name")
+    parser.add_argument("--model-dir", default=os.getenv("MODEL_DIR") or os.path.join("artifacts", "models"), help="directory of the model_b<N>.pkl artifacts")
+    parser.add_argument("--workers", type=int, default=None, help="featurization worker processes")
+    parser.add_argument("--since", default=None, help="only backfill the files from this time on, as YYYY.MM.DD.HH.MM.SS")
+    parser.add_argument("--no-resume", action="store_true", help="do not skip the files before the last written timestamp")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_args()
+
+    since = convert_to_timestamp(date_string=args.since) if args.since else None
+
+    try:
+        channel_map = [int(value) if value.strip() else None for value in args.channel_map.split(",")]
+        backfill = Backfill(channel_map, db_name=args.db_name, collection_name=args.collection_name, n_workers=args.workers)
+    except ValueError as e:
+        sys.exit(f"Invalid --channel-map {args.channel_map!r}: {e}")
+
+    model_registry.registry_config.model_dir = args.model_dir
+    model_registry.load_all()
+
+    try:
+        backfill.run(args.data_dirs, resume=not args.no_resume, since=since)
+    finally:
+        close_clients()
@@ -1,18 +1,27 @@
+import io
 import sys
+import json
 import os
 import numpy as np
 
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from dataclasses import dataclass
 
 from src.exception import CustomException
-from src.logger import logger
-from src.database import database_connection, insert_data
-from src.utils import load_object, convert_prediction_to_label
-from src.components.data_transformation import DataTransformation
+from src.logger import get_logger
+from src.database import close_clients, ensure_indexes, WriteBehindQueue
+from src.storage import make_health_record
+from src.batching import MicroBatcher, QueueFullError
+from src.cache import ResponseCache, payload_digest
+from src.executor import ComputeExecutor
+from src.metrics import metrics, stage_timer, MetricsMiddleware
+from src.model_registry import model_registry
+from src.utils import convert_prediction_to_label, parse_channel_map
+
+logger = get_logger(__name__)
 
 # The FastAPI app for serving predictions
 app = FastAPI(title="PredictionServiceApp", description="Predictor App for Vibration Data", version="0.0.1")
@@ -32,6 +41,9 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+# Request counts, errors and latency per endpoint
+app.add_middleware(MetricsMiddleware, paths=["/ping", "/invocations", "/invocations/batch", "/invocations/machine", "/metrics"])
+
 @dataclass
 class PredictorConfig:
     """Data ingestion configuration
@@ -41,6 +53,10 @@ class PredictorConfig:
     """
     model_dir: str = os.path.join("opt", "program")
     sampling_rate: int = 20480
+    db_name: str = "machinehealth"
+    collection_name: str = "test"
+    db_local: bool = os.getenv("DATABASE_LOCAL", "0") == "1"
+    stream_min_hop: int = int(os.getenv("STREAM_MIN_HOP", 1024))
 
 
 # A singleton for holding the model. This simply loads the model and holds it.
@@ -54,92 +70,59 @@ class Predictor:
         self.bearing_num = bearing_num
         
     def _load_model(self):
-        """Get the model object for this instance, loading it if it's not already loaded.
+        """Get the model object for this instance from the process-wide model registry.
 
         Returns:
-            the model
+            the model, a KeyError is raised when the bearing has no model
         """
-        try:
-            model_file_path = os.path.join(f"model_b{self.bearing_num}.pkl")
-            model = load_object(model_file_path)
-            logger.info(f"Model loaded successfully from {model_file_path}.")
-        
-        except Exception as e:
-            error_message = CustomException(e, sys)
-            logger.error(error_message)
+        with stage_timer("model_load"):
+            model = model_registry.get(self.bearing_num)
 
         return model
 
-    def _predict(self, input):
-        """For the input, do the predictions and return them.
+    def predict_batch(self, features):
+        """Predict the health status of many feature rows with one model call
 
         Args:
-            input (np array)
+            features (np array): (n_rows, n_features) feature matrix
 
         Returns:
-            tuple: the prediction and the probability
+            np array: predictions (1 denotes faulty)
         """
-        try: 
-            # Load the classifier and the scaler for the specified fault
-            clf = self._load_model()
-
-            n_features = input.shape[-1]
-            logger.info(f"Number of features: {n_features}")
-
-            # Get the prediction of the model on the input data
-            y_pred = clf.predict(input)
+        clf = self._load_model()
 
+        try:
             # Convert -1 to 1 (Label 1 denotes faulty file)
-            y_pred = convert_prediction_to_label(y_pred)[0]
-            logger.info(f'Prediction successful on the {y_pred}')
-        
+            with stage_timer("predict"):
+                y_pred = convert_prediction_to_label(clf.predict(features))
+
         except Exception as e:
-            error_message = CustomException(e, sys)
-            logger.error(error_message)
+            raise CustomException(e, sys)
 
         return y_pred
 
-    def predict_faulty_or_healthy(self, data):
-        """Predict if a given file is healthy or not
 
-        Args:
-            data(dictionary): the json file
-            fault_type (str): the type of the fault
+class InvalidRequestError(ValueError):
+    """A request whose payload or headers cannot be read, answered with 400 Bad Request"""
 
-        Returns:
-            dict: health report
-        """        
-        try:
-            # Get the sampling rate of the data
-            sampling_rate = self.predictor_configs.sampling_rate
-
-            # Extract the features from the data
-            data_transform = DataTransformation(bearing_num=self.bearing_num)
-
-            # Get the features from the data
-            features_dict = data_transform.featurize(data, sampling_rate)
-            features = np.array(list(features_dict.values())).reshape(1, -1)
-
-            # Give the prediction on the feature set (prediction = 0 or 1) and obtain the decision score
-            y_pred = self._predict(input=features)
 
-        except Exception as e:
-            error_message = CustomException(e, sys)
-            logger.error(error_message)
+@app.exception_handler(InvalidRequestError)
+async def invalid_request_handler(request: Request, exc: InvalidRequestError):
+    logger.debug("Invalid request to %s: %s", request.url.path, exc)
 
-        return y_pred, features_dict
+    return JSONResponse(content={"error": str(exc)}, status_code=400)
 
 
 @app.exception_handler(Exception)
 async def custom_exception_handler(request: Request, exc: Exception):
     # Log the error here
-    logger.error(f"Unhandled Exception: {exc} for request")
+    logger.error("Unhandled Exception: %s for request", exc)
 
     method       = request.method
-    url          = request.url
+    url          = str(request.url)
     headers      = request.headers
     query_params = request.query_params
-    client       = request.client
+    client       = list(request.client) if request.client else None
 
     # Construct a response with the extracted information
     response_data = {
@@ -153,56 +136,659 @@ async def custom_exception_handler(request: Request, exc: Exception):
     return JSONResponse(content=response_data, status_code=500)
 
 
-@app.get('/ping')
-def ping():
-    """Determine if the container is working and healthy. In this sample container, we declare
-    it healthy if we can load the model successfully."""
+# Binary payloads carry the raw little-endian samples (or a .npy file) with the metadata in headers
+BINARY_CONTENT_TYPES = ("application/octet-stream", "application/x-npy")
+BINARY_DTYPES = {"float32": "<f4", "float64": "<f8"}
 
-    # status = 200 if model_health else 404
-    status = 200
 
-    return {"status": status}
+def decode_binary_frame(body, content_type, dtype="float32"):
+    """Decode a binary frame into a numpy array without copying the samples
 
+    Args:
+        body (bytes): request body
+        content_type (str): application/octet-stream (raw samples) or application/x-npy
+        dtype (str, optional): dtype of the raw samples, float32 or float64. Defaults to "float32".
 
-@app.post("/invocations", status_code=200)
-async def transformation(request: Request):
-    """Prediction on a single JSON file"""
+    Returns:
+        np array: read-only view on the request body
+    """
+    if content_type == "application/x-npy":
+        buffer = io.BytesIO(body)
+
+        try:
+            version = np.lib.format.read_magic(buffer)
+
+            if version == (1, 0):
+                shape, fortran_order, npy_dtype = np.lib.format.read_array_header_1_0(buffer)
+            elif version == (2, 0):
+                shape, fortran_order, npy_dtype = np.lib.format.read_array_header_2_0(buffer)
+            else:
+                raise InvalidRequestError(f"Unsupported .npy format version {version}")
+
+            count = int(np.prod(shape))
+            data = np.frombuffer(body, dtype=npy_dtype, count=count, offset=buffer.tell())
+
+        except InvalidRequestError:
+            raise
+        except ValueError as e:
+            raise InvalidRequestError(f"Invalid .npy payload: {e}") from e
+
+        return data.reshape(shape, order="F" if fortran_order else "C")
+
+    if dtype not in BINARY_DTYPES:
+        raise InvalidRequestError(f"Unsupported dtype {dtype}, expected one of {list(BINARY_DTYPES)}")
+
+    itemsize = np.dtype(BINARY_DTYPES[dtype]).itemsize
+    if len(body) % itemsize:
+        raise InvalidRequestError(f"The body of {len(body)} bytes is not a whole number of {dtype} samples")
+
+    return np.frombuffer(body, dtype=BINARY_DTYPES[dtype])
+
+
+def parse_header_ints(headers, name):
+    """Parse a comma separated header of integers
+
+    Args:
+        headers (Headers): request headers
+        name (str): header name
+
+    Returns:
+        list: the integers, empty when the header is missing
+    """
+    try:
+        return [int(value) for value in headers.get(name, "").split(",") if value.strip()]
+    except ValueError as e:
+        raise InvalidRequestError(f"{name} must be comma separated integers") from e
+
+
+async def read_json(request):
+    """Read the JSON body of a request
+
+    Args:
+        request (Request): the request
+
+    Returns:
+        the decoded body
+    """
+    try:
+        return await request.json()
+    except ValueError as e:
+        raise InvalidRequestError(f"Invalid JSON body: {e}") from e
+
+
+async def read_invocation(request):
+    """Read the frame, timestamp and bearing number of an /invocations request
+
+    JSON requests carry accelData, timeStamp and bearingNum in the body. Binary requests carry
+    the samples in the body and the metadata in the X-Timestamp, X-Bearing-Num and X-Dtype headers.
+
+    Args:
+        request (Request): the request
+
+    Returns:
+        tuple: accel_data, timestamp, bearing_num, digest of the payload
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    body = await request.body()
+
+    if content_type in BINARY_CONTENT_TYPES:
+        accel_data  = decode_binary_frame(body, content_type, dtype=request.headers.get("x-dtype", "float32").lower())
+        timestamp   = request.headers.get("x-timestamp")
+        bearing_num = request.headers.get("x-bearing-num")
 
-    try: 
+    else:
         # Read the json data passed as the request
-        post_data  = await request.json()
-        logger.info(f"Request keys: {post_data.keys()}")
+        try:
+            post_data  = json.loads(body)
+            logger.debug("Request keys: %s", post_data.keys())
+        except (ValueError, AttributeError) as e:
+            raise InvalidRequestError(f"Invalid JSON body: {e}") from e
 
         # Extract the data from the request
-        accel_data  = np.array(post_data.get('accelData'))
         timestamp   = post_data.get('timeStamp')
         bearing_num = post_data.get('bearingNum')
 
-        # Instantiate the predictor class
-        predictor = Predictor(bearing_num=bearing_num)
+        try:
+            accel_data = np.asarray(post_data.get('accelData'), dtype=float)
+        except (TypeError, ValueError) as e:
+            raise InvalidRequestError(f"accelData must be a list of samples: {e}") from e
+
+    try:
+        timestamp, bearing_num = int(timestamp), int(bearing_num)
+    except (TypeError, ValueError) as e:
+        raise InvalidRequestError("The request needs an integer timestamp and bearing number") from e
+
+    # The features are computed over one second of samples
+    if accel_data.ndim != 1 or len(accel_data) < PredictorConfig.sampling_rate:
+        raise InvalidRequestError(f"accelData must be a list of at least {PredictorConfig.sampling_rate} samples, got shape {accel_data.shape}")
+
+    return accel_data, timestamp, bearing_num, payload_digest(body)
+
+
+def score_features(features_dict, bearing_nums):
+    """Predict the health status of feature rows with one call per bearing model
+
+    Args:
+        features_dict (dict): feature name -> np array with one value per frame
+        bearing_nums (np array): bearing number of every frame
+
+    Returns:
+        tuple: predictions, errors (row -> message)
+    """
+    features = np.column_stack(list(features_dict.values()))
+
+    y_pred = np.zeros(len(features), dtype=int)
+    errors = dict()
+
+    # Group the rows by bearing
+    for bearing_num in np.unique(bearing_nums):
+        rows = np.flatnonzero(bearing_nums == bearing_num)
+
+        try:
+            y_pred[rows] = Predictor(bearing_num=int(bearing_num)).predict_batch(features[rows])
+        except Exception as e:
+            logger.error(e)
+            errors.update({int(row): f"Prediction failed for bearing {bearing_num}" for row in rows})
+
+    return y_pred, errors
+
+
+async def predict_frames(frames, bearing_nums):
+    """Featurize frames as one matrix and predict with one call per bearing model, off the event loop
+
+    Args:
+        frames (np array): (n_frames, n_samples) frames
+        bearing_nums (np array): bearing number of every frame
+
+    Returns:
+        tuple: predictions, features dict (one value per frame), errors (row -> message)
+    """
+    features_dict = await compute_executor.featurize(frames, PredictorConfig.sampling_rate)
+    y_pred, errors = await compute_executor.run(score_features, features_dict, bearing_nums)
+
+    return y_pred, features_dict, errors
+
+
+async def read_batch_invocation(request):
+    """Read the frames, timestamps and bearing numbers of an /invocations/batch request
+
+    JSON requests carry a list of items, each shaped like an /invocations request. Binary
+    requests carry a (n_frames, n_samples) array (.npy or raw samples) in the body and comma
+    separated X-Timestamps and X-Bearing-Nums headers.
+
+    Args:
+        request (Request): the request
+
+    Returns:
+        tuple: list of frames, list of timestamps, list of bearing numbers, errors (index -> message)
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+    frames, timestamps, bearing_nums, errors = [], [], [], dict()
+
+    if content_type in BINARY_CONTENT_TYPES:
+        body = await request.body()
+
+        timestamps   = parse_header_ints(request.headers, "x-timestamps")
+        bearing_nums = parse_header_ints(request.headers, "x-bearing-nums")
+
+        if not timestamps:
+            raise InvalidRequestError("Binary batches need the X-Timestamps and X-Bearing-Nums headers")
+        if len(timestamps) != len(bearing_nums):
+            raise InvalidRequestError("X-Timestamps and X-Bearing-Nums must have the same number of values")
+
+        data = decode_binary_frame(body, content_type, dtype=request.headers.get("x-dtype", "float32").lower())
+
+        if data.size == 0 or data.size % len(timestamps) or (data.ndim > 1 and data.shape[0] != len(timestamps)):
+            raise InvalidRequestError(f"A body of shape {data.shape} does not hold {len(timestamps)} frames of equal length")
+
+        frames = list(data.reshape(len(timestamps), -1))
+
+    else:
+        post_data = await read_json(request)
+        items = post_data.get('items', []) if isinstance(post_data, dict) else None
+
+        if not isinstance(items, list):
+            raise InvalidRequestError("Batches need an items list")
+
+        for index, item in enumerate(items):
+            try:
+                frame = np.asarray(item['accelData'], dtype=float)
+                if frame.ndim != 1 or not len(frame):
+                    raise ValueError("accelData must be a non-empty list of samples")
+
+                timestamp, bearing_num = int(item['timeStamp']), int(item['bearingNum'])
+
+            except Exception as e:
+                # Keep the lists aligned, the item is reported as an error
+                frames.append(None)
+                timestamps.append(None)
+                bearing_nums.append(None)
+                errors[index] = f"Invalid item: {e!r}"
+                continue
+
+            frames.append(frame)
+            timestamps.append(timestamp)
+            bearing_nums.append(bearing_num)
+
+    return frames, timestamps, bearing_nums, errors
 
-        # Get the prediction of the model on the input data
-        y_pred, features_dict = predictor.predict_faulty_or_healthy(accel_data)
-        logger.info(f'ML prediction on the file: {y_pred}')
 
-        unique_id = f"{timestamp}b{bearing_num}"
+async def read_machine_invocation(request):
+    """Read the multi-channel frame, timestamp and channel map of an /invocations/machine request
+
+    JSON requests carry timeStamp, accelData as a (n_channels, n_samples) nested list and an
+    optional channelMap. Binary requests carry the (n_channels, n_samples) frame (.npy or raw
+    samples) in the body and the X-Timestamp, X-Channel-Map (comma separated, empty entries skip
+    a channel) and X-Num-Channels headers.
+
+    Args:
+        request (Request): the request
+
+    Returns:
+        tuple: frame, timestamp, channel indices, bearing numbers
+    """
+    content_type = request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+
+    if content_type in BINARY_CONTENT_TYPES:
+        body = await request.body()
+
+        data = decode_binary_frame(body, content_type, dtype=request.headers.get("x-dtype", "float32").lower())
+        timestamp = request.headers.get("x-timestamp")
+
+        channel_map = request.headers.get("x-channel-map")
+        if channel_map is not None:
+            try:
+                channel_map = [int(value) if value.strip() else None for value in channel_map.split(",")]
+            except ValueError as e:
+                raise InvalidRequestError("X-Channel-Map must be comma separated bearing numbers") from e
+
+        if data.ndim == 1:
+            # Raw samples carry no shape, the number of channels comes from the headers
+            n_channels = parse_header_ints(request.headers, "x-num-channels") or [len(channel_map) if channel_map else 0]
+            if n_channels[0] <= 0 or data.size % n_channels[0]:
+                raise InvalidRequestError(f"{data.size} samples do not split into the channels given by X-Num-Channels or X-Channel-Map")
+
+            data = data.reshape(n_channels[0], -1)
+
+    else:
+        post_data = await read_json(request)
+        if not isinstance(post_data, dict):
+            raise InvalidRequestError("The body must be a JSON object")
+
+        try:
+            data = np.asarray(post_data.get('accelData'), dtype=float)
+        except (TypeError, ValueError) as e:
+            raise InvalidRequestError(f"accelData must be a (n_channels, n_samples) nested list: {e}") from e
+
+        timestamp = post_data.get('timeStamp')
+        channel_map = post_data.get('channelMap')
+
+    # The features are computed over one second of samples
+    if data.ndim != 2 or data.shape[1] < PredictorConfig.sampling_rate:
+        raise InvalidRequestError(f"Expected a (n_channels, n_samples) frame of at least {PredictorConfig.sampling_rate} samples, got shape {data.shape}")
+
+    try:
+        channels, bearing_nums = parse_channel_map(channel_map, data.shape[0])
+    except ValueError as e:
+        raise InvalidRequestError(str(e)) from e
+
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError) as e:
+        raise InvalidRequestError("The request needs an integer timestamp") from e
+
+    return data, timestamp, channels, bearing_nums
+
+
+class RingBuffer:
+    """Fixed size buffer holding the latest samples of a stream"""
+
+    def __init__(self, size, dtype=np.float64):
+        self._data = np.zeros(size, dtype=dtype)
+        self._pos = 0
+        self.size = size
+        self.count = 0
+
+    def extend(self, samples):
+        """Append samples, overwriting the oldest ones
+
+        Args:
+            samples (np array): 1-D samples
+        """
+        n_samples = len(samples)
+        self.count += n_samples
+
+        # Only the latest size samples can survive
+        if n_samples >= self.size:
+            self._data[:] = samples[-self.size:]
+            self._pos = 0
+            return None
+
+        first = min(n_samples, self.size - self._pos)
+        self._data[self._pos:self._pos + first] = samples[:first]
+        self._data[:n_samples - first] = samples[first:]
+        self._pos = (self._pos + n_samples) % self.size
+
+        return None
+
+    def window(self):
+        """Latest size samples in time order
+
+        Returns:
+            np array: copy of the buffer contents
+        """
+        return np.concatenate((self._data[self._pos:], self._data[:self._pos]))
+
+
+async def predict_frame(frame, bearing_num):
+    """Predict a single frame, through the micro-batcher when it is enabled
+
+    Args:
+        frame (np array): 1-D frame
+        bearing_num (int): bearing number
+
+    Returns:
+        tuple: prediction, features dict of the frame
+    """
+    if micro_batcher.enabled:
+        return await micro_batcher.submit(frame, bearing_num)
+
+    y_pred, features_dict, errors = await predict_frames(frame[np.newaxis, :], np.array([bearing_num]))
+    if errors:
+        raise ValueError(errors[0])
+
+    return y_pred[0], {name: values[0] for name, values in features_dict.items()}
+
+
+# Featurization and inference run on a bounded executor, the event loop only does I/O
+compute_executor = ComputeExecutor()
+
+# Concurrent single-frame requests are optionally predicted together (MICRO_BATCHING=1)
+micro_batcher = MicroBatcher(predict_fn=predict_frames)
+
+# Responses of repeated (retried) requests are served from memory
+response_cache = ResponseCache()
+
+# Predictions are persisted in batches behind the responses
+prediction_writer = WriteBehindQueue(db_name=PredictorConfig.db_name, collection_name=PredictorConfig.collection_name, local=PredictorConfig.db_local)
+
+
+# Model cache state, queue depths and the totals of the queues and caches, read when /metrics is scraped
+metrics.gauge("models_loaded", "Number of bearing models in the registry", lambda: len(model_registry))
+metrics.gauge("compute_jobs", "Jobs of the compute executor by state", lambda: {(state,): value for state, value in compute_executor.stats().items() if state != "completed"}, ["state"])
+metrics.gauge("micro_batch_queue_depth", "Frames waiting for a micro-batch", micro_batcher.qsize)
+metrics.gauge("write_queue_depth", "Predictions waiting to be written to the database", prediction_writer.qsize)
+metrics.callback_counter("write_documents_total", "Predictions handled by the write-behind queue by outcome", lambda: {(outcome,): prediction_writer.stats[outcome] for outcome in ("written", "dropped")}, ["outcome"])
+metrics.callback_counter("write_retries_total", "Batch write retries of the write-behind queue", lambda: prediction_writer.stats["retries"])
+metrics.gauge("response_cache_size", "Responses in the response cache", lambda: len(response_cache))
+metrics.callback_counter("response_cache_lookups_total", "Response cache lookups by result", lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses}, ["result"])
+
+
+@app.on_event("startup")
+async def startup():
+    """Load the models (unless the app was preloaded), watch for new model artifacts and start
+    the compute executor, the micro-batcher and the prediction writer"""
+    if not len(model_registry):
+        model_registry.load_all()
+
+    model_registry.start_watcher()
+
+    # Connect once per worker; the requests reuse the storage and its connections
+    ensure_indexes(PredictorConfig.db_name, PredictorConfig.collection_name, local=PredictorConfig.db_local)
+
+    compute_executor.start()
+    if micro_batcher.enabled:
+        await micro_batcher.start()
+
+    await prediction_writer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the micro-batcher, drain the prediction writer, stop the compute executor, stop watching
+    for new model artifacts and close the database client"""
+    await micro_batcher.stop()
+    await prediction_writer.stop()
+    await compute_executor.stop()
+    model_registry.stop_watcher()
+    close_clients()
+
+
+@app.get('/ping')
+async def ping():
+    """Determine if the container is working and healthy. In this sample container, we declare
+    it healthy if we can load the model successfully."""
+
+    status = 200 if len(model_registry) else 404
+
+    # Health checks read the HTTP status, not the body
+    return JSONResponse(content={"status": status, "compute": compute_executor.stats(), "batching": micro_batcher.stats(), "cache": response_cache.stats()}, status_code=status)
+
+
+@app.get('/metrics')
+async def metrics_endpoint():
+    """Per-stage latency histograms, request and error counters, model cache state and queue depths
+    of this worker in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/invocations", status_code=200)
+async def transformation(request: Request):
+    """Prediction on a single JSON or binary frame"""
+
+    # Read the frame and its metadata from the request
+    with stage_timer("parse"):
+        accel_data, timestamp, bearing_num, digest = await read_invocation(request)
+
+    if bearing_num not in model_registry:
+        return JSONResponse(content={"error": f"No model for bearing {bearing_num}"}, status_code=404)
+
+    async def predict_and_store():
+        # Get the prediction of the model on the input data (off the event loop)
+        y_pred, features_dict = await predict_frame(accel_data, bearing_num)
+        logger.debug('ML prediction on the file: %s', y_pred)
 
         # Construct the response
-        response_data = {
-            "_id": unique_id,                                 # ID
-            "tS"  : int(timestamp),                           # Epoch time
-            "bN": int(bearing_num),                           # Bearing number
-            "rA": float(round(features_dict['trms'], 3)),     # RMS acceleration
-            "hS": int(y_pred)                                 # Health Status
-        }
+        response_data = make_health_record(timestamp, bearing_num, features_dict['trms'], y_pred)
+
+        # Queue the data for insertion into the database
+        await prediction_writer.put(response_data)
 
-        # Insert the data into the database
-        insert_data(db_name='machinehealth', collection_name='test', data=response_data, local=False)
+        return response_data
+
+    try:
+        # A retried request is answered from the cache without compute or a database write
+        response_data, cached = await response_cache.get_or_create(f"{timestamp}b{bearing_num}:{digest}", predict_and_store)
+        if cached:
+            logger.debug("Served %s from the response cache", response_data['_id'])
+
+    except QueueFullError as e:
+        logger.warning(f"Rejected a frame of bearing {bearing_num}: {e}")
+
+        return JSONResponse(content={"error": "Too many frames are waiting for a prediction, retry later"}, status_code=503)
 
     except Exception as e:
         error_message = CustomException(e, sys)
         logger.error(error_message)
-        
+
+        return JSONResponse(content={"error": f"Prediction failed for bearing {bearing_num}"}, status_code=500)
+
     return JSONResponse(content=response_data, status_code=200)
 
 
+@app.post("/invocations/batch", status_code=200)
+async def batch_transformation(request: Request):
+    """Prediction on many frames, possibly of different bearings, in one request"""
+
+    # Read the frames and their metadata from the request
+    with stage_timer("parse"):
+        frames, timestamps, bearing_nums, errors = await read_batch_invocation(request)
+    results = [None] * len(frames)
+
+    # Frames of the same length are featurized together as one matrix
+    lengths = dict()
+    for index, frame in enumerate(frames):
+        if index not in errors:
+            lengths.setdefault(frame.shape[-1], []).append(index)
+
+    for indices in lengths.values():
+        try:
+            y_pred, features_dict, batch_errors = await predict_frames(np.stack([frames[index] for index in indices]), np.array([bearing_nums[index] for index in indices]))
+
+            for row, index in enumerate(indices):
+                if row in batch_errors:
+                    errors[index] = batch_errors[row]
+                else:
+                    results[index] = make_health_record(timestamps[index], bearing_nums[index], features_dict['trms'][row], y_pred[row])
+
+        except Exception as e:
+            error_message = CustomException(e, sys)
+            logger.error(error_message)
+            errors.update({index: "Featurization failed" for index in indices})
+
+    for index, message in errors.items():
+        results[index] = {"index": index, "error": message}
+
+    # Queue the successful predictions for a bulk insert into the database
+    await prediction_writer.put_many([result for result in results if "error" not in result])
+
+    logger.debug("Batch prediction on %d frames with %d errors", len(results), len(errors))
+
+    return JSONResponse(content={"results": results}, status_code=200)
+
+
+@app.post("/invocations/machine", status_code=200)
+async def machine_transformation(request: Request):
+    """Prediction on one multi-channel frame covering several bearings of a machine"""
+
+    # Read the frame and its channel map from the request
+    with stage_timer("parse"):
+        data, timestamp, channels, bearing_nums = await read_machine_invocation(request)
+
+    # All the mapped channels are featurized together in one FFT and statistics pass
+    frames = data if channels == list(range(data.shape[0])) else data[channels]
+
+    try:
+        y_pred, features_dict, errors = await predict_frames(frames, np.array(bearing_nums))
+    except Exception as e:
+        error_message = CustomException(e, sys)
+        logger.error(error_message)
+        errors = {row: "Featurization failed" for row in range(len(bearing_nums))}
+
+    # Construct the per-bearing health report
+    bearings = []
+    for row, bearing_num in enumerate(bearing_nums):
+        if row in errors:
+            bearings.append({"bN": bearing_num, "error": errors[row]})
+        else:
+            bearings.append(make_health_record(timestamp, bearing_num, features_dict['trms'][row], y_pred[row]))
+
+    # Queue the successful predictions for a bulk insert into the database
+    await prediction_writer.put_many([record for record in bearings if "error" not in record])
+
+    logger.debug("Machine prediction on %d bearings with %d errors", len(bearings), len(errors))
+
+    return JSONResponse(content={"tS": timestamp, "bearings": bearings}, status_code=200)
+
+
+@app.websocket("/stream")
+async def stream_transformation(websocket: WebSocket):
+    """Sliding-window predictions on a continuous sample stream of one bearing
+
+    The client first sends a JSON text message with bearingNum, timeStamp (epoch time of the first
+    sample) and optionally hop (samples between predictions, at least STREAM_MIN_HOP), window
+    (samples per prediction), dtype (float32 or float64) and persist; an invalid configuration is
+    answered with an error and the stream is closed. It then streams the samples as binary
+    messages of raw little-endian values, or as JSON text messages with an accelData list. A
+    health record is sent back every hop samples once the first window is full, with the _id
+    <tS>.<milliseconds>b<bN> of its window start. A malformed message is answered with an error
+    and the stream stays open.
+    """
+    await websocket.accept()
+
+    try:
+        stream_config = await websocket.receive_json()
+
+        sampling_rate = PredictorConfig.sampling_rate
+        bearing_num = int(stream_config['bearingNum'])
+        start_time = float(stream_config['timeStamp'])
+        window_size = int(stream_config.get('window', sampling_rate))
+        hop = int(stream_config.get('hop', sampling_rate // 2))
+        dtype = BINARY_DTYPES[stream_config.get('dtype', 'float32')]
+        persist = bool(stream_config.get('persist', False))
+
+        if window_size < sampling_rate:
+            raise ValueError(f"The window must hold at least {sampling_rate} samples")
+        if hop < PredictorConfig.stream_min_hop:
+            raise ValueError(f"The hop must be at least {PredictorConfig.stream_min_hop} samples")
+
+    except Exception as e:
+        await websocket.send_json({"error": f"Invalid stream configuration: {e!r}"})
+        await websocket.close(code=1003)
+        return None
+
+    # Per connection memory is one window, whatever the stream length
+    ring_buffer = RingBuffer(window_size)
+    until_next = window_size
+
+    logger.info("Streaming bearing %d with a window of %d and a hop of %d samples", bearing_num, window_size, hop)
+
+    try:
+        while True:
+            message = await websocket.receive()
+
+            if message["type"] == "websocket.disconnect":
+                break
+
+            # A malformed message is answered with an error, the stream stays open
+            try:
+                if message.get("bytes") is not None:
+                    if len(message["bytes"]) % np.dtype(dtype).itemsize:
+                        raise ValueError(f"{len(message['bytes'])} bytes are not a whole number of {np.dtype(dtype).name} samples")
+                    samples = np.frombuffer(message["bytes"], dtype=dtype)
+                else:
+                    samples = np.asarray(json.loads(message["text"])['accelData'], dtype=float).ravel()
+
+            except (ValueError, TypeError, KeyError) as e:
+                await websocket.send_json({"bN": bearing_num, "error": f"Invalid samples: {e}"})
+                continue
+
+            # Feed the samples hop by hop so every window boundary gets a prediction
+            offset = 0
+            while offset < len(samples):
+                take = min(len(samples) - offset, until_next)
+                ring_buffer.extend(samples[offset:offset + take])
+                offset += take
+                until_next -= take
+
+                if until_next:
+                    continue
+                until_next = hop
+
+                # Epoch time of the first sample of the window, in seconds and in milliseconds
+                window_start_ms = int((start_time + (ring_buffer.count - window_size) / sampling_rate) * 1000)
+                timestamp = window_start_ms // 1000
+
+                try:
+                    y_pred, features_dict = await predict_frame(ring_buffer.window(), bearing_num)
+
+                    # Hops are shorter than a second, the records are keyed by the millisecond
+                    health_record = make_health_record(timestamp, bearing_num, features_dict['trms'], y_pred,
+                                                       record_id=f"{timestamp}.{window_start_ms % 1000:03d}b{bearing_num}")
+
+                    if persist:
+                        await prediction_writer.put(health_record)
+
+                    await websocket.send_json(health_record)
+
+                except Exception as e:
+                    error_message = CustomException(e, sys)
+                    logger.error(error_message)
+                    await websocket.send_json({"tS": timestamp, "bN": bearing_num, "error": "Prediction failed"})
+
+    except WebSocketDisconnect:
+        pass
+
+    logger.info("Stream of bearing %d closed after %d samples", bearing_num, ring_buffer.count)
+
+    return None
@@ -1,15 +1,19 @@
 import numpy as np
 
 from src.components.model_trainer import ModelTrainer
+from src.profiling import profiler, profile_stage
 
 
 if __name__ == "__main__":
 
     bearing_num = 4
+    out_of_core = False
 
     trainer = ModelTrainer(bearing_num=bearing_num)
 
-    X_train, X_val = trainer.prepare_training_data()
+    # With out_of_core the model is fit on a bounded float32 reservoir sample of the train split
+    with profile_stage("prepare_training_data"):
+        X_train, X_val = trainer.prepare_training_data(out_of_core=out_of_core)
 
     params = {
         "n_estimators":100,
@@ -20,13 +24,27 @@ if __name__ == "__main__":
         "random_state": 42
     }
 
-    model, y_pred_train, y_pred_val = trainer.train_model(X_train, X_val, params)
+    # Rolling-origin cross validation over the healthy part of the feature table
+    with profile_stage("cv"):
+        cv_results = trainer.cross_validate(trainer.prepare_cv_data(), params)
 
-    y_pred_test = trainer.predict_test(model)
+    for result in cv_results:
+        print(f"Fold {result['fold']}: accuracy={result['accuracy']:.3f}, fit={result['fit_time']:.3f}s, score={result['score_time']:.3f}s")
 
-    y_preds_all = np.concatenate([y_pred_train, y_pred_val, y_pred_test], axis=0)
+    with profile_stage("train_model"):
+        model, y_pred_train, y_pred_val = trainer.train_model(X_train, X_val, params)
 
-    print(f"Y predictions all: {y_preds_all}")
+    with profile_stage("predict_test"):
+        y_pred_test = trainer.predict_test(model)
 
-    trainer.save_predictions(data_filepath=f'artifacts/data/transformed/processed_data_b{bearing_num}.csv', y_preds=y_preds_all)
+    # The train predictions only line up with the processed table when the full train split was used
+    if not out_of_core:
+        y_preds_all = np.concatenate([y_pred_train, y_pred_val, y_pred_test], axis=0)
 
+        print(f"Y predictions all: {y_preds_all}")
+
+        trainer.save_predictions(data_filepath=f'artifacts/data/transformed/processed_data_b{bearing_num}.csv', y_preds=y_preds_all)
+
+    # Stages are only recorded with PROFILE=1 (PROFILE_MEMORY=1 adds memory tracing)
+    if profiler.enabled:
+        profiler.save(f"train_b{bearing_num}")
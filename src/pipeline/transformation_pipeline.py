@@ -1,6 +1,7 @@
 import os
 
 from src.components.data_transformation import DataTransformation
+from src.profiling import profiler, profile_stage
 
 
 if __name__ == "__main__":
@@ -10,8 +11,15 @@ if __name__ == "__main__":
 
     data_transformation = DataTransformation(bearing_num=bearing_num)
 
-    features_list = data_transformation.featurize_all(data_dir, sampling_rate)
+    # Stages are only recorded with PROFILE=1 (PROFILE_MEMORY=1 adds memory tracing)
+    with profile_stage("featurize_all"):
+        features_list = data_transformation.featurize_all(data_dir, sampling_rate)
 
-    df = data_transformation.transform_to_df(features_list, save=True)
+    with profile_stage("transform_to_df"):
+        df = data_transformation.transform_to_df(features_list, save=True)
 
-    data_transformation.split_data(df, train_size=400, save=True)
\ No newline at end of file
+    with profile_stage("split_data"):
+        data_transformation.split_data(df, train_size=400, save=True)
+
+    if profiler.enabled:
+        profiler.save(f"transformation_b{bearing_num}")
@@ -0,0 +1,252 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+import numpy as np
+
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ProfilingConfig:
+    """Profiling configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    enabled: bool = os.getenv("PROFILE", "0") == "1"
+    trace_memory: bool = os.getenv("PROFILE_MEMORY", "0") == "1"
+    output_dir: str = os.getenv("PROFILE_DIR", os.path.join("artifacts", "profiles"))
+
+
+# Shared no-op context of the disabled profiler
+_DISABLED = nullcontext()
+
+MB = 1024 * 1024
+
+
+class Profiler:
+    """Opt-in per-stage profiler of the offline pipelines.
+
+    While disabled, stage() returns a shared no-op context, so the instrumented code pays one
+    attribute check per stage. While enabled, every stage is recorded as a complete event with its
+    thread and, with memory tracing, the traced (tracemalloc) memory delta and peak. The events are
+    aggregated into per-stage totals and percentiles and exported as a Chrome trace that opens in
+    chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self, enabled=None, trace_memory=None):
+        self.profiling_config = ProfilingConfig()
+
+        if enabled is not None:
+            self.profiling_config.enabled = enabled
+        if trace_memory is not None:
+            self.profiling_config.trace_memory = trace_memory
+
+        self.events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+
+        if self.profiling_config.enabled:
+            self.enable()
+
+    @property
+    def enabled(self):
+        return self.profiling_config.enabled
+
+    def enable(self, trace_memory=None):
+        """Start recording stages
+
+        Args:
+            trace_memory (bool, optional): also trace the memory of every stage. Defaults to the config value.
+        """
+        if trace_memory is not None:
+            self.profiling_config.trace_memory = trace_memory
+
+        if self.profiling_config.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+        self.profiling_config.enabled = True
+
+        return None
+
+    def disable(self):
+        """Stop recording stages"""
+        self.profiling_config.enabled = False
+
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        return None
+
+    def reset(self):
+        """Drop the recorded events"""
+        with self._lock:
+            self.events = []
+        self._origin = time.perf_counter_ns()
+
+        return None
+
+    def stage(self, name, **args):
+        """Record the with block as a stage, e.g. with profiler.stage("loadtxt"): ...
+
+        Args:
+            name (str): stage name
+            args: extra values shown with the event in the trace viewer
+        """
+        if not self.profiling_config.enabled:
+            return _DISABLED
+
+        return self._record(name, args)
+
+    @contextmanager
+    def _record(self, name, args):
+        memory = self.profiling_config.trace_memory and tracemalloc.is_tracing()
+        stack = self._local.__dict__.setdefault("stack", [])
+
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset per stage, hand the peak so far to the enclosing stages first
+            for frame in stack:
+                frame[1] = max(frame[1], peak)
+            tracemalloc.reset_peak()
+            frame = [current, current]
+            stack.append(frame)
+
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self._origin) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_native_id(),
+                "args": dict(args),
+            }
+
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                stack.pop()
+                frame[1] = max(frame[1], peak)
+                for parent in stack:
+                    parent[1] = max(parent[1], frame[1])
+
+                event["args"].update({"mem_delta_mb": (current - frame[0]) / MB, "mem_peak_mb": (frame[1] - frame[0]) / MB})
+                memory_event = {"name": "traced_memory", "ph": "C", "ts": event["ts"] + event["dur"], "pid": event["pid"], "args": {"MB": current / MB}}
+
+            with self._lock:
+                self.events.append(event)
+                if memory:
+                    self.events.append(memory_event)
+
+    def summary(self):
+        """Aggregate the recorded stages
+
+        Returns:
+            dict: stage -> count, total seconds, mean and percentile milliseconds (and the largest memory peak)
+        """
+        with self._lock:
+            events = [event for event in self.events if event["ph"] == "X"]
+
+        durations, peaks = dict(), dict()
+        for event in events:
+            durations.setdefault(event["name"], []).append(event["dur"] / 1000)
+            if "mem_peak_mb" in event["args"]:
+                peaks[event["name"]] = max(peaks.get(event["name"], 0.0), event["args"]["mem_peak_mb"])
+
+        summary = dict()
+        for name, values in durations.items():
+            values = np.array(values)
+            summary[name] = {
+                "count": len(values),
+                "total_s": float(values.sum() / 1000),
+                "mean_ms": float(values.mean()),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p95_ms": float(np.percentile(values, 95)),
+                "p99_ms": float(np.percentile(values, 99)),
+                "max_ms": float(values.max()),
+            }
+            if name in peaks:
+                summary[name]["mem_peak_mb"] = peaks[name]
+
+        # Slowest stages first
+        return dict(sorted(summary.items(), key=lambda item: item[1]["total_s"], reverse=True))
+
+    def format_summary(self):
+        """Format the summary as a table
+
+        Returns:
+            str: table
+        """
+        lines = [f"{'stage':24s} {'count':>7s} {'total s':>9s} {'mean ms':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'max ms':>9s} {'peak MB':>8s}"]
+        for name, stats in self.summary().items():
+            peak = f"{stats['mem_peak_mb']:8.1f}" if "mem_peak_mb" in stats else f"{'-':>8s}"
+            lines.append(f"{name:24s} {stats['count']:7d} {stats['total_s']:9.3f} {stats['mean_ms']:9.2f} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['max_ms']:9.2f} {peak}")
+
+        return "\n".join(lines)
+
+    def export_chrome_trace(self, filepath):
+        """Write the recorded events in the Chrome trace event format
+
+        Args:
+            filepath (str): path of the json trace
+        """
+        with self._lock:
+            events = list(self.events)
+
+        # Name the threads so the viewer shows e.g. MainThread instead of a bare id
+        thread_names = {thread.native_id: thread.name for thread in threading.enumerate()}
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_names.get(tid, str(tid))}}
+            for pid, tid in sorted({(event["pid"], event["tid"]) for event in events if "tid" in event})
+        ]
+
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        with open(filepath, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+
+        return None
+
+    def save(self, name):
+        """Log the summary and save it with the Chrome trace in the output directory
+
+        Args:
+            name (str): name of the profiled run, e.g. transformation
+
+        Returns:
+            str: path of the trace
+        """
+        trace_path = os.path.join(self.profiling_config.output_dir, f"{name}_trace.json")
+        self.export_chrome_trace(trace_path)
+
+        with open(os.path.join(self.profiling_config.output_dir, f"{name}_summary.json"), "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+        logger.info(f"Profile of {name}:\n{self.format_summary()}")
+        logger.info(f"Chrome trace saved at {trace_path}")
+
+        return trace_path
+
+
+# The profiler of this process, enabled with PROFILE=1 (PROFILE_MEMORY=1 adds memory tracing)
+profiler = Profiler()
+
+
+def profile_stage(name, **args):
+    """Record the with block as a stage of the profiler of this process
+
+    Args:
+        name (str): stage name
+    """
+    return profiler.stage(name, **args)
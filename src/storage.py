@@ -0,0 +1,532 @@
+import os
+import re
+import sqlite3
+import threading
+import numpy as np
+
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import dataclass
+from pymongo import ASCENDING, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class StorageConfig:
+    """Storage backend configuration
+
+    Returns:
+        obj: dataclass object
+    """
+    backend: str = os.getenv("DATABASE_BACKEND", "mongo")
+    sqlite_dir: str = os.getenv("SQLITE_DIR", os.path.join("artifacts", "db"))
+    sqlite_busy_timeout: float = float(os.getenv("SQLITE_BUSY_TIMEOUT", 5.0))
+
+
+# Fields of a health record and the array typecode of their column
+HEALTH_FIELDS = ("tS", "bN", "rA", "hS")
+FIELD_TYPECODES = {"tS": "q", "bN": "q", "rA": "d", "hS": "q"}
+
+# Fields of a time bucket summary and the array typecode of their column
+SUMMARY_FIELDS = ("tS", "rA_min", "rA_mean", "rA_max", "faulty", "count")
+SUMMARY_TYPECODES = {"tS": "q", "rA_min": "d", "rA_mean": "d", "rA_max": "d", "faulty": "q", "count": "q"}
+
+# Compound index serving the per-bearing time range queries
+HEALTH_INDEX = [("bN", ASCENDING), ("tS", ASCENDING)]
+
+# MongoDB error code of a duplicate key, i.e. the document is already stored
+DUPLICATE_KEY_ERROR = 11000
+
+# Database and collection names become file and table names of the embedded backend
+IDENTIFIER_PATTERN = re.compile(r"^\w+$")
+
+
+def make_health_record(timestamp, bearing_num, rms, y_pred, record_id=None):
+    """Construct the health record returned to the client and stored in the database
+
+    Args:
+        timestamp (int): epoch time of the frame
+        bearing_num (int): bearing number
+        rms (float): RMS acceleration of the frame
+        y_pred (int): health status
+        record_id (str, optional): ID of records finer than a second. Defaults to <timestamp>b<bearing_num>.
+
+    Returns:
+        dict: health record
+    """
+    return {
+        "_id": record_id or f"{timestamp}b{bearing_num}",  # ID
+        "tS"  : int(timestamp),                           # Epoch time
+        "bN": int(bearing_num),                           # Bearing number
+        "rA": float(round(rms, 3)),                       # RMS acceleration
+        "hS": int(y_pred)                                 # Health Status
+    }
+
+
+def to_columns(columns):
+    """Turn typed arrays into NumPy arrays without copying
+
+    Args:
+        columns (dict): field -> array.array
+
+    Returns:
+        dict: field -> np array
+    """
+    return {field: np.frombuffer(column, dtype=column.typecode) if len(column) else np.array([], dtype=column.typecode) for field, column in columns.items()}
+
+
+def bucket_width(first_timestamp, last_timestamp, n_points):
+    """Width in seconds of the time buckets splitting a range into at most n_points buckets
+
+    Args:
+        first_timestamp (int): first epoch time of the range
+        last_timestamp (int): last epoch time of the range
+        n_points (int): maximum number of buckets
+
+    Returns:
+        int: bucket width
+    """
+    return max(1, -(-(int(last_timestamp) - int(first_timestamp) + 1) // max(1, int(n_points))))
+
+
+def range_query(bearing_num, start=None, end=None):
+    """Build the MongoDB query for the readings of a bearing in [start, end)
+
+    Args:
+        bearing_num (int): bearing number
+        start (int, optional): first epoch time. Defaults to None.
+        end (int, optional): epoch time after the range. Defaults to None.
+
+    Returns:
+        dict: query
+    """
+    query = {'bN': int(bearing_num)}
+
+    if start is not None or end is not None:
+        query['tS'] = {}
+        if start is not None:
+            query['tS']['$gte'] = int(start)
+        if end is not None:
+            query['tS']['$lt'] = int(end)
+
+    return query
+
+
+class Storage(ABC):
+    """Health record storage of one collection.
+
+    A backend stores the documents built by make_health_record and answers the per-bearing time
+    range queries of the service, the dashboard and the reports. Time ranges are half open,
+    [start, end), and a bound of None is unbounded. A backend that does not implement every
+    abstract method cannot be instantiated.
+    """
+
+    @abstractmethod
+    def ensure_indexes(self):
+        """Create the (bN, tS) index used by the time range queries, a no-op if it exists"""
+
+    @abstractmethod
+    def insert_one(self, document):
+        """Insert a document
+
+        Args:
+            document (dict): the document to insert
+        """
+
+    @abstractmethod
+    def insert_many(self, documents, upsert=False):
+        """Insert documents in one batch. Documents whose _id is already stored are skipped, or
+        replaced when upsert is set.
+
+        Args:
+            documents (list): the documents to insert
+            upsert (bool, optional): replace stored documents with the same _id. Defaults to False.
+
+        Returns:
+            list: the documents that could not be written and may be retried
+        """
+
+    @abstractmethod
+    def find(self, bearing_num, start=None, end=None, fields=None):
+        """Iterate over the readings of a bearing
+
+        Args:
+            bearing_num (int): bearing number
+            start (int, optional): first epoch time. Defaults to None.
+            end (int, optional): epoch time after the range. Defaults to None.
+            fields (tuple, optional): only return these fields. Defaults to None (whole documents).
+
+        Returns:
+            iterator of dict
+        """
+
+    @abstractmethod
+    def fetch_columns(self, bearing_num, start=None, end=None, fields=HEALTH_FIELDS, batch_size=5000):
+        """Fetch the readings of a bearing as columns, in time order
+
+        Args:
+            bearing_num (int): bearing number
+            start (int, optional): first epoch time. Defaults to None.
+            end (int, optional): epoch time after the range. Defaults to None.
+            fields (tuple, optional): fields to fetch. Defaults to HEALTH_FIELDS.
+            batch_size (int, optional): rows per batch. Defaults to 5000.
+
+        Returns:
+            dict: field -> np array
+        """
+
+    @abstractmethod
+    def last_timestamp(self, bearing_num):
+        """Epoch time of the latest reading of a bearing
+
+        Args:
+            bearing_num (int): bearing number
+
+        Returns:
+            int: epoch time, None when the bearing has no readings
+        """
+
+    @abstractmethod
+    def fetch_extent(self, bearing_num, start=None, end=None):
+        """Number of readings of a bearing in a time range and their first and last epoch times
+
+        Answered from the (bN, tS) index, far cheaper than a summary, so a cached summary can be
+        checked for readings inserted since, also late or out of order ones.
+
+        Args:
+            bearing_num (int): bearing number
+            start (int, optional): first epoch time. Defaults to None.
+            end (int, optional): epoch time after the range. Defaults to None.
+
+        Returns:
+            tuple: count, first and last epoch time (None when the range is empty)
+        """
+
+    @abstractmethod
+    def fetch_summary(self, bearing_num, start=None, end=None, n_points=500):
+        """Fetch the readings of a bearing summarised into at most n_points equal time buckets
+
+        Args:
+            bearing_num (int): bearing number
+            start (int, optional): first epoch time. Defaults to None.
+            end (int, optional): epoch time after the range. Defaults to None.
+            n_points (int, optional): maximum number of buckets. Defaults to 500.
+
+        Returns:
+            dict: field -> np array, fields as in SUMMARY_FIELDS, in time order
+        """
+
+    def close(self):
+        """Release the connections held by this storage"""
+        return None
+
+
+class SQLiteStorage(Storage):
+    """Embedded storage in a SQLite file, one file per database and one table per collection.
+
+    The file runs in WAL mode with synchronous=NORMAL, so readers do not block the writer and a
+    batch costs one fsync-free commit. Each thread gets its own connection. Only the health record
+    fields are stored.
+    """
+
+    def __init__(self, db_name, collection_name, sqlite_dir=None):
+        self.storage_config = StorageConfig()
+
+        if sqlite_dir is not None:
+            self.storage_config.sqlite_dir = sqlite_dir
+
+        for name in (db_name, collection_name):
+            if not IDENTIFIER_PATTERN.match(name):
+                raise ValueError(f"Invalid database or collection name for the embedded storage: {name!r}")
+
+        self.path = os.path.join(self.storage_config.sqlite_dir, f"{db_name}.db")
+        self.table = collection_name
+
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Get the connection of the calling thread, connecting on first use
+
+        Returns:
+            sqlite3.Connection
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+        connection = sqlite3.connect(self.path, timeout=self.storage_config.sqlite_busy_timeout, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.table}" '
+            '(_id TEXT PRIMARY KEY, tS INTEGER NOT NULL, bN INTEGER NOT NULL, rA REAL, hS INTEGER)'
+        )
+        connection.commit()
+
+        self._local.connection, self._local.pid = connection, os.getpid()
+        with self._lock:
+            self._connections.append((os.getpid(), connection))
+
+        return connection
+
+    def _where(self, bearing_num, start, end):
+        """Build the WHERE clause of a time range query
+
+        Returns:
+            tuple: clause, parameters
+        """
+        clause, params = "bN = ?", [int(bearing_num)]
+
+        if start is not None:
+            clause, params = clause + " AND tS >= ?", params + [int(start)]
+        if end is not None:
+            clause, params = clause + " AND tS < ?", params + [int(end)]
+
+        return clause, params
+
+    def _fields(self, fields):
+        """Validate the requested fields, they are spliced into the SQL"""
+        unknown = set(fields) - set(HEALTH_FIELDS) - {"_id"}
+        if unknown:
+            raise ValueError(f"Unknown fields: {sorted(unknown)}")
+
+        return ", ".join(fields)
+
+    def ensure_indexes(self):
+        connection = self._connection()
+        connection.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_bN_tS" ON "{self.table}" (bN, tS)')
+        connection.commit()
+        logger.info(f"Ensured the index {self.table}_bN_tS in {self.path}")
+
+        return None
+
+    def insert_one(self, document):
+        self.insert_many([document])
+
+        return None
+
+    def insert_many(self, documents, upsert=False):
+        if not documents:
+            return []
+
+        verb = "INSERT OR REPLACE" if upsert else "INSERT OR IGNORE"
+        rows = [(str(doc["_id"]), int(doc["tS"]), int(doc["bN"]), doc.get("rA"), doc.get("hS")) for doc in documents]
+
+        # The whole batch is one transaction
+        connection = self._connection()
+        with connection:
+            connection.executemany(f'{verb} INTO "{self.table}" (_id, tS, bN, rA, hS) VALUES (?, ?, ?, ?, ?)', rows)
+
+        return []
+
+    def find(self, bearing_num, start=None, end=None, fields=None):
+        fields = ("_id",) + HEALTH_FIELDS if fields is None else tuple(fields)
+        clause, params = self._where(bearing_num, start, end)
+
+        cursor = self._connection().execute(f'SELECT {self._fields(fields)} FROM "{self.table}" WHERE {clause} ORDER BY tS', params)
+
+        for row in cursor:
+            yield dict(zip(fields, row))
+
+    def fetch_columns(self, bearing_num, start=None, end=None, fields=HEALTH_FIELDS, batch_size=5000):
+        clause, params = self._where(bearing_num, start, end)
+        columns = {field: array(FIELD_TYPECODES.get(field, 'd')) for field in fields}
+        appends = [columns[field].append for field in fields]
+
+        cursor = self._connection().execute(f'SELECT {self._fields(fields)} FROM "{self.table}" WHERE {clause} ORDER BY tS', params)
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            for row in rows:
+                for append, value in zip(appends, row):
+                    append(value if value is not None else 0)
+
+        return to_columns(columns)
+
+    def last_timestamp(self, bearing_num):
+        clause, params = self._where(bearing_num, None, None)
+        (timestamp,) = self._connection().execute(f'SELECT MAX(tS) FROM "{self.table}" WHERE {clause}', params).fetchone()
+
+        return timestamp
+
+    def fetch_extent(self, bearing_num, start=None, end=None):
+        clause, params = self._where(bearing_num, start, end)
+        count, first, last = self._connection().execute(f'SELECT COUNT(*), MIN(tS), MAX(tS) FROM "{self.table}" WHERE {clause}', params).fetchone()
+
+        return count, first, last
+
+    def fetch_summary(self, bearing_num, start=None, end=None, n_points=500):
+        clause, params = self._where(bearing_num, start, end)
+        columns = {field: array(SUMMARY_TYPECODES[field]) for field in SUMMARY_FIELDS}
+        connection = self._connection()
+
+        first, last = connection.execute(f'SELECT MIN(tS), MAX(tS) FROM "{self.table}" WHERE {clause}', params).fetchone()
+
+        if first is not None:
+            width = bucket_width(first, last, n_points)
+
+            cursor = connection.execute(
+                f'SELECT MIN(tS), MIN(rA), AVG(rA), MAX(rA), SUM(hS), COUNT(*) FROM "{self.table}" '
+                f'WHERE {clause} GROUP BY (tS - ?) / ? ORDER BY MIN(tS)',
+                params + [int(first), width],
+            )
+
+            appends = [columns[field].append for field in SUMMARY_FIELDS]
+            for row in cursor:
+                for append, value in zip(appends, row):
+                    append(value if value is not None else 0)
+
+        return to_columns(columns)
+
+    def close(self):
+        with self._lock:
+            # Connections inherited over a fork belong to the parent
+            for pid, connection in self._connections:
+                if pid == os.getpid():
+                    connection.close()
+            self._connections.clear()
+
+        self._local = threading.local()
+
+        return None
+
+
+class MongoStorage(Storage):
+    """Storage in a MongoDB collection, through the long-lived client of this process"""
+
+    def __init__(self, db_name, collection_name, local=True, client_factory=None):
+        """MongoDB storage
+
+        Args:
+            db_name (str): the name of the database
+            collection_name (str): the name of the collection
+            local (bool, optional): whether to connect to the local database or the cloud database. Defaults to True.
+            client_factory (callable, optional): local -> MongoClient. Defaults to src.database.get_client.
+        """
+        if client_factory is None:
+            # Imported here, src.database builds on this module
+            from src.database import get_client as client_factory
+
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self.local = local
+        self.client_factory = client_factory
+
+    @property
+    def collection(self):
+        return self.client_factory(self.local)[self.db_name][self.collection_name]
+
+    def ensure_indexes(self):
+        index_name = self.collection.create_index(HEALTH_INDEX)
+        logger.info(f"Ensured the index {index_name} on the {self.collection_name} collection")
+
+        return None
+
+    def insert_one(self, document):
+        self.collection.insert_one(document)
+
+        return None
+
+    def insert_many(self, documents, upsert=False):
+        if not documents:
+            return []
+
+        try:
+            if upsert:
+                requests = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in documents]
+                self.collection.bulk_write(requests, ordered=False)
+            else:
+                self.collection.insert_many(documents, ordered=False)
+
+        except BulkWriteError as e:
+            # Duplicate keys are already stored, only the other failures are returned
+            failed = sorted({error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != DUPLICATE_KEY_ERROR})
+            return [documents[index] for index in failed]
+
+        return []
+
+    def find(self, bearing_num, start=None, end=None, fields=None):
+        # MongoDB returns _id unless it is excluded, so exclude it when it was not requested
+        projection = None if fields is None else {field: 1 for field in fields} | ({} if "_id" in fields else {'_id': 0})
+
+        return self.collection.find(range_query(bearing_num, start, end), projection)
+
+    def fetch_columns(self, bearing_num, start=None, end=None, fields=HEALTH_FIELDS, batch_size=5000):
+        cursor = self.collection.find(
+            range_query(bearing_num, start, end),
+            projection={field: 1 for field in fields} | {'_id': 0},
+            sort=[('tS', ASCENDING)],
+            batch_size=batch_size,
+        )
+
+        columns = {field: array(FIELD_TYPECODES.get(field, 'd')) for field in fields}
+        appends = [(field, columns[field].append) for field in fields]
+
+        for document in cursor:
+            for field, append in appends:
+                append(document.get(field, 0))
+
+        return to_columns(columns)
+
+    def last_timestamp(self, bearing_num):
+        last = self.collection.find_one(range_query(bearing_num), {'tS': 1, '_id': 0}, sort=[('tS', -1)])
+
+        return None if last is None else int(last['tS'])
+
+    def fetch_extent(self, bearing_num, start=None, end=None):
+        collection = self.collection
+        query = range_query(bearing_num, start, end)
+
+        count = collection.count_documents(query)
+        first = collection.find_one(query, {'tS': 1, '_id': 0}, sort=[('tS', ASCENDING)])
+        last = collection.find_one(query, {'tS': 1, '_id': 0}, sort=[('tS', -1)])
+
+        if not count or first is None or last is None:
+            return count, None, None
+
+        return count, int(first['tS']), int(last['tS'])
+
+    def fetch_summary(self, bearing_num, start=None, end=None, n_points=500):
+        collection = self.collection
+        query = range_query(bearing_num, start, end)
+        columns = {field: array(SUMMARY_TYPECODES[field]) for field in SUMMARY_FIELDS}
+
+        # Both ends of the time range come from the (bN, tS) index
+        first = collection.find_one(query, {'tS': 1, '_id': 0}, sort=[('tS', ASCENDING)])
+        last = collection.find_one(query, {'tS': 1, '_id': 0}, sort=[('tS', -1)])
+
+        if first is not None and last is not None:
+            origin = int(first['tS'])
+            width = bucket_width(origin, last['tS'], n_points)
+
+            pipeline = [
+                {'$match': query},
+                {'$group': {
+                    '_id': {'$floor': {'$divide': [{'$subtract': ['$tS', origin]}, width]}},
+                    'tS': {'$min': '$tS'},
+                    'rA_min': {'$min': '$rA'},
+                    'rA_mean': {'$avg': '$rA'},
+                    'rA_max': {'$max': '$rA'},
+                    'faulty': {'$sum': '$hS'},
+                    'count': {'$sum': 1},
+                }},
+                {'$sort': {'tS': 1}},
+                {'$project': {'_id': 0}},
+            ]
+
+            for bucket in collection.aggregate(pipeline):
+                for field in SUMMARY_FIELDS:
+                    columns[field].append(bucket[field])
+
+        return to_columns(columns)
@@ -1,3 +1,4 @@
+import os
 import sys 
 import pickle
 from datetime import datetime
@@ -37,8 +38,11 @@ def save_object(obj, filepath):
         filepath (str): Filepath to save the object to
     """
     try:
-        with open(filepath, "wb") as f:
+        # Write to a temporary file and rename it so readers never see a partial file
+        tmp_filepath = f"{filepath}.tmp"
+        with open(tmp_filepath, "wb") as f:
             pickle.dump(obj, f)
+        os.replace(tmp_filepath, filepath)
     except Exception as e:
         raise CustomException(e, sys)
     
@@ -72,4 +76,44 @@ def convert_prediction_to_label(y_pred):
     Returns:
         np array: Labels
     """
-    return (y_pred == -1).astype(int)
\ No newline at end of file
+    return (y_pred == -1).astype(int)
+
+
+def parse_channel_map(channel_map, n_channels):
+    """Map the channels of a multi-channel frame to bearing numbers
+
+    Raises a ValueError when a bearing is mapped to several channels, as their records would
+    share the same _id.
+
+    Args:
+        channel_map (list or dict): bearing number of every channel (None skips a channel), as a
+            list in channel order or as a dict channel index -> bearing number
+        n_channels (int): number of channels in the frame
+
+    Returns:
+        tuple: channel indices, bearing numbers
+    """
+    if channel_map is None:
+        # Default IMS layout: one channel per bearing
+        channel_map = list(range(1, n_channels + 1))
+
+    try:
+        if isinstance(channel_map, dict):
+            channel_map = {int(channel): bearing_num for channel, bearing_num in channel_map.items()}
+        else:
+            channel_map = dict(enumerate(channel_map))
+
+        channels = sorted(channel for channel, bearing_num in channel_map.items() if bearing_num is not None)
+        bearing_nums = [int(channel_map[channel]) for channel in channels]
+
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid channel map {channel_map!r}: {e}") from e
+
+    if not channels:
+        raise ValueError(f"Channel map {channel_map} maps no channel to a bearing")
+    if any(channel < 0 or channel >= n_channels for channel in channels):
+        raise ValueError(f"Channel map {channel_map} does not fit a frame with {n_channels} channels")
+    if len(set(bearing_nums)) != len(bearing_nums):
+        raise ValueError(f"Channel map {channel_map} maps several channels to the same bearing")
+
+    return channels, bearing_nums
@@ -4,84 +4,104 @@ import numpy as np
 import streamlit as st
 import plotly.express as px 
 import plotly.graph_objects as go
-from datetime import datetime
 from streamlit_option_menu import option_menu
-from pymongo.mongo_client import MongoClient
 from dotenv import load_dotenv
 
+from src.database import get_storage, time_range
+
 # Load environment variables
 load_dotenv()
 
 
 # -------------- DB Connection Functions --------------
-def database_connection(local=True):
-    """Connect to the MongoDB database
-    
-    local (bool): whether to connect to the local database or the cloud database
-    """
-    if local:
-        client = MongoClient("localhost", 27017)
-    else:
-        # Get the database URI from the environment variables
-        # database_uri = os.getenv("DATABASE_URL")
-        database_uri = st.secrets['db_url']
+db_name = "machinehealth"
+collection_name = "test"
+
+# Seconds a fetched summary is served from the cache before it is queried again, even when the
+# count and time range of its readings did not change (e.g. re-scored readings)
+cache_ttl = int(os.getenv("DASHBOARD_CACHE_TTL", 60))
+
+# Seconds the count and time range of the readings are reused before the database is asked again
+extent_ttl = int(os.getenv("DASHBOARD_EXTENT_TTL", 5))
 
-        # Create a new client and connect to the server
-        client = MongoClient(database_uri)
 
-    # Send a ping to confirm a successful connection
+@st.cache_resource
+def database_storage():
+    """Connect to the database once for every session and rerun of the app
+
+    Returns:
+        Storage: the storage of the health records
+    """
+    # The cloud deployment keeps the database URI in the Streamlit secrets
     try:
-        client.admin.command('ping')
-        print("Pinged your deployment. You successfully connected to MongoDB!")
-    except Exception as e:
-        print(f"Could not connect to MongoDB: Exception {e}.")
-    
-    return client
-
-def fetch_data_db(db_name, collection_name, date_string, bearing_num, local=True): 
-    """Fetch data from the MongoDB database
-    
+        if "DATABASE_URL" not in os.environ and "db_url" in st.secrets:
+            os.environ["DATABASE_URL"] = st.secrets["db_url"]
+    except FileNotFoundError:
+        pass
+
+    return get_storage(db_name, collection_name, local=os.getenv("DATABASE_LOCAL", "0") == "1")
+
+
+@st.cache_data(ttl=cache_ttl, max_entries=64, show_spinner=False)
+def fetch_summary_df_cached(date_string, bearing_num, n_points, extent):
+    """Health summary of a bearing on a day (or all days), aggregated by the database
+
+    The time range is split into at most n_points buckets, so the transfer and the plot stay the
+    same size however long the history is. The extent is only part of the cache key.
+
     Args:
-        db (MongoClient): the database connection
-        collection_name (str): the name of the collection
+        date_string (str): day as e.g. 17-Feb-2004, or 'All'
+        bearing_num (int): bearing number
+        n_points (int): maximum number of buckets
+        extent (tuple): count, first and last epoch time of the readings in the range
 
     Returns:
-        item_details (dict): the data from the collection
+        pandas dataframe: one row per bucket with its first time, min/mean/max RMS, faulty and total readings
     """
-    data_list = []
+    summary = database_storage().fetch_summary(int(bearing_num), *time_range(date_string), n_points=n_points)
 
-    client = database_connection(local=local)
+    df = pd.DataFrame(summary)
+    df['time'] = pd.to_datetime(df['tS'], unit='s')
+    df['hS'] = np.where(df['faulty'] > 0, 'Faulty', 'Healthy')
 
-    # Access a specific database
-    db = client[db_name]
+    return df
 
-    # Access a specific collection (i.e Table)
-    collection = db[collection_name]
 
-    if date_string.lower() == 'all':
-        # Query with conditions
-        query = {
-            'bN': int(bearing_num)
-        }
+@st.cache_data(ttl=extent_ttl, show_spinner=False)
+def fetch_extent(date_string, bearing_num):
+    """Count and first and last epoch time of the readings of a bearing on a day (or all days)
 
-    else:
-        # Convert input date string to timestamp
-        input_date = datetime.strptime(date_string, '%d-%b-%Y')
-        timestamp = int(input_date.timestamp())
+    Shared by all the sessions, so the database is asked at most once per extent_ttl seconds
+    however many viewers are watching.
 
-        # Query with conditions
-        query = {
-            'tS': {'$gte': timestamp, '$lt': timestamp + 86400},
-            'bN': int(bearing_num)
-        }
+    Args:
+        date_string (str): day as e.g. 17-Feb-2004, or 'All'
+        bearing_num (int): bearing number
 
-    item_details = collection.find(query)
+    Returns:
+        tuple: count, first and last epoch time
+    """
+    return database_storage().fetch_extent(int(bearing_num), *time_range(date_string))
+
+
+def fetch_summary_df(date_string, bearing_num, n_points):
+    """Health summary of a bearing on a day (or all days), recomputed when its readings changed
+
+    The count and time range of the readings are checked every extent_ttl seconds, so readings
+    inserted since the summary was cached, also late or out of order ones, are shown within
+    extent_ttl seconds and the summary is recomputed at most once per check.
+
+    Args:
+        date_string (str): day as e.g. 17-Feb-2004, or 'All'
+        bearing_num (int): bearing number
+        n_points (int): maximum number of buckets
 
-    for item in item_details:
-        # This does not give a very readable output
-        data_list.append(item)
+    Returns:
+        pandas dataframe: one row per bucket with its first time, min/mean/max RMS, faulty and total readings
+    """
+    extent = fetch_extent(date_string, bearing_num)
 
-    return data_list
+    return fetch_summary_df_cached(date_string, bearing_num, n_points, extent)
 # --------------------------------------------------
 
 
@@ -89,6 +109,9 @@ def fetch_data_db(db_name, collection_name, date_string, bearing_num, local=True
 page_title = "Machine Health Monitoring"
 page_icon = ":warning:"
 layout = "centered"
+
+# Time buckets queried and drawn per plot
+plot_points = int(os.getenv("DASHBOARD_PLOT_POINTS", 500))
 # --------------------------------------
 
 
@@ -138,25 +161,23 @@ if selected == "Machine Health Status":
         timestamp   = st.selectbox("Select Timestamp:", ['15-Feb-2004', '16-Feb-2004', '17-Feb-2004', '18-Feb-2004', '19-Feb-2004', 'All'])
         submitted = st.form_submit_button("Plot Health Status")
         if submitted:
-            # Get data from database
-            data_list = fetch_data_db(db_name="machinehealth", collection_name="test", date_string=timestamp, bearing_num=bearing_num, local=False)
+            # Get the time bucket summary of the selected range from the database
+            df = fetch_summary_df(date_string=timestamp, bearing_num=bearing_num, n_points=plot_points)
 
-            # Convert data to a Pandas DataFrame
-            df = pd.DataFrame(data_list)
+            # Plot the mean RMS of every bucket
+            line_fig = px.line(df, x='time', y='rA_mean', render_mode='webgl')
 
-            df['hS'] = df['hS'].astype(str)
+            # Overlay the peak RMS of every bucket, red when the bucket holds a faulty reading
+            scatter_fig = px.scatter(df, x='time', y='rA_max', color='hS', render_mode='webgl', color_discrete_map={'Healthy': 'green', 'Faulty': 'red'},
+                         labels={'rA_max': 'RMS Acceleration (mm/s^2)', 'time': 'time', 'hS': 'Health Status'},
+                         title='RMS Acceleration with Health Status Overlayed')
 
-            df['hS'] = df['hS'].replace({'0': 'Healthy', '1': 'Faulty'})
+            # Shade the min-max range of every bucket
+            band = go.Scatter(x=pd.concat([df['time'], df['time'][::-1]]), y=pd.concat([df['rA_max'], df['rA_min'][::-1]]),
+                              fill='toself', fillcolor='rgba(128, 128, 128, 0.2)', line={'width': 0}, hoverinfo='skip', name='Min-max')
 
-            # Plot the data
-            line_fig = px.line(df, x=np.arange(len(df)), y='rA')
-            
-            # Overlay a scatter plot on the line plot
-            scatter_fig = px.scatter(df, x=np.arange(len(df)), y='rA', color='hS', color_discrete_sequence=['green', 'red'], labels={'rA': 'RMS Acceleration (mm/s^2)', 'x':'time' ,'healthStatus': 'Health Status'},
-                         title='RMS Acceleration with Health Status Overlayed')
-            
-            # Overlay a line plot on the scatter plot
-            combined_plots = go.Figure(data=line_fig.data + scatter_fig.data, layout=scatter_fig.layout)
+            # Combine the plots
+            combined_plots = go.Figure(data=(band,) + line_fig.data + scatter_fig.data, layout=scatter_fig.layout)
 
             # Display both plots in Streamlit
-            st.plotly_chart(combined_plots)
\ No newline at end of file
+            st.plotly_chart(combined_plots)
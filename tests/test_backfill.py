@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from src.model_registry import model_registry
+from src.pipeline import backfill_pipeline
+from src.pipeline.backfill_pipeline import Backfill, score_bearings
+from src.storage import SQLiteStorage, make_health_record
+from src.utils import convert_to_timestamp
+
+
+START = 1076851200
+
+
+class HealthyModel:
+    """Model stand-in that predicts every frame healthy"""
+
+    def predict(self, X):
+        return np.ones(len(X), dtype=int)
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = SQLiteStorage("machinehealth", "test", sqlite_dir=str(tmp_path))
+    storage.ensure_indexes()
+    monkeypatch.setattr(backfill_pipeline, "get_storage", lambda *args, **kwargs: storage)
+    monkeypatch.setattr(backfill_pipeline, "ensure_indexes", lambda *args, **kwargs: None)
+
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def models(monkeypatch):
+    # Only bearings 1 and 2 have a model
+    monkeypatch.setattr(model_registry, "_models", {1: HealthyModel(), 2: HealthyModel()})
+
+
+@pytest.mark.parametrize("channel_map", [[1, 1, 2, 2], [1, None, 1, None], [None, None]])
+def test_channel_maps_with_duplicate_or_no_bearings_are_rejected(storage, channel_map):
+    with pytest.raises(ValueError):
+        Backfill(channel_map)
+
+
+def test_resume_point_ignores_the_bearings_without_a_model(storage, models):
+    backfill = Backfill([1, None, 2, None, 3, None])
+
+    assert backfill.scored_channel_map() == [1, None, 2, None, None, None]
+    assert backfill.resume_point() is None
+
+    storage.insert_many([make_health_record(START, 1, 0.1, 0), make_health_record(START + 600, 2, 0.1, 0)])
+
+    assert backfill.resume_point() == START
+
+
+def test_frames_of_the_bearings_without_a_model_are_skipped(tmp_path, storage, models):
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    rng = np.random.default_rng(0)
+    for file_name in ("2004.02.15.12.52.39", "2004.02.15.13.02.39"):
+        np.savetxt(run_dir / file_name, rng.normal(size=(20480, 4)), delimiter="\t")
+
+    stats = Backfill([1, 2, 3, None], n_workers=1).run([str(run_dir)], resume=False)
+
+    assert stats == {"files": 2, "bad_files": 0, "written": 4, "skipped": 2, "dropped": 0}
+    assert len(list(storage.find(1))) == 2 and len(list(storage.find(2))) == 2
+    assert list(storage.find(3)) == []
+
+
+def test_bad_and_stray_files_do_not_fail_the_backfill(tmp_path, storage, models):
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    rng = np.random.default_rng(0)
+    np.savetxt(run_dir / "2004.02.15.12.52.39", rng.normal(size=(20480, 4)), delimiter="\t")
+    # A truncated file, a file with too few channels, an unreadable one and names that are no timestamps
+    np.savetxt(run_dir / "2004.02.15.13.02.39", rng.normal(size=(1000, 4)), delimiter="\t")
+    np.savetxt(run_dir / "2004.02.15.13.12.39", rng.normal(size=(20480, 1)), delimiter="\t")
+    (run_dir / "2004.02.15.13.22.39").write_text("not\tnumbers\n")
+    (run_dir / "README").write_text("IMS bearing data")
+    (run_dir / ".DS_Store").write_bytes(b"\x00\x01")
+
+    stats = Backfill([1, 2], n_workers=1).run([str(run_dir)], resume=False)
+
+    assert stats == {"files": 4, "bad_files": 3, "written": 2, "skipped": 0, "dropped": 0}
+    assert [record["tS"] for record in storage.find(1)] == [convert_to_timestamp("2004.02.15.12.52.39")]
+
+
+def test_frames_without_features_are_not_scored(models):
+    assert score_bearings(np.array([START]), np.array([1]), dict()) == []
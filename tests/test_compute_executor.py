@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import subprocess
+
+from src.executor import ComputeExecutor
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Featurize on the process pool and on the thread pool in a fresh interpreter, whose stderr also
+# holds the output of the shared resource tracker
+PROCESS_POOL_SCRIPT = """
+import asyncio
+import numpy as np
+from src.exception import CustomException
+from src.executor import ComputeExecutor
+
+async def featurize(kind, frames):
+    executor = ComputeExecutor(kind=kind, max_workers=1)
+    executor.start()
+    results = [await executor.featurize(frames, 20480) for _ in range(3)]
+
+    # A failed featurization is raised in the parent and leaves the pool usable
+    try:
+        await executor.featurize(frames[:, :100], 20480)
+        raise AssertionError("short frames were featurized")
+    except CustomException:
+        pass
+    results.append(await executor.featurize(frames, 20480))
+
+    await executor.stop()
+    return results
+
+frames = np.random.default_rng(0).normal(size=(2, 20480))
+processed, threaded = asyncio.run(featurize("process", frames)), asyncio.run(featurize("thread", frames))
+assert all(set(features) == set(threaded[0]) for features in processed)
+assert all(np.allclose(processed[0][name], threaded[0][name]) for name in threaded[0])
+print("ok")
+"""
+
+
+def test_jobs_beyond_the_queue_wait_on_the_event_loop():
+    release = threading.Event()
+
+    async def scenario():
+        executor = ComputeExecutor(kind="thread", max_workers=1, max_queue=1)
+        executor.start()
+
+        jobs = [asyncio.create_task(executor.run(release.wait)) for _ in range(4)]
+        await asyncio.sleep(0.1)
+        stats = executor.stats()
+
+        release.set()
+        await asyncio.gather(*jobs)
+        await executor.stop()
+
+        return stats, executor.stats()
+
+    stats, final_stats = asyncio.run(scenario())
+
+    assert stats == {"waiting": 2, "queued": 1, "running": 1, "completed": 0}
+    assert final_stats == {"waiting": 0, "queued": 0, "running": 0, "completed": 4}
+
+
+def test_stop_does_not_block_the_event_loop():
+    async def scenario():
+        executor = ComputeExecutor(kind="thread", max_workers=1, max_queue=1)
+        executor.start()
+
+        job = asyncio.create_task(executor.run(time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+
+        # The loop keeps ticking while stop waits for the running job
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        await executor.stop()
+        ticker.cancel()
+        await job
+
+        return ticks
+
+    assert asyncio.run(scenario()) >= 10
+
+
+def test_process_pool_featurizes_through_shared_memory():
+    result = subprocess.run([sys.executable, "-c", PROCESS_POOL_SCRIPT], cwd=ROOT, env={**os.environ, "PYTHONPATH": ROOT}, capture_output=True, text=True, timeout=120)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().endswith("ok")
+    # The block is registered and unlinked by the parent only
+    assert "Traceback" not in result.stderr and "KeyError" not in result.stderr
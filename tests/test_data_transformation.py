@@ -0,0 +1,28 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from src.components.data_transformation import DataTransformation
+from src.exception import CustomException
+
+
+SAMPLING_RATE = 20480
+
+
+def test_featurize_batch_gives_one_value_per_frame():
+    frames = np.random.default_rng(0).normal(size=(3, SAMPLING_RATE))
+
+    features = DataTransformation(bearing_num=None).featurize_batch(frames, SAMPLING_RATE)
+
+    assert features and all(len(values) == 3 for values in features.values())
+
+
+def test_featurize_batch_raises_on_frames_shorter_than_a_second():
+    frames = np.zeros((2, 100))
+
+    with pytest.raises(CustomException) as error:
+        DataTransformation(bearing_num=None).featurize_batch(frames, SAMPLING_RATE)
+
+    # The exception survives the trip from a worker process to the parent
+    assert str(pickle.loads(pickle.dumps(error.value))) == str(error.value)
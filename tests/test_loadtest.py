@@ -0,0 +1,29 @@
+import json
+
+import numpy as np
+
+from loadtest import synthetic_body, unique_payload
+from invoke import encode_body
+
+
+def test_replayed_json_requests_get_new_timestamps():
+    headers, data = encode_body(synthetic_body(np.random.default_rng(0), timestamp=1076500000))
+
+    assert unique_payload(headers, data, 0) == (headers, data)
+
+    replay_headers, replay_data = unique_payload(headers, data, 3)
+    body = json.loads(replay_data)
+
+    assert replay_headers == headers
+    assert body["timeStamp"] == 1076500003
+    assert body["accelData"] == json.loads(data)["accelData"]
+
+
+def test_replayed_binary_requests_get_new_timestamps():
+    headers, data = encode_body(synthetic_body(np.random.default_rng(0), timestamp=1076500000, binary=True), binary=True)
+
+    replay_headers, replay_data = unique_payload(headers, data, 2)
+
+    assert replay_headers["X-Timestamp"] == "1076500002"
+    assert headers["X-Timestamp"] == "1076500000"
+    assert replay_data is data
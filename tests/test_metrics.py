@@ -0,0 +1,26 @@
+from src.metrics import MetricsRegistry
+
+
+def test_callback_counters_are_exported_as_counters():
+    stats = {"written": 3, "dropped": 1}
+    registry = MetricsRegistry()
+    registry.callback_counter("write_documents_total", "Documents by outcome", lambda: {(outcome,): value for outcome, value in stats.items()}, ["outcome"])
+    registry.gauge("write_queue_depth", "Documents waiting", lambda: 2)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE write_documents_total counter" in lines
+    assert 'write_documents_total{outcome="written"} 3.0' in lines
+    assert 'write_documents_total{outcome="dropped"} 1.0' in lines
+    assert "# TYPE write_queue_depth gauge" in lines
+
+
+def test_service_totals_are_counters():
+    from src.pipeline.predict_pipeline import metrics
+
+    types = {line.split()[2]: line.split()[3] for line in metrics.render().splitlines() if line.startswith("# TYPE")}
+
+    assert types["write_documents_total"] == "counter"
+    assert types["write_retries_total"] == "counter"
+    assert types["response_cache_lookups_total"] == "counter"
+    assert types["write_queue_depth"] == "gauge"
@@ -0,0 +1,176 @@
+import time
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.batching import MicroBatcher, QueueFullError
+
+
+class RecordingPredictor:
+    """predict_fn stand-in recording the batch sizes, the prediction of a frame is its first sample"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.batch_sizes = []
+        self.dispatch_times = []
+
+    async def __call__(self, frames, bearing_nums):
+        self.batch_sizes.append(len(frames))
+        self.dispatch_times.append(time.perf_counter())
+        await asyncio.sleep(self.delay)
+
+        return frames[:, 0].astype(int), {"trms": frames.std(axis=1)}, dict()
+
+
+def frame(value, n_samples=16):
+    return np.full(n_samples, float(value))
+
+
+def test_idle_requests_are_dispatched_at_once():
+    predictor = RecordingPredictor()
+
+    async def scenario():
+        batcher = MicroBatcher(predictor, max_batch_size=8, max_latency_ms=1000)
+        await batcher.start()
+
+        start = time.perf_counter()
+        result = await batcher.submit(frame(3), 1)
+        elapsed = time.perf_counter() - start
+
+        await batcher.stop()
+
+        return result, elapsed
+
+    (y_pred, features), elapsed = asyncio.run(scenario())
+
+    assert y_pred == 3 and set(features) == {"trms"}
+    assert predictor.batch_sizes == [1]
+    assert elapsed < 0.5
+
+
+def test_batches_are_capped_at_max_batch_size():
+    predictor = RecordingPredictor()
+
+    async def scenario():
+        batcher = MicroBatcher(predictor, max_batch_size=4, max_latency_ms=1000)
+        await batcher.start()
+
+        # The first frame keeps a batch in flight, the next ones queue behind it
+        first = asyncio.create_task(batcher.submit(frame(0), 1))
+        await asyncio.sleep(0.01)
+        results = await asyncio.gather(first, *[batcher.submit(frame(value), 1) for value in range(1, 9)])
+
+        stats = batcher.stats()
+        await batcher.stop()
+
+        return results, stats
+
+    results, stats = asyncio.run(scenario())
+
+    # Every caller gets the prediction of its own frame
+    assert [y_pred for y_pred, _ in results] == list(range(9))
+    assert predictor.batch_sizes == [1, 4, 4]
+    assert stats["batches"] == 3 and stats["mean_batch_size"] == 3.0
+
+
+def test_partial_batches_are_flushed_after_max_latency():
+    predictor = RecordingPredictor(delay=0.5)
+
+    async def scenario():
+        batcher = MicroBatcher(predictor, max_batch_size=32, max_latency_ms=100)
+        await batcher.start()
+
+        first = asyncio.create_task(batcher.submit(frame(0), 1))
+        await asyncio.sleep(0.01)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[batcher.submit(frame(value), 1) for value in range(1, 4)])
+
+        await first
+        await batcher.stop()
+
+        return start
+
+    start = asyncio.run(scenario())
+
+    # The three frames went out together after max_latency_ms, while the first batch was still in flight
+    assert predictor.batch_sizes == [1, 3]
+    assert 0.09 <= predictor.dispatch_times[1] - start < 0.4
+
+
+def test_per_frame_errors_reach_their_caller_only():
+    async def predict_fn(frames, bearing_nums):
+        return np.zeros(len(frames), dtype=int), {"trms": frames.std(axis=1)}, {1: "Prediction failed for bearing 2"}
+
+    async def scenario():
+        batcher = MicroBatcher(predict_fn, max_batch_size=4, max_latency_ms=50)
+        await batcher.start()
+
+        # Queue both before the collector runs, so they share a batch
+        results = await asyncio.gather(batcher.submit(frame(0), 1), batcher.submit(frame(0), 2), return_exceptions=True)
+        await batcher.stop()
+
+        return results
+
+    ok, error = asyncio.run(scenario())
+
+    assert ok[0] == 0
+    assert isinstance(error, ValueError)
+
+
+def test_frames_beyond_the_queue_size_are_rejected():
+    predictor = RecordingPredictor(delay=0.2)
+
+    async def scenario():
+        batcher = MicroBatcher(predictor, max_batch_size=1, max_latency_ms=1000, max_queue_size=2, max_in_flight=1)
+        await batcher.start()
+
+        # The first frame is in flight, the next two fill the queue
+        submitted = [asyncio.create_task(batcher.submit(frame(0), 1))]
+        await asyncio.sleep(0.01)
+        submitted += [asyncio.create_task(batcher.submit(frame(value), 1)) for value in range(1, 3)]
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(QueueFullError):
+            await batcher.submit(frame(3), 1)
+
+        results = await asyncio.gather(*submitted)
+        await batcher.stop()
+
+        return results
+
+    assert [y_pred for y_pred, _ in asyncio.run(scenario())] == [0, 1, 2]
+
+
+def test_stop_flushes_the_frames_being_collected_and_queued():
+    predictor = RecordingPredictor(delay=0.1)
+
+    async def scenario():
+        batcher = MicroBatcher(predictor, max_batch_size=4, max_latency_ms=10000)
+        await batcher.start()
+
+        # The first frame is in flight, the collector holds the next ones while it waits for more
+        first = asyncio.create_task(batcher.submit(frame(0), 1))
+        await asyncio.sleep(0.01)
+        submitted = [asyncio.create_task(batcher.submit(frame(value), 1)) for value in range(1, 7)]
+        await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(batcher.stop(), 2)
+        return await asyncio.wait_for(asyncio.gather(first, *submitted), 1)
+
+    results = asyncio.run(scenario())
+
+    assert [y_pred for y_pred, _ in results] == list(range(7))
+
+
+def test_frames_are_rejected_after_stop():
+    async def scenario():
+        batcher = MicroBatcher(RecordingPredictor(), max_batch_size=4, max_latency_ms=10)
+        await batcher.start()
+        await batcher.stop()
+
+        await batcher.submit(frame(0), 1)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
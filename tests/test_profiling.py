@@ -0,0 +1,82 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+from src.profiling import Profiler
+
+
+@pytest.fixture
+def profiler():
+    profiler = Profiler(enabled=True, trace_memory=True)
+    yield profiler
+    # Stops tracemalloc again
+    profiler.disable()
+
+
+def stage_events(profiler):
+    return {event["name"]: event for event in profiler.events if event["ph"] == "X"}
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler(enabled=False)
+
+    with profiler.stage("loadtxt"):
+        time.sleep(0.001)
+
+    assert profiler.events == [] and profiler.summary() == {}
+
+
+def test_nested_stage_durations(profiler):
+    with profiler.stage("outer"):
+        time.sleep(0.01)
+        with profiler.stage("inner", file="a.txt"):
+            time.sleep(0.02)
+
+    events = stage_events(profiler)
+
+    assert events["inner"]["dur"] >= 20000 and events["inner"]["args"]["file"] == "a.txt"
+    assert events["outer"]["dur"] >= events["inner"]["dur"] + 10000
+    # The inner stage lies within the outer one
+    assert events["outer"]["ts"] <= events["inner"]["ts"]
+    assert events["inner"]["ts"] + events["inner"]["dur"] <= events["outer"]["ts"] + events["outer"]["dur"]
+
+
+def test_enclosing_stage_peak_covers_the_inner_peak(profiler):
+    with profiler.stage("outer"):
+        with profiler.stage("inner"):
+            # 8 MB, freed before the inner stage ends
+            data = np.ones(1024 * 1024)
+            del data
+
+        # A later stage resets the tracemalloc peak again, the outer stage must keep the inner peak
+        with profiler.stage("sibling"):
+            pass
+
+    events = stage_events(profiler)
+
+    assert events["inner"]["args"]["mem_peak_mb"] >= 7.5
+    assert events["inner"]["args"]["mem_delta_mb"] < 1
+    assert events["outer"]["args"]["mem_peak_mb"] >= events["inner"]["args"]["mem_peak_mb"]
+    assert profiler.summary()["outer"]["mem_peak_mb"] == events["outer"]["args"]["mem_peak_mb"]
+
+
+def test_chrome_trace_export(profiler, tmp_path):
+    with profiler.stage("outer"):
+        with profiler.stage("inner"):
+            pass
+
+    trace_path = tmp_path / "profiles" / "run_trace.json"
+    profiler.export_chrome_trace(str(trace_path))
+
+    with open(trace_path) as f:
+        trace = json.load(f)
+
+    complete = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+
+    assert sorted(event["name"] for event in complete) == ["inner", "outer"]
+    assert all({"ts", "dur", "pid", "tid"} <= set(event) for event in complete)
+    # Memory counters and the thread names come along
+    assert any(event["ph"] == "C" for event in trace["traceEvents"])
+    assert any(event["ph"] == "M" and event["name"] == "thread_name" for event in trace["traceEvents"])
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+import pytest
+
+from reports.generate_plots import ReportConfig, SpectraCache, generate_report
+
+
+FILE_NAMES = ("2004.02.15.12.52.39", "2004.02.15.13.02.39", "2004.02.15.13.12.39")
+
+
+@pytest.fixture
+def report_config(tmp_path):
+    report_config = ReportConfig()
+    report_config.spectra_dir = str(tmp_path / "spectra")
+    report_config.plots_dir = str(tmp_path / "plots")
+    report_config.sampling_rate = 2048
+    report_config.freq_cutoff = 500
+    report_config.n_workers = 1
+
+    return report_config
+
+
+@pytest.fixture
+def run_dir(tmp_path):
+    run_dir = tmp_path / "1st_test"
+    run_dir.mkdir()
+    rng = np.random.default_rng(0)
+
+    # Eight channels as in the 1st test
+    for file_name in FILE_NAMES:
+        np.savetxt(run_dir / file_name, rng.normal(size=(2048, 8)), delimiter="\t")
+
+    return str(run_dir)
+
+
+def test_cache_is_saved_without_temporary_files(run_dir, report_config):
+    cache = SpectraCache(run_dir, report_config)
+    arrays = {"timestamps": np.arange(3), "frequencies": np.arange(5), "amplitudes": np.ones((3, 8, 5)), "rms": np.ones((3, 8))}
+
+    cache.save(arrays)
+
+    assert sorted(os.listdir(cache.cache_dir)) == ["amplitudes.npy", "frequencies.npy", "rms.npy", "timestamps.npy"]
+    assert np.array_equal(cache.load()["rms"], arrays["rms"])
+
+
+def test_inconsistent_cache_is_rebuilt(run_dir, report_config):
+    cache = SpectraCache(run_dir, report_config)
+    cache.save({"timestamps": np.arange(3), "frequencies": np.arange(5), "amplitudes": np.ones((2, 8, 5)), "rms": np.ones((3, 8))})
+
+    assert cache.load() is None
+
+
+def test_figures_follow_the_channel_map(run_dir, report_config):
+    figures = generate_report([run_dir], kinds=("trend",), report_config=report_config, channel_map=[1, None, 2, None, 3, None, 4, None])
+
+    assert [os.path.basename(figure) for figure in figures] == ["b1_trend.png", "b2_trend.png", "b3_trend.png", "b4_trend.png"]
+    assert all(os.path.getsize(figure) for figure in figures)
+
+
+@pytest.mark.parametrize("bearing_nums, channel_map", [(None, [1, 1, 2, 2]), ([5], [1, 2, 3, 4]), (None, [1, 2, 3, 4, 5, 6, 7, 8, 9])])
+def test_invalid_channel_maps_are_rejected(run_dir, report_config, bearing_nums, channel_map):
+    with pytest.raises(ValueError):
+        generate_report([run_dir], bearing_nums, kinds=("trend",), report_config=report_config, channel_map=channel_map)
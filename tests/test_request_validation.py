@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+
+from fastapi.testclient import TestClient
+
+from src.batching import QueueFullError
+from src.model_registry import model_registry
+from src.pipeline import predict_pipeline
+from src.pipeline.predict_pipeline import app
+
+
+SAMPLING_RATE = predict_pipeline.PredictorConfig.sampling_rate
+
+
+@pytest.fixture(scope="module")
+def client():
+    # Without the start-up hooks: malformed requests are rejected before any model or storage is used
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def frames_body(n_frames, n_samples=64, dtype="<f4"):
+    return np.zeros((n_frames, n_samples), dtype=dtype).tobytes()
+
+
+@pytest.mark.parametrize("headers, body", [
+    ({"X-Timestamps": "", "X-Bearing-Nums": ""}, frames_body(2)),
+    ({"X-Timestamps": "1,2", "X-Bearing-Nums": "1"}, frames_body(2)),
+    ({"X-Timestamps": "1,a", "X-Bearing-Nums": "1,2"}, frames_body(2)),
+    ({"X-Timestamps": "1,2,3", "X-Bearing-Nums": "1,1,1"}, frames_body(2)),
+    ({"X-Timestamps": "1,2", "X-Bearing-Nums": "1,1"}, frames_body(2)[:-1]),
+    ({"X-Timestamps": "1,2", "X-Bearing-Nums": "1,1", "X-Dtype": "int8"}, frames_body(2)),
+])
+def test_malformed_binary_batches_are_rejected(client, headers, body):
+    response = client.post("/invocations/batch", content=body, headers={"Content-Type": "application/octet-stream", **headers})
+
+    assert response.status_code == 400
+    assert response.json()["error"]
+
+
+def test_malformed_json_batches_are_rejected(client):
+    response = client.post("/invocations/batch", content=b"{not json", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+    response = client.post("/invocations/batch", json={"items": {"accelData": [0.0]}})
+    assert response.status_code == 400
+
+
+def test_invalid_items_are_reported_per_item(client):
+    response = client.post("/invocations/batch", json={"items": [{"accelData": 1.0, "timeStamp": 1, "bearingNum": 1}, {"timeStamp": 2}]})
+
+    assert response.status_code == 200
+    assert [result["index"] for result in response.json()["results"]] == [0, 1]
+
+
+@pytest.mark.parametrize("payload", [
+    {"timeStamp": 1, "bearingNum": 1},
+    {"timeStamp": 1, "bearingNum": 1, "accelData": 1.0},
+    {"timeStamp": 1, "bearingNum": 1, "accelData": ["a", "b"]},
+    {"timeStamp": 1, "bearingNum": 1, "accelData": [[0.0] * SAMPLING_RATE]},
+    {"timeStamp": 1, "bearingNum": 1, "accelData": [0.0] * (SAMPLING_RATE - 1)},
+])
+def test_malformed_json_frames_are_rejected(client, payload):
+    response = client.post("/invocations", json=payload)
+
+    assert response.status_code == 400
+    assert response.json()["error"]
+
+
+def test_frames_of_bearings_without_a_model_are_not_found(client, monkeypatch):
+    monkeypatch.setattr(model_registry, "_models", {})
+
+    response = client.post("/invocations", json={"timeStamp": 1, "bearingNum": 7, "accelData": [0.0] * SAMPLING_RATE})
+
+    assert response.status_code == 404
+    assert response.json() == {"error": "No model for bearing 7"}
+
+
+def test_failed_predictions_are_reported(client, monkeypatch):
+    async def predict_frame(frame, bearing_num):
+        raise ValueError("Prediction failed for bearing 1")
+
+    monkeypatch.setattr(model_registry, "_models", {1: None})
+    monkeypatch.setattr(predict_pipeline, "predict_frame", predict_frame)
+
+    response = client.post("/invocations", json={"timeStamp": 2, "bearingNum": 1, "accelData": [0.0] * SAMPLING_RATE})
+
+    assert response.status_code == 500
+    assert response.json() == {"error": "Prediction failed for bearing 1"}
+
+
+def test_frames_beyond_the_micro_batch_queue_are_refused(client, monkeypatch):
+    async def predict_frame(frame, bearing_num):
+        raise QueueFullError("1024 frames are waiting for a micro-batch")
+
+    monkeypatch.setattr(model_registry, "_models", {1: None})
+    monkeypatch.setattr(predict_pipeline, "predict_frame", predict_frame)
+
+    response = client.post("/invocations", json={"timeStamp": 3, "bearingNum": 1, "accelData": [0.0] * SAMPLING_RATE})
+
+    assert response.status_code == 503
+    assert response.json()["error"]
+
+
+def test_single_frames_without_metadata_are_rejected(client):
+    response = client.post("/invocations", content=frames_body(1), headers={"Content-Type": "application/octet-stream"})
+
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("headers, body", [
+    ({"X-Timestamp": "1"}, frames_body(4, SAMPLING_RATE)),
+    ({"X-Timestamp": "1", "X-Num-Channels": "3"}, frames_body(4, SAMPLING_RATE)),
+    ({"X-Timestamp": "1", "X-Channel-Map": "1,x"}, frames_body(2, SAMPLING_RATE)),
+    ({"X-Timestamp": "1", "X-Channel-Map": ",,"}, frames_body(3, SAMPLING_RATE)),
+    ({"X-Timestamp": "1", "X-Channel-Map": "1,1"}, frames_body(2, SAMPLING_RATE)),
+    ({"X-Timestamp": "1", "X-Channel-Map": "1,2"}, frames_body(2)),
+    ({"X-Channel-Map": "1,2"}, frames_body(2, SAMPLING_RATE)),
+])
+def test_malformed_binary_machine_frames_are_rejected(client, headers, body):
+    response = client.post("/invocations/machine", content=body, headers={"Content-Type": "application/octet-stream", **headers})
+
+    assert response.status_code == 400
+    assert response.json()["error"]
+
+
+@pytest.mark.parametrize("payload", [
+    {"timeStamp": 1, "accelData": [[0.0] * SAMPLING_RATE, [0.0]]},
+    {"timeStamp": 1, "accelData": [0.0] * SAMPLING_RATE},
+    {"timeStamp": 1, "accelData": [[0.0, 1.0], [0.0, 1.0]]},
+    {"timeStamp": 1, "accelData": [[0.0] * SAMPLING_RATE], "channelMap": {"3": 1}},
+    {"accelData": [[0.0] * SAMPLING_RATE]},
+    [1, 2],
+])
+def test_malformed_json_machine_frames_are_rejected(client, payload):
+    response = client.post("/invocations/machine", json=payload)
+
+    assert response.status_code == 400
+
+
+def test_machine_featurization_failures_are_reported_per_bearing(client, monkeypatch):
+    async def predict_frames(frames, bearing_nums):
+        raise ValueError("need at least one array to concatenate")
+
+    monkeypatch.setattr(predict_pipeline, "predict_frames", predict_frames)
+
+    response = client.post("/invocations/machine", json={"timeStamp": 1, "accelData": [[0.0] * SAMPLING_RATE] * 2})
+
+    assert response.status_code == 200
+    assert response.json() == {"tS": 1, "bearings": [{"bN": 1, "error": "Featurization failed"}, {"bN": 2, "error": "Featurization failed"}]}
+
+
+def test_ping_fails_without_models(client, monkeypatch):
+    monkeypatch.setattr(model_registry, "_models", {})
+    response = client.get("/ping")
+
+    assert response.status_code == 404 and response.json()["status"] == 404
+
+    monkeypatch.setattr(model_registry, "_models", {1: None})
+    response = client.get("/ping")
+
+    assert response.status_code == 200 and response.json()["status"] == 200
+
+
+def test_predictors_of_bearings_without_a_model_raise_key_error(monkeypatch):
+    monkeypatch.setattr(model_registry, "_models", {})
+
+    with pytest.raises(KeyError):
+        predict_pipeline.Predictor(bearing_num=9).predict_batch(np.zeros((1, 14)))
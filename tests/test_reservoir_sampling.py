@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from src.components.model_trainer import ModelTrainer
+
+
+def write_rows(filepath, n_rows):
+    """Write a feature table whose first feature is the row index"""
+    pd.DataFrame({
+        "timestamp": np.arange(n_rows),
+        "row": np.arange(n_rows, dtype=float),
+        "trms": np.random.default_rng(0).normal(size=n_rows),
+    }).to_csv(filepath, index=False)
+
+    return filepath
+
+
+def test_sample_holds_sample_size_distinct_rows(tmp_path):
+    filepath = write_rows(tmp_path / "train.csv", 1000)
+
+    X_train = ModelTrainer(bearing_num=1).prepare_training_sample(filepath, sample_size=100, chunk_size=64, random_state=0)
+
+    assert list(X_train.columns) == ["row", "trms"]
+    assert len(X_train) == 100
+    assert (X_train.dtypes == np.float32).all()
+    assert X_train["row"].nunique() == 100
+    assert X_train["row"].between(0, 999).all()
+
+
+def test_sample_of_short_data_keeps_every_row(tmp_path):
+    filepath = write_rows(tmp_path / "train.csv", 30)
+
+    X_train = ModelTrainer(bearing_num=1).prepare_training_sample(filepath, sample_size=100, chunk_size=8, random_state=0)
+
+    assert sorted(X_train["row"]) == list(range(30))
+
+
+def test_every_row_is_equally_likely(tmp_path):
+    n_rows, sample_size, n_runs = 200, 20, 500
+    filepath = write_rows(tmp_path / "train.csv", n_rows)
+    trainer = ModelTrainer(bearing_num=1)
+
+    counts = np.zeros(n_rows)
+    for seed in range(n_runs):
+        X_train = trainer.prepare_training_sample(filepath, sample_size=sample_size, chunk_size=16, random_state=seed)
+        counts[X_train["row"].to_numpy(dtype=int)] += 1
+
+    # Each row is kept sample_size / n_rows of the time; compare the first and the last chunks too,
+    # a biased sampler favours the rows that fill the reservoir
+    expected = n_runs * sample_size / n_rows
+    chi_square = ((counts - expected) ** 2 / expected).sum()
+
+    assert chi_square < 300   # 199 degrees of freedom, p < 1e-4 above 300
+    assert abs(counts[:sample_size].mean() - counts[-sample_size:].mean()) < 0.3 * expected
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from src import cache
+from src.cache import ResponseCache, payload_digest
+
+
+class Clock:
+    """Stand-in for time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+
+    return clock
+
+
+def test_concurrent_identical_requests_are_computed_once():
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"hS": 0}
+
+    async def scenario():
+        response_cache = ResponseCache(max_size=10, ttl=60)
+        results = await asyncio.gather(*[response_cache.get_or_create("1b1:digest", factory) for _ in range(5)])
+
+        return response_cache, results
+
+    response_cache, results = asyncio.run(scenario())
+
+    assert calls == 1
+    assert [cached for _, cached in results] == [False, True, True, True, True]
+    assert all(response is results[0][0] for response, _ in results)
+    assert (response_cache.hits, response_cache.misses) == (4, 1)
+
+
+def test_waiters_see_the_failure_and_the_next_request_retries():
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        if calls == 1:
+            raise RuntimeError("prediction failed")
+        return {"hS": 1}
+
+    async def scenario():
+        response_cache = ResponseCache(max_size=10, ttl=60)
+        results = await asyncio.gather(*[response_cache.get_or_create("key", factory) for _ in range(3)], return_exceptions=True)
+        retry = await response_cache.get_or_create("key", factory)
+
+        return results, retry
+
+    results, retry = asyncio.run(scenario())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retry == ({"hS": 1}, False)
+    assert calls == 2
+
+
+def test_entries_expire_after_the_ttl(clock):
+    response_cache = ResponseCache(max_size=10, ttl=60)
+    response_cache.put("key", {"hS": 0})
+
+    clock.now += 59
+    assert response_cache.get("key") == {"hS": 0}
+
+    clock.now += 2
+    assert response_cache.get("key") is None
+    assert len(response_cache) == 0
+
+
+def test_expired_entries_are_recomputed(clock):
+    async def factory():
+        return {"computed_at": clock.now}
+
+    async def scenario():
+        response_cache = ResponseCache(max_size=10, ttl=60)
+        first = await response_cache.get_or_create("key", factory)
+        clock.now += 30
+        second = await response_cache.get_or_create("key", factory)
+        clock.now += 61
+        third = await response_cache.get_or_create("key", factory)
+
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+
+    assert first == ({"computed_at": 1000.0}, False)
+    assert second == ({"computed_at": 1000.0}, True)
+    assert third == ({"computed_at": 1091.0}, False)
+
+
+def test_least_recently_used_entries_are_evicted():
+    response_cache = ResponseCache(max_size=2, ttl=60)
+    response_cache.put("a", 1)
+    response_cache.put("b", 2)
+    response_cache.get("a")
+    response_cache.put("c", 3)
+
+    assert response_cache.get("b") is None
+    assert (response_cache.get("a"), response_cache.get("c")) == (1, 3)
+
+
+def test_payload_digest_depends_on_the_bytes():
+    assert payload_digest(b"frame") == payload_digest(b"frame")
+    assert payload_digest(b"frame") != payload_digest(b"frame ")
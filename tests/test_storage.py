@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+
+from src.storage import MongoStorage, SQLiteStorage, Storage, SUMMARY_FIELDS, make_health_record
+
+
+START = 1076851200
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage("machinehealth", "test", sqlite_dir=str(tmp_path))
+    storage.ensure_indexes()
+    yield storage
+    storage.close()
+
+
+def records(bearing_num, n_records, start=START, interval=600, y_pred=0):
+    return [make_health_record(start + interval * index, bearing_num, 0.1 + 0.001 * index, y_pred) for index in range(n_records)]
+
+
+def test_incomplete_backends_cannot_be_instantiated():
+    class PartialStorage(Storage):
+        def insert_one(self, document):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStorage()
+
+
+def test_invalid_names_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        SQLiteStorage("machinehealth", "test; DROP TABLE test", sqlite_dir=str(tmp_path))
+
+
+def test_insert_and_find(storage):
+    storage.insert_one(make_health_record(START, 1, 0.123, 0))
+    storage.insert_many(records(2, 3))
+
+    assert list(storage.find(1)) == [{"_id": f"{START}b1", "tS": START, "bN": 1, "rA": 0.123, "hS": 0}]
+    assert [record["tS"] for record in storage.find(2)] == [START, START + 600, START + 1200]
+
+
+def test_find_time_range_and_fields(storage):
+    storage.insert_many(records(1, 10))
+
+    found = list(storage.find(1, start=START + 600, end=START + 1800, fields=("_id", "tS")))
+
+    assert found == [{"_id": f"{START + 600}b1", "tS": START + 600}, {"_id": f"{START + 1200}b1", "tS": START + 1200}]
+
+    with pytest.raises(ValueError):
+        list(storage.find(1, fields=("tS", "1; --")))
+
+
+def test_duplicates_are_skipped(storage):
+    storage.insert_many(records(1, 3))
+
+    failed = storage.insert_many(records(1, 5, y_pred=1))
+
+    assert failed == []
+    assert [record["hS"] for record in storage.find(1)] == [0, 0, 0, 1, 1]
+
+
+def test_upsert_replaces_stored_records(storage):
+    storage.insert_many(records(1, 3))
+
+    storage.insert_many(records(1, 2, y_pred=1), upsert=True)
+
+    assert [record["hS"] for record in storage.find(1)] == [1, 1, 0]
+
+
+def test_fetch_columns_in_time_order(storage):
+    # Inserted out of order, e.g. a backfill behind live predictions
+    storage.insert_many(records(1, 5)[3:] + records(1, 5)[:3])
+
+    columns = storage.fetch_columns(1, batch_size=2)
+
+    assert set(columns) == {"tS", "bN", "rA", "hS"}
+    assert columns["tS"].tolist() == [START + 600 * index for index in range(5)]
+    assert columns["tS"].dtype == np.int64 and columns["rA"].dtype == np.float64
+    assert np.allclose(columns["rA"], [0.1, 0.101, 0.102, 0.103, 0.104])
+
+
+def test_fetch_columns_of_an_empty_range(storage):
+    columns = storage.fetch_columns(3, fields=("tS", "rA"))
+
+    assert set(columns) == {"tS", "rA"}
+    assert len(columns["tS"]) == 0 and len(columns["rA"]) == 0
+
+
+def test_last_timestamp(storage):
+    assert storage.last_timestamp(1) is None
+
+    storage.insert_many(records(1, 4) + records(2, 7))
+
+    assert storage.last_timestamp(1) == START + 1800
+    assert storage.last_timestamp(2) == START + 3600
+
+
+def test_fetch_extent_changes_with_late_readings(storage):
+    assert storage.fetch_extent(1) == (0, None, None)
+
+    storage.insert_many(records(1, 10))
+    extent = storage.fetch_extent(1, start=START, end=START + 6000)
+
+    assert extent == (10, START, START + 5400)
+
+    # A late reading inside the range moves neither end, only the count
+    storage.insert_one(make_health_record(START + 300, 1, 0.5, 1))
+
+    assert storage.fetch_extent(1, start=START, end=START + 6000) == (11, START, START + 5400)
+    assert storage.fetch_extent(2) == (0, None, None)
+
+
+def test_fetch_summary_buckets(storage):
+    storage.insert_many(records(1, 100))
+    storage.insert_many(records(1, 100, start=START + 30, y_pred=1))
+
+    summary = storage.fetch_summary(1, n_points=10)
+
+    assert set(summary) == set(SUMMARY_FIELDS)
+    assert len(summary["tS"]) == 10
+    assert summary["count"].sum() == 200
+    assert summary["faulty"].sum() == 100
+    assert np.all(np.diff(summary["tS"]) > 0)
+    assert np.all(summary["rA_min"] <= summary["rA_mean"]) and np.all(summary["rA_mean"] <= summary["rA_max"])
+    assert summary["rA_min"][0] == pytest.approx(0.1) and summary["rA_max"][-1] == pytest.approx(0.199)
+
+
+def test_fetch_summary_of_a_time_range(storage):
+    storage.insert_many(records(1, 100))
+
+    summary = storage.fetch_summary(1, start=START, end=START + 600 * 10, n_points=500)
+
+    # Fewer readings than buckets, one bucket per reading
+    assert summary["tS"].tolist() == [START + 600 * index for index in range(10)]
+    assert summary["count"].tolist() == [1] * 10
+
+
+def test_fetch_summary_of_an_empty_range(storage):
+    summary = storage.fetch_summary(4)
+
+    assert all(len(summary[field]) == 0 for field in SUMMARY_FIELDS)
+
+
+def test_mongo_storage_implements_the_interface():
+    storage = MongoStorage("machinehealth", "test", client_factory=lambda local: None)
+
+    assert isinstance(storage, Storage)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from fastapi.testclient import TestClient
+
+from src.pipeline import predict_pipeline
+from src.pipeline.predict_pipeline import RingBuffer, app
+
+
+def test_ring_buffer_keeps_the_latest_samples_in_order():
+    ring_buffer = RingBuffer(5)
+
+    ring_buffer.extend(np.arange(3))
+    ring_buffer.extend(np.arange(3, 7))
+
+    assert ring_buffer.count == 7
+    assert ring_buffer.window().tolist() == [2, 3, 4, 5, 6]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 11])
+def test_ring_buffer_wraps_around_with_any_chunk_size(chunk_size):
+    ring_buffer = RingBuffer(5)
+    stream = np.arange(40, dtype=float)
+
+    for start in range(0, len(stream), chunk_size):
+        ring_buffer.extend(stream[start:start + chunk_size])
+        end = min(start + chunk_size, len(stream))
+
+        if end >= 5:
+            assert ring_buffer.window().tolist() == stream[end - 5:end].tolist()
+
+    assert ring_buffer.count == 40
+
+
+def test_ring_buffer_window_is_a_copy():
+    ring_buffer = RingBuffer(3)
+    ring_buffer.extend(np.array([1.0, 2.0, 3.0]))
+
+    window = ring_buffer.window()
+    ring_buffer.extend(np.array([4.0]))
+
+    assert window.tolist() == [1.0, 2.0, 3.0]
+
+
+@pytest.fixture
+def predictions(monkeypatch):
+    """Stand-in for the model, every window is predicted healthy"""
+    async def predict_frame(frame, bearing_num):
+        return 0, {"trms": float(frame.std())}
+
+    monkeypatch.setattr(predict_pipeline, "predict_frame", predict_frame)
+
+
+def test_stream_records_have_unique_ids(predictions):
+    sampling_rate = predict_pipeline.PredictorConfig.sampling_rate
+
+    with TestClient(app).websocket_connect("/stream") as websocket:
+        websocket.send_json({"bearingNum": 1, "timeStamp": 1076851200, "hop": sampling_rate // 4})
+        websocket.send_bytes(np.zeros(2 * sampling_rate, dtype="<f4").tobytes())
+
+        records = [websocket.receive_json() for _ in range(5)]
+
+    assert [record["_id"] for record in records] == ["1076851200.000b1", "1076851200.250b1", "1076851200.500b1", "1076851200.750b1", "1076851201.000b1"]
+    assert [record["tS"] for record in records] == [1076851200] * 4 + [1076851201]
+
+
+def test_malformed_stream_messages_keep_the_stream_open(predictions):
+    sampling_rate = predict_pipeline.PredictorConfig.sampling_rate
+
+    with TestClient(app).websocket_connect("/stream") as websocket:
+        websocket.send_json({"bearingNum": 1, "timeStamp": 1076851200})
+
+        websocket.send_bytes(b"\x00\x00\x00")
+        assert "error" in websocket.receive_json()
+
+        websocket.send_text("{not json")
+        assert "error" in websocket.receive_json()
+
+        websocket.send_bytes(np.zeros(sampling_rate, dtype="<f4").tobytes())
+        assert websocket.receive_json()["_id"] == "1076851200.000b1"
+
+
+def test_hops_below_the_minimum_are_rejected(predictions):
+    min_hop = predict_pipeline.PredictorConfig.stream_min_hop
+
+    with TestClient(app).websocket_connect("/stream") as websocket:
+        websocket.send_json({"bearingNum": 1, "timeStamp": 1076851200, "hop": min_hop - 1})
+
+        assert str(min_hop) in websocket.receive_json()["error"]
+        assert websocket.receive()["type"] == "websocket.close"
@@ -0,0 +1,175 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from src import database
+from src.database import WriteBehindQueue
+
+
+class RecordingStorage:
+    """Storage stand-in that records the written batches and can fail or block the writes"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.documents = dict()
+        self.release = threading.Event()
+        self.release.set()
+
+    def insert_many(self, documents, upsert=False):
+        self.release.wait()
+        self.calls.append((len(documents), upsert))
+
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("server selection timeout")
+
+        for document in documents:
+            if upsert or document["_id"] not in self.documents:
+                self.documents[document["_id"]] = document
+
+        return []
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = RecordingStorage()
+    monkeypatch.setattr(database, "get_storage", lambda *args, **kwargs: storage)
+
+    return storage
+
+
+def make_queue(batch_size=500, flush_interval=0.05, max_queue_size=100, max_retries=3):
+    queue = WriteBehindQueue(db_name="machinehealth", collection_name="test")
+    queue.write_config.batch_size = batch_size
+    queue.write_config.flush_interval = flush_interval
+    queue.write_config.max_queue_size = max_queue_size
+    queue.write_config.max_retries = max_retries
+    queue.write_config.retry_backoff = 0.0
+
+    return queue
+
+
+def document(index):
+    return {"_id": f"{index}b1", "tS": index, "bN": 1, "rA": 0.1, "hS": 0}
+
+
+def test_stop_drains_the_queued_documents(storage):
+    async def scenario():
+        queue = make_queue(batch_size=4, flush_interval=10)
+        await queue.start()
+        await queue.put_many([document(index) for index in range(10)])
+
+        # The partial last batch is flushed at once, not after the flush interval
+        start = time.perf_counter()
+        await queue.stop()
+        assert time.perf_counter() - start < 2
+
+        return queue
+
+    queue = asyncio.run(scenario())
+
+    assert len(storage.documents) == 10
+    assert [size for size, _ in storage.calls] == [4, 4, 2]
+    assert queue.stats["written"] == 10 and queue.stats["dropped"] == 0
+    assert queue.qsize() == 0
+
+
+def test_batches_are_flushed_by_time(storage):
+    async def scenario():
+        queue = make_queue(batch_size=500, flush_interval=0.05)
+        await queue.start()
+        await queue.put(document(1))
+        await asyncio.sleep(0.3)
+        flushed = len(storage.documents)
+        await queue.stop()
+
+        return flushed
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_put_waits_while_the_queue_is_full(storage):
+    async def scenario():
+        queue = make_queue(batch_size=1, max_queue_size=2)
+        storage.release.clear()
+        await queue.start()
+
+        # The writer holds the first document, the next two fill the queue
+        for index in range(3):
+            await queue.put(document(index))
+        await asyncio.sleep(0.05)
+
+        blocked = asyncio.create_task(queue.put(document(3)))
+        await asyncio.sleep(0.1)
+        was_blocked = not blocked.done()
+
+        storage.release.set()
+        await asyncio.wait_for(blocked, 5)
+        await queue.stop()
+
+        return was_blocked
+
+    assert asyncio.run(scenario())
+    assert len(storage.documents) == 4
+
+
+def test_failed_batches_are_retried_as_upserts(storage):
+    storage.failures = 2
+
+    async def scenario():
+        queue = make_queue(batch_size=3)
+        await queue.start()
+        await queue.put_many([document(index) for index in range(3)])
+        await queue.stop()
+
+        return queue
+
+    queue = asyncio.run(scenario())
+
+    assert storage.calls == [(3, False), (3, True), (3, True)]
+    assert queue.stats["retries"] == 2
+    assert queue.stats["written"] == 3 and queue.stats["dropped"] == 0
+
+
+def test_documents_are_dropped_after_the_last_retry(storage):
+    storage.failures = 10
+
+    async def scenario():
+        queue = make_queue(batch_size=2, max_retries=2)
+        await queue.start()
+        await queue.put_many([document(index) for index in range(2)])
+        await queue.stop()
+
+        return queue
+
+    queue = asyncio.run(scenario())
+
+    assert len(storage.calls) == 3
+    assert queue.stats["written"] == 0 and queue.stats["dropped"] == 2
+
+
+def test_documents_are_dropped_when_the_storage_cannot_be_reached(monkeypatch):
+    attempts = []
+
+    def get_storage(*args, **kwargs):
+        attempts.append(args)
+        raise ConnectionError("server selection timeout")
+
+    monkeypatch.setattr(database, "get_storage", get_storage)
+
+    async def scenario():
+        queue = make_queue(batch_size=2, max_retries=2)
+        await queue.start()
+        await queue.put_many([document(index) for index in range(2)])
+        await queue.stop()
+
+        return queue
+
+    queue = asyncio.run(scenario())
+
+    assert len(attempts) == 3
+    assert queue.stats["retries"] == 2
+    assert queue.stats["written"] == 0 and queue.stats["dropped"] == 2